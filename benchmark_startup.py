@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+'''
+Benchmark do tempo de partida do CLI (import do clone_ec2, --help e opção inválida).
+
+Cada medição roda num processo Python novo, como numa chamada de script ou de frota.
+Além do tempo, confere que nenhum módulo pesado (boto3/botocore) foi carregado nesses
+caminhos: eles só podem ser importados depois que as opções foram validadas.
+
+Sai com código 1 se a mediana do import passar do limite ou se algum módulo pesado
+aparecer, então pode rodar no CI.
+'''
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Módulos que não podem ser carregados só para fazer o parse/validação das opções
+HEAVY_MODULES = ('boto3', 'botocore', 'urllib.request')
+
+# Roda o CLI com os argumentos dados (sem deixar o SystemExit sair) e lista os módulos pesados carregados
+CLI_PROBE = '''
+import runpy, sys
+sys.argv = ['clone_ec2.py'] + sys.argv[1:]
+try:
+    runpy.run_path('clone_ec2.py', run_name='__main__')
+except SystemExit:
+    pass
+print('HEAVY=' + ','.join(m for m in {heavy!r} if m in sys.modules), file=sys.stderr)
+'''
+
+# Caminhos que não deveriam precisar de AWS: ajuda e opções inválidas
+CLI_CASES = [
+    ('--help', ['--help']),
+    ('ID inválido', ['--instance-id', 'i-123', '--profile', 'dev']),
+    ('opções conflitantes', ['--instance-id', 'i-0123456789abcdef0', '--profile', 'dev', '--plan', '--drill'])
+]
+
+def measure_import():
+    """
+    Tempo (ms) do import do clone_ec2 medido pelo -X importtime e módulos pesados carregados
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c',
+         f"import sys, clone_ec2; print('HEAVY=' + ','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules), "
+         "file=sys.stderr)"],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    total_us = None
+    heavy = ''
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and line.rstrip().endswith('| clone_ec2'):
+            total_us = int(line.split('|')[1])
+        elif line.startswith('HEAVY='):
+            heavy = line[len('HEAVY='):]
+    if total_us is None:
+        raise RuntimeError(f"Não foi possível importar o clone_ec2:\n{result.stderr}")
+    return total_us / 1000, heavy
+
+def measure_cli(argv):
+    """
+    Tempo (ms) de parede de um processo novo rodando o CLI e módulos pesados carregados
+    """
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', CLI_PROBE.format(heavy=HEAVY_MODULES)] + argv,
+                            cwd=ROOT, capture_output=True, text=True)
+    elapsed = (time.perf_counter() - start) * 1000
+    heavy = next((line[len('HEAVY='):] for line in result.stderr.splitlines() if line.startswith('HEAVY=')), '')
+    return elapsed, heavy
+
+def measure_interpreter():
+    """
+    Tempo (ms) de parede de um processo Python vazio, para descontar do tempo do CLI
+    """
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', 'pass'], cwd=ROOT)
+    return (time.perf_counter() - start) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark do tempo de partida do clone_ec2.py')
+    parser.add_argument('--runs', type=int, default=10,
+                        help='Quantidade de execuções de cada medição (padrão: 10)')
+    parser.add_argument('--max-import-ms', type=float, default=100,
+                        help='Limite da mediana do import do clone_ec2 em ms (padrão: 100)')
+    args = parser.parse_args()
+
+    failures = []
+
+    print(f"⏱️  Benchmark de partida ({args.runs} execuções por medição, Python {sys.version.split()[0]})\n")
+
+    imports, heavy = [], set()
+    for _ in range(args.runs):
+        ms, loaded = measure_import()
+        imports.append(ms)
+        heavy.update(filter(None, loaded.split(',')))
+    import_median = statistics.median(imports)
+    print(f"📦 import clone_ec2: mediana {import_median:.1f} ms | mín {min(imports):.1f} ms | máx {max(imports):.1f} ms")
+    if heavy:
+        failures.append(f"import clone_ec2 carregou {', '.join(sorted(heavy))}")
+    if import_median > args.max_import_ms:
+        failures.append(f"import clone_ec2 levou {import_median:.1f} ms (limite: {args.max_import_ms:.0f} ms)")
+
+    interpreter = statistics.median(measure_interpreter() for _ in range(args.runs))
+    print(f"🐍 processo Python vazio: mediana {interpreter:.1f} ms\n")
+
+    for name, argv in CLI_CASES:
+        times, heavy = [], set()
+        for _ in range(args.runs):
+            ms, loaded = measure_cli(argv)
+            times.append(ms)
+            heavy.update(filter(None, loaded.split(',')))
+        median = statistics.median(times)
+        print(f"🖥️  {name}: mediana {median:.1f} ms (+{median - interpreter:.1f} ms sobre o Python vazio)")
+        if heavy:
+            failures.append(f"{name} carregou {', '.join(sorted(heavy))}")
+
+    print()
+    if failures:
+        for failure in failures:
+            print(f"❌ {failure}")
+        sys.exit(1)
+    print("✅ Partida dentro do limite e sem módulos pesados antes da validação")
+
+if __name__ == "__main__":
+    main()
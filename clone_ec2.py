@@ -1,16 +1,19 @@
 #!/usr/bin/env python3
 
 import argparse
+import json
 import sys
-try:
-    from libs.ec2_clone_functions import clone_instance_with_new_ami
-    from libs.ami_finder import find_instance_amis
-except ImportError as e:
-    if "boto3" in str(e):
-        print("ERRO: Lib boto3 é necessária para a execução. Instale com: pip install boto3")
-    else:
-        print(f"ERRO: {e}")
-    sys.exit(1)
+
+# Só o que o parse e a validação das opções usam: boto3 e a lib de clone são importados
+# nos caminhos que falam com a AWS, depois de tudo validado (--help e erros de opção saem na hora).
+# Sem boto3 instalado, o ImportError desses imports cai no tratamento do main()
+from libs import progress
+from libs.errors import CloneError
+from libs.ec2_volume_utils import parse_volume_rules
+from libs.instance_types import parse_type_mapping
+from libs.readiness import parse_readiness
+from libs.discovery import parse_selector
+from libs.validation import validate_id, validate_profile
 
 def main():
     parser = argparse.ArgumentParser(
@@ -26,47 +29,415 @@ Exemplos:
   
   # Clona a instância desejada buscando automaticamente as AMIs mais recentes
   %(prog)s --instance-id i-0123456789abcdef0 --profile dev --region us-east-1
+  
+  # Só calcula os parâmetros do clone, sem parar nem criar nada
+  %(prog)s --instance-id i-0123456789abcdef0 --profile dev --plan
+  
+  # Fan-out: clona várias instâncias em várias contas/regiões em paralelo
+  %(prog)s --manifest dr_drill.json --max-workers 6
+  
+  # Converte volumes gp2 em gp3 (mantendo ou superando o desempenho) e garante 6000 IOPS no /dev/sdf
+  %(prog)s --instance-id i-0123456789abcdef0 --profile dev --convert-volume gp2:gp3 --min-iops /dev/sdf:6000
+  
+  # Aproveita o DR para migrar m5 -> m7i (ou m6i se faltar capacidade) e t3 -> t3a
+  %(prog)s --instance-id i-0123456789abcdef0 --profile dev --type-map m5:m7i,m6i --type-map t3:t3a
+  
+  # Fan-out com visão ao vivo no terminal e eventos gravados em JSONL
+  %(prog)s --manifest dr_drill.json --live --progress-jsonl progresso.jsonl
+  
+  # Mantém um standby parado (AMI mais recente) de cada instância do manifesto (ex: no cron)
+  %(prog)s --manifest protegidas.json --standby-refresh
+  
+  # No DR, liga o standby se houver (senão faz o clone normal)
+  %(prog)s --instance-id i-0123456789abcdef0 --profile dev --use-standby
+  
+  # Scale-out: 6 réplicas da instância espalhadas pelas AZs da VPC (a origem continua ligada)
+  %(prog)s --instance-id i-0123456789abcdef0 --profile dev --replicas 6 --new-name worker
+  
+  # Só considera a instância pronta com status checks ok, SSH aberto e /health respondendo
+  %(prog)s --instance-id i-0123456789abcdef0 --profile dev --ready-status-checks --ready-tcp 22 --ready-http 8080/health
+  
+  # Drill de DR: clona as instâncias do manifesto numa subnet isolada, mede o RTO e termina os clones
+  %(prog)s --manifest protegidas.json --drill --drill-subnet subnet-0abc1234 --drill-security-group sg-0abc1234 --ready-tcp 22
+  
+  # Clona todas as instâncias em running com DR-Tier=1 na VPC, à medida que são encontradas
+  %(prog)s --profile dev --select-tag DR-Tier=1 --select-vpc vpc-0abc1234 --live
+  
+  # Começa pelos clones mais demorados (previstos pela telemetria) e respeita o depends_on do manifesto
+  %(prog)s --manifest dr_drill.json --schedule --progress-jsonl progresso.jsonl
+  
+  # Clona a partir dos snapshots mais recentes de cada volume (mais novos que a última AMI)
+  %(prog)s --instance-id i-0123456789abcdef0 --profile dev --from-snapshots
+  
+  # Reserva capacidade (ODCR) para o clone de cada instância protegida e mostra a utilização
+  %(prog)s --manifest protegidas.json --reserve
+  %(prog)s --manifest protegidas.json --reserve-report
         """
     )
     
-    parser.add_argument('--instance-id', required=True, 
-                        help='ID da instância a ser clonada (ex: i-0123456789abcdef0)')
+    parser.add_argument('--instance-id', 
+                        help='ID da instância a ser clonada (ex: i-0123456789abcdef0). Obrigatório sem --manifest')
     parser.add_argument('--new-ami-id', 
                     help='ID da nova AMI a ser usada (ex: ami-0abcdef1234567890). Se não for fornecido, o script buscará automaticamente as AMIs mais recentes da instância.')
-    parser.add_argument('--profile', required=True, default='dev',
-                        help='Nome do perfil AWS (ex: dev, hml, prd etc... | Padrão: dev)')
+    parser.add_argument('--profile', 
+                        help='Nome do perfil AWS (ex: dev, hml, prd etc...). Obrigatório sem --manifest')
     parser.add_argument('--new-name', 
                         help='Novo nome para a instância. Será formatado como <novo-nome>-DR-DD/MM/AAAA')
     parser.add_argument('--region', default='us-east-1', 
                         help='Região AWS onde a instância de origem está localizada (padrão: us-east-1)')
+    parser.add_argument('--plan', action='store_true',
+                        help='Apenas calcula e exibe os parâmetros da nova instância, sem parar a origem nem criar nada')
+    parser.add_argument('--manifest',
+                        help='Arquivo JSON com a lista de (profile, região, instâncias) para rodar em paralelo (fan-out)')
+    parser.add_argument('--select-tag', action='append', metavar='CHAVE=VALOR',
+                        help='Seleciona as instâncias de origem em running pela tag (CHAVE=VALOR, CHAVE=V1,V2 ou só CHAVE) '
+                             'no lugar de --instance-id. Pode repetir (todas precisam bater)')
+    parser.add_argument('--select-vpc',
+                        help='Seleciona as instâncias de origem em running da VPC (pode combinar com --select-tag)')
+    parser.add_argument('--max-workers', type=int, default=8,
+                        help='Número máximo de jobs simultâneos no fan-out (padrão: 8)')
+    parser.add_argument('--max-per-account', type=int,
+                        help='Número máximo de jobs simultâneos por conta (profile) no fan-out (padrão: valor do manifesto '
+                             'ou sem limite por conta, só o --max-workers)')
+    
+    parser.add_argument('--live', action='store_true',
+                        help='Mostra uma visão ao vivo compacta (uma linha por clone, com ETA) no lugar das mensagens. Só com --manifest')
+    parser.add_argument('--progress-jsonl',
+                        help='Grava os eventos de progresso (fases, chamadas de API, esperas, mensagens) neste arquivo JSONL')
+    parser.add_argument('--convert-volume', action='append', metavar='ORIGEM:DESTINO',
+                        help='Converte volumes de um tipo para outro (ex: gp2:gp3, io1:io2). Pode repetir')
+    parser.add_argument('--min-iops', action='append', metavar='DEVICE:IOPS',
+                        help='IOPS mínimo para um device (ex: /dev/sdf:6000) ou para todos (*:4000). Pode repetir')
+    parser.add_argument('--min-throughput', action='append', metavar='DEVICE:MBPS',
+                        help='Throughput mínimo em MB/s (gp3) para um device ou para todos (*:250). Pode repetir')
+    parser.add_argument('--type-map', action='append', metavar='ORIGEM:CANDIDATO[,CANDIDATO]',
+                        help='Troca o tipo da instância no clone (família ou tipo exato, ex: m5:m7i,m6i ou t3.large:t3a.large). '
+                             'Candidatos seguintes servem de fallback por compatibilidade ou falta de capacidade. Pode repetir')
+    parser.add_argument('--use-standby', action='store_true',
+                        help='Usa o standby parado da instância (warm pool) se existir; senão faz o clone normal')
+    parser.add_argument('--standby-refresh', action='store_true',
+                        help='Cria/atualiza o standby parado da instância com a AMI mais recente, sem parar a origem')
+    parser.add_argument('--standby-cleanup', action='store_true',
+                        help='Termina os standbys da instância')
+    parser.add_argument('--replicas', type=int,
+                        help='Cria N réplicas da instância espalhadas pelas AZs (um run_instances por subnet), sem parar a origem')
+    parser.add_argument('--replica-subnets',
+                        help='Subnets das réplicas separadas por vírgula (padrão: uma por AZ da VPC da origem)')
+    parser.add_argument('--ready-status-checks', action='store_true',
+                        help='Só considera a nova instância pronta com os status checks (instância e sistema) em ok')
+    parser.add_argument('--ready-tcp', action='append', metavar='PORTA',
+                        help='Porta TCP que precisa aceitar conexão no IP privado da nova instância. Pode repetir')
+    parser.add_argument('--ready-http', action='append', metavar='PORTA/CAMINHO',
+                        help='GET http://<ip privado>:PORTA/CAMINHO que precisa responder 2xx/3xx (ex: 8080/health). Pode repetir')
+    parser.add_argument('--ready-ssm', action='append', metavar='COMANDO',
+                        help='Comando executado via SSM que precisa terminar com sucesso (ex: "systemctl is-active app"). Pode repetir')
+    parser.add_argument('--ready-timeout', type=int, default=600,
+                        help='Tempo máximo (s) esperando a instância ficar pronta depois do running (padrão: 600)')
+    parser.add_argument('--ready-interval', type=int, default=5,
+                        help='Intervalo (s) entre as tentativas das checagens de prontidão (padrão: 5)')
+    parser.add_argument('--schedule', action='store_true',
+                        help='No fan-out, começa pelos clones com maior duração prevista (telemetria + volumes/tipo). '
+                             'O depends_on do manifesto é respeitado mesmo sem esta opção')
+    parser.add_argument('--schedule-history', action='append', metavar='ARQUIVO',
+                        help='JSONL de telemetria usado na previsão (padrão: --progress-jsonl e --drill-history). Pode repetir')
+    parser.add_argument('--from-snapshots', action='store_true',
+                        help='Usa os snapshots EBS mais recentes de cada volume (via AMI temporária) no lugar de uma AMI')
+    parser.add_argument('--drill', action='store_true',
+                        help='Drill de DR: clona sem parar a origem, mede o tempo até pronta e termina os clones no fim')
+    parser.add_argument('--drill-subnet',
+                        help='Subnet isolada onde os clones do drill são criados (padrão: subnet_id do manifesto)')
+    parser.add_argument('--drill-security-group', action='append', metavar='SG',
+                        help='Security group da VPC isolada do drill, no lugar dos da origem (padrão: '
+                             'drill_security_groups do manifesto). Pode repetir')
+    parser.add_argument('--drill-allow-source-vpc', action='store_true',
+                        help='Aceita uma subnet de drill na VPC da origem (o clone alcança a produção pelas rotas locais)')
+    parser.add_argument('--drill-history', default='drill_history.jsonl',
+                        help='Arquivo JSONL onde os tempos de cada drill são acumulados (padrão: drill_history.jsonl)')
+    parser.add_argument('--drill-reserve', action='store_true',
+                        help='Cria reservas de capacidade temporárias para os clones do drill (canceladas na limpeza)')
+    parser.add_argument('--reserve', action='store_true',
+                        help='Cria/reaproveita a reserva de capacidade (ODCR) do tipo e AZ do clone, sem parar a origem')
+    parser.add_argument('--reserve-release', action='store_true',
+                        help='Cancela as reservas de capacidade da instância')
+    parser.add_argument('--reserve-report', action='store_true',
+                        help='Mostra a utilização das reservas de capacidade da instância')
     
     args = parser.parse_args()
     
+    selecting = bool(args.select_tag or args.select_vpc)
+    
+    if args.live and not (args.manifest or selecting):
+        parser.error('--live só pode ser usado com --manifest ou com a seleção por tag/VPC')
+    
+    if selecting and (args.manifest or args.instance_id or args.replicas is not None):
+        parser.error('--select-tag/--select-vpc não podem ser usados com --manifest, --instance-id nem --replicas')
+    
+    reserving = args.reserve or args.reserve_release or args.reserve_report
+    
+    if sum([args.plan, args.use_standby, args.standby_refresh, args.standby_cleanup, args.drill,
+            args.reserve, args.reserve_release, args.reserve_report]) > 1:
+        parser.error('use apenas um entre --plan, --use-standby, --standby-refresh, --standby-cleanup, --drill, '
+                     '--reserve, --reserve-release e --reserve-report')
+    
+    if (args.drill_subnet or args.drill_security_group or args.drill_allow_source_vpc) and not args.drill:
+        parser.error('--drill-subnet, --drill-security-group e --drill-allow-source-vpc só podem ser usados com --drill')
+    
+    if args.drill_reserve and not args.drill:
+        parser.error('--drill-reserve só pode ser usado com --drill')
+    
+    if args.replicas is not None:
+        if args.replicas < 1:
+            parser.error('--replicas precisa ser maior que zero')
+        if args.manifest or args.use_standby or args.standby_refresh or args.standby_cleanup or args.drill or reserving:
+            parser.error('--replicas não pode ser usado com --manifest, --drill nem com as opções de standby/reserva')
+    elif args.replica_subnets:
+        parser.error('--replica-subnets só pode ser usado com --replicas')
+    
+    if (args.schedule or args.schedule_history) and not (args.manifest or selecting):
+        parser.error('--schedule e --schedule-history só podem ser usados com --manifest ou com a seleção por tag/VPC')
+    
+    if args.from_snapshots and (args.new_ami_id or args.use_standby or args.standby_refresh or args.standby_cleanup
+                                or reserving):
+        parser.error('--from-snapshots não pode ser usado com --new-ami-id nem com as opções de standby/reserva')
+    
+    if not args.manifest and (not (args.instance_id or selecting) or not args.profile):
+        parser.error('--instance-id (ou --select-tag/--select-vpc) e --profile são obrigatórios quando --manifest não é usado')
+    
+    # O CLI só traduz opções em chamadas da lib; erros da lib viram mensagem + código 1
     try:
-        # Configurar sessão AWS
-        import boto3
-        session = boto3.Session(profile_name=args.profile, region_name=args.region)
-        ec2_client = session.client('ec2')
-        
-        # Se não foi fornecido um ID de AMI, buscar automaticamente
-        ami_id = args.new_ami_id
-        if not ami_id:
-            ami_id = find_instance_amis(ec2_client, args.instance_id)
-            if not ami_id:
-                print("ERRO: Não foi possível encontrar uma AMI para a instância. Por favor, especifique uma AMI usando --new-ami-id.")
-                sys.exit(1)
-        
-        # Clonar a instância
-        clone_instance_with_new_ami(
-            args.instance_id, 
-            ami_id, 
-            args.profile,
-            args.new_name, 
-            args.region
-        )
+        run(args)
+    except CloneError as e:
+        print(f"❌ ERRO: {e}")
+        sys.exit(1)
+    except ImportError as e:
+        if "boto" in str(e):
+            print("ERRO: Lib boto3 é necessária para a execução. Instale com: pip install boto3")
+        else:
+            print(f"ERRO: {e}")
+        sys.exit(1)
     except Exception as e:
         print(f"ERRO: Falha ao clonar instância: {e}")
         sys.exit(1)
 
+def run(args):
+    """
+    Executa o modo escolhido na linha de comando
+    """
+    validate_args(args)
+    
+    volume_rules = parse_volume_rules(args.convert_volume, args.min_iops, args.min_throughput)
+    type_mapping = parse_type_mapping(args.type_map)
+    readiness = parse_readiness(args.ready_status_checks, args.ready_tcp, args.ready_http, args.ready_ssm,
+                                args.ready_timeout, args.ready_interval)
+    
+    selector = parse_selector(args.select_tag, args.select_vpc)
+    
+    if args.progress_jsonl:
+        progress.add_sink(progress.JsonlSink(args.progress_jsonl))
+    
+    if args.manifest:
+        run_manifest(args, volume_rules, type_mapping, readiness)
+        return
+    
+    if selector:
+        from libs.discovery import discover_jobs
+        
+        # As instâncias entram no fan-out conforme as páginas do describe_instances chegam
+        jobs = discover_jobs(args.profile, args.region, selector)
+        run_jobs(args, jobs, args.max_per_account, volume_rules, type_mapping, readiness)
+        return
+    
+    if args.drill:
+        jobs = [{
+            'profile': args.profile,
+            'region': args.region,
+            'instance_id': args.instance_id,
+            'new_ami_id': args.new_ami_id,
+            'subnet_id': None,
+            'new_name': args.new_name,
+            'depends_on': []
+        }]
+        run_drill_jobs(args, jobs, 1, volume_rules, type_mapping, readiness)
+        return
+    
+    if args.reserve or args.reserve_release or args.reserve_report:
+        # Uma instância só é um fan-out de um job (mesmo relatório de utilização)
+        jobs = [{
+            'profile': args.profile,
+            'region': args.region,
+            'instance_id': args.instance_id,
+            'new_ami_id': None,
+            'subnet_id': None,
+            'new_name': None,
+            'depends_on': []
+        }]
+        run_jobs(args, jobs, 1, volume_rules, type_mapping, readiness)
+        return
+    
+    if args.standby_refresh or args.standby_cleanup:
+        from libs.standby import cleanup_standby, refresh_standby
+        
+        if args.standby_refresh:
+            refresh_standby(args.instance_id, args.profile, args.region,
+                            volume_rules=volume_rules, type_mapping=type_mapping)
+        else:
+            cleanup_standby(args.instance_id, args.profile, args.region)
+        return
+    
+    from libs import api
+    
+    if args.replicas:
+        if args.from_snapshots:
+            from libs.snapshots import snapshot_ami
+            with snapshot_ami(args.instance_id, args.profile, args.region) as ami_id:
+                run_replicas(args, ami_id, volume_rules, type_mapping, readiness)
+            return
+        ami_id = args.new_ami_id or api.latest_ami(args.instance_id, args.profile, args.region, interactive=True)
+        run_replicas(args, ami_id, volume_rules, type_mapping, readiness)
+        return
+    
+    if args.plan:
+        result = api.plan(args.instance_id, args.profile, args.region, args.new_ami_id,
+                          volume_rules=volume_rules, type_mapping=type_mapping, interactive=True,
+                          from_snapshots=args.from_snapshots)
+        print("\n📝 Parâmetros calculados para a nova instância:")
+        print(json.dumps(result.run_params, indent=2, default=str))
+        return
+    
+    # Clonar a instância (sem --new-ami-id, busca as AMIs mais recentes e pergunta qual usar)
+    api.clone(args.instance_id, args.profile, args.region, args.new_ami_id, args.new_name,
+              volume_rules=volume_rules, type_mapping=type_mapping, readiness=readiness,
+              use_standby=args.use_standby, interactive=True, from_snapshots=args.from_snapshots)
+
+def validate_args(args):
+    """
+    Valida IDs e profile antes de qualquer import do boto3 ou sessão da AWS (o manifesto é validado ao ser lido)
+    """
+    if args.instance_id:
+        validate_id(args.instance_id, 'instance')
+    if args.new_ami_id:
+        validate_id(args.new_ami_id, 'ami')
+    if args.drill_subnet:
+        validate_id(args.drill_subnet, 'subnet')
+    for group_id in args.drill_security_group or []:
+        validate_id(group_id, 'security_group')
+    for subnet_id in (args.replica_subnets or '').split(','):
+        if subnet_id.strip():
+            validate_id(subnet_id.strip(), 'subnet')
+    if args.profile and not args.manifest:
+        validate_profile(args.profile)
+
+def run_replicas(args, ami_id, volume_rules, type_mapping, readiness):
+    """
+    Executa o modo réplicas (ou só o plano dele)
+    """
+    from libs.replicas import clone_replicas, plan_replicas
+    
+    subnet_ids = [s.strip() for s in args.replica_subnets.split(',') if s.strip()] if args.replica_subnets else None
+    
+    if args.plan:
+        _, _, _, launches, _ = plan_replicas(args.instance_id, ami_id, args.profile, args.region, args.replicas,
+                                             subnet_ids, volume_rules, type_mapping)
+        print("\n📝 Parâmetros calculados para as réplicas (um run_instances por subnet):")
+        print(json.dumps([params for _, params in launches], indent=2, default=str))
+        return
+    
+    clone_replicas(args.instance_id, ami_id, args.profile, args.region, args.replicas, args.new_name,
+                   subnet_ids, volume_rules, type_mapping, readiness)
+
+def run_manifest(args, volume_rules, type_mapping, readiness):
+    """
+    Executa o modo fan-out a partir do manifesto
+    """
+    from libs.manifest import load_manifest
+    
+    jobs, manifest_per_account, manifest_volume_rules, manifest_type_mapping, manifest_readiness = load_manifest(args.manifest)
+    max_per_account = args.max_per_account or manifest_per_account
+    
+    # Regras passadas na linha de comando têm prioridade sobre as do manifesto
+    if not any(volume_rules.values()):
+        volume_rules = manifest_volume_rules
+    if not type_mapping:
+        type_mapping = manifest_type_mapping
+    if not readiness:
+        readiness = manifest_readiness
+    
+    run_jobs(args, jobs, max_per_account, volume_rules, type_mapping, readiness)
+
+def run_jobs(args, jobs, max_per_account, volume_rules, type_mapping, readiness):
+    """
+    Executa o fan-out (ou o drill) dos jobs do manifesto ou da seleção por tag/VPC
+    """
+    from libs.fanout import run_fanout, generate_fanout_report
+    
+    if args.drill:
+        run_drill_jobs(args, jobs, max_per_account, volume_rules, type_mapping, readiness)
+        return
+    
+    if args.plan:
+        mode = 'plan'
+    elif args.standby_refresh:
+        mode = 'standby-refresh'
+    elif args.standby_cleanup:
+        mode = 'standby-cleanup'
+    elif args.reserve:
+        mode = 'reserve'
+    elif args.reserve_release:
+        mode = 'reserve-release'
+    elif args.reserve_report:
+        mode = 'reserve-report'
+    else:
+        mode = 'clone'
+    
+    live_sink = None
+    if args.live:
+        live_sink = progress.add_sink(progress.TerminalSink())
+        progress.set_console(False)
+    
+    try:
+        results = run_fanout(jobs, mode, args.max_workers, max_per_account, volume_rules, type_mapping,
+                             args.use_standby, readiness, from_snapshots=args.from_snapshots,
+                             schedule=args.schedule, schedule_history=schedule_history(args))
+    finally:
+        if live_sink:
+            progress.remove_sink(live_sink)
+            progress.set_console(True)
+    
+    if not generate_fanout_report(results, mode):
+        sys.exit(1)
+
+def run_drill_jobs(args, jobs, max_per_account, volume_rules, type_mapping, readiness):
+    """
+    Executa o drill de DR (com limpeza e histórico) e mostra o relatório
+    """
+    from libs.drill import run_drill
+    from libs.fanout import generate_fanout_report
+    
+    live_sink = None
+    if args.live:
+        live_sink = progress.add_sink(progress.TerminalSink())
+        progress.set_console(False)
+    
+    try:
+        _, results = run_drill(jobs, args.max_workers, max_per_account, volume_rules, type_mapping, readiness,
+                               args.drill_history, args.drill_subnet, args.from_snapshots, args.schedule,
+                               schedule_history(args), args.drill_reserve, args.drill_security_group,
+                               args.drill_allow_source_vpc)
+    finally:
+        if live_sink:
+            progress.remove_sink(live_sink)
+            progress.set_console(True)
+    
+    if not generate_fanout_report(results, 'drill'):
+        sys.exit(1)
+
+def schedule_history(args):
+    """
+    Arquivos de telemetria do agendador: os informados ou, por padrão, o de progresso e o de drills
+    """
+    if args.schedule_history:
+        return args.schedule_history
+    return [path for path in (args.progress_jsonl, args.drill_history) if path]
+
 if __name__ == "__main__":
     main()
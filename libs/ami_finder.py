@@ -1,10 +1,16 @@
 #!/usr/bin/env python3
+from libs.progress import say
 
-def find_instance_amis(ec2_client, instance_id):
+# Tag das AMIs temporárias registradas a partir de snapshots (ver libs.snapshots); não são backups
+TEMP_AMI_TAG = 'TemporaryCloneAmi'
+
+def find_instance_amis(ec2_client, instance_id, interactive=True):
     """
     Busca as AMIs mais recentes criadas a partir da instância especificada
+
+    Com interactive=False (modo fan-out) não pergunta nada e usa a mais recente
     """
-    print(f"🔍 Buscando AMIs disponíveis para a instância {instance_id}...")
+    say(f"🔍 Buscando AMIs disponíveis para a instância {instance_id}...")
     
     try:
         # Busca todas as AMIs de propriedade da conta atual
@@ -21,6 +27,10 @@ def find_instance_amis(ec2_client, instance_id):
         # Filtra as AMIs que contêm o ID da instância na descrição (criadas pelo AWS Backup)
         instance_amis = []
         for image in response['Images']:
+            # A AMI temporária de outro clone tem o ID da instância no nome, mas não é um backup
+            if any(tag['Key'] == TEMP_AMI_TAG for tag in image.get('Tags', [])):
+                continue
+
             description = image.get('Description', '')
             name = image.get('Name', '')
             
@@ -39,20 +49,26 @@ def find_instance_amis(ec2_client, instance_id):
         instance_amis.sort(key=lambda x: x['CreationDate'], reverse=True)
         
         if not instance_amis:
-            print(f"⚠️  Nenhuma AMI encontrada para a instância {instance_id}.")
+            say(f"⚠️  Nenhuma AMI encontrada para a instância {instance_id}.")
             return None
         
         # Pega as 3 AMIs mais recentes (ou menos se não houver 3)
         recent_amis = instance_amis[:min(3, len(instance_amis))]
         
-        print(f"\n📋 AMIs mais recentes para a instância {instance_id}:")
+        say(f"\n📋 AMIs mais recentes para a instância {instance_id}:")
         
         for i, ami in enumerate(recent_amis, 1):
             # Formata a data de criação para exibição
             creation_date = ami['CreationDate'].split('T')[0]  # Pega apenas a parte da data
             
             # Exibe informações da AMI
-            print(f"{i} - {ami['ImageId']} | {creation_date} | {ami['Name'] or ami['Description'][:50]}")
+            say(f"{i} - {ami['ImageId']} | {creation_date} | {ami['Name'] or ami['Description'][:50]}")
+        
+        # Sem operador para responder, vai direto na mais recente
+        if not interactive:
+            selected_ami = recent_amis[0]['ImageId']
+            say(f"✅ Usando a AMI mais recente: {selected_ami}")
+            return selected_ami
         
         # Pede ao usuário para escolher uma AMI
         while True:
@@ -61,20 +77,20 @@ def find_instance_amis(ec2_client, instance_id):
             if choice == "":
                 # Usa a AMI mais recente
                 selected_ami = recent_amis[0]['ImageId']
-                print(f"✅ Usando a AMI mais recente: {selected_ami}")
+                say(f"✅ Usando a AMI mais recente: {selected_ami}")
                 return selected_ami
             
             try:
                 choice_num = int(choice)
                 if 1 <= choice_num <= len(recent_amis):
                     selected_ami = recent_amis[choice_num - 1]['ImageId']
-                    print(f"✅ AMI selecionada: {selected_ami}")
+                    say(f"✅ AMI selecionada: {selected_ami}")
                     return selected_ami
                 else:
-                    print(f"❌ Número inválido. Escolha entre 1 e {len(recent_amis)}.")
+                    say(f"❌ Número inválido. Escolha entre 1 e {len(recent_amis)}.")
             except ValueError:
-                print("❌ Entrada inválida. Digite um número ou pressione Enter.")
+                say("❌ Entrada inválida. Digite um número ou pressione Enter.")
     
     except Exception as e:
-        print(f"❌ Erro ao buscar AMIs: {e}")
+        say(f"❌ Erro ao buscar AMIs: {e}")
         return None
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+from contextlib import ExitStack, contextmanager
+
+from libs import progress
+from libs.ami_finder import find_instance_amis
+from libs.ec2_clone_functions import aws_errors, clone_instance_with_new_ami, plan_clone
+from libs.errors import AmiNotFoundError
+from libs.sessions import get_session, session_client
+from libs.snapshots import snapshot_ami
+from libs.validation import validate_id, validate_profile
+
+'''
+API para usar o clone de dentro de outro programa (pools de threads, orquestradores).
+
+Nada aqui chama sys.exit: os erros sobem como as exceções de libs.errors (IDs e profile
+inválidos dão ConfigError antes de qualquer sessão da AWS; os erros do boto3/botocore, como
+ClientError, credenciais ausentes, profile inexistente ou waiter esgotado, viram AwsError,
+com o ID da nova instância quando ela já tinha sido criada). O resultado
+é um objeto compacto (__slots__) com IDs, AZ/subnet escolhidas e o tempo de cada fase.
+
+    from libs import api, progress
+    from libs.errors import CloneError
+
+    progress.set_console(False)     # opcional: sem mensagens no stdout
+    try:
+        result = api.clone('i-0123456789abcdef0', 'dev', 'us-east-1')
+        print(result.new_instance_id, result.availability_zone, result.time_to_running)
+    except CloneError as e:
+        ...
+
+Várias chamadas podem rodar em paralelo no mesmo processo (uma por thread), desde que
+sejam instâncias de origem diferentes.
+'''
+
+# Fases que contam no tempo até running / até pronta (a partir do launch)
+RUNNING_PHASES = ('launch', 'tag', 'wait_running')
+
+class CloneResult:
+    """
+    Resultado de um clone
+    """
+
+    __slots__ = ('source_instance_id', 'new_instance_id', 'ami_id', 'instance_type', 'availability_zone',
+                 'subnet_id', 'private_ip', 'placement_group', 'standby', 'phase_timings',
+                 'time_to_running', 'time_to_ready')
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return (f"CloneResult({self.source_instance_id} -> {self.new_instance_id}, {self.instance_type}, "
+                f"{self.availability_zone}/{self.subnet_id})")
+
+class PlanResult:
+    """
+    Resultado de um plano (nada foi criado)
+    """
+
+    __slots__ = ('source_instance_id', 'ami_id', 'instance_type', 'availability_zone', 'subnet_id',
+                 'placement_group', 'run_params', 'phase_timings')
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return (f"PlanResult({self.source_instance_id}, {self.ami_id}, {self.instance_type}, "
+                f"{self.availability_zone}/{self.subnet_id})")
+
+def clone(instance_id, profile, region='us-east-1', new_ami_id=None, new_name=None, subnet_id=None,
+          volume_rules=None, type_mapping=None, readiness=None, use_standby=False, interactive=False,
+          clone_id=None, stop_source=True, tags=None, from_snapshots=False, drill_id=None, drill_network=None):
+    """
+    Clona a instância e devolve um CloneResult
+
+    Sem new_ami_id usa a AMI mais recente da instância. Com use_standby tenta primeiro
+    o standby do warm pool. clone_id identifica os eventos de progresso (padrão: instance_id).
+    stop_source=False deixa a origem ligada; tags ([{'Key': ..., 'Value': ...}]) vão na nova
+    instância e nos volumes já na criação. Com from_snapshots (e sem new_ami_id) o clone sai dos
+    snapshots mais recentes de cada volume, por uma AMI temporária (ver libs.snapshots).
+    drill_id marca um clone de drill de DR, com a rede isolada por drill_network (ver libs.drill).
+    """
+    _validate(instance_id, profile, new_ami_id, subnet_id)
+    with _tracked(clone_id or instance_id) as timer, aws_errors():
+        session = get_session(profile)
+        ec2_client = session_client(session, 'ec2', region)
+        new_instance_id, ami_id = None, new_ami_id
+        if use_standby:
+            from libs.standby import clone_from_standby
+            new_instance_id = clone_from_standby(instance_id, profile, region, new_name, readiness)
+
+        standby = new_instance_id is not None
+        if not standby:
+            with ExitStack() as stack:
+                if not ami_id:
+                    ami_id = resolve_ami(stack, instance_id, profile, region, interactive, from_snapshots, ec2_client)
+                new_instance_id = clone_instance_with_new_ami(
+                    instance_id, ami_id, profile, new_name, region, subnet_id=subnet_id, interactive=interactive,
+                    volume_rules=volume_rules, type_mapping=type_mapping, readiness=readiness,
+                    stop_source=stop_source, extra_tags=tags, drill_id=drill_id, drill_network=drill_network,
+                    session=session, ec2_client=ec2_client
+                )
+
+    with aws_errors(new_instance_id):
+        new_instance = ec2_client.describe_instances(
+            InstanceIds=[new_instance_id]
+        )['Reservations'][0]['Instances'][0]
+
+    timings = dict(timer.durations)
+    time_to_running = sum(timings.get(name, 0.0) for name in RUNNING_PHASES)
+    return CloneResult(
+        source_instance_id=instance_id,
+        new_instance_id=new_instance_id,
+        ami_id=new_instance['ImageId'],
+        instance_type=new_instance['InstanceType'],
+        availability_zone=new_instance['Placement'].get('AvailabilityZone'),
+        subnet_id=new_instance.get('SubnetId'),
+        private_ip=new_instance.get('PrivateIpAddress'),
+        placement_group=new_instance['Placement'].get('GroupName') or None,
+        standby=standby,
+        phase_timings=timings,
+        time_to_running=time_to_running,
+        # Se as checagens não passassem teria subido NotReadyError
+        time_to_ready=time_to_running + timings['wait_ready'] if 'wait_ready' in timings else None
+    )
+
+def plan(instance_id, profile, region='us-east-1', new_ami_id=None, subnet_id=None, volume_rules=None,
+         type_mapping=None, preflight=True, interactive=False, clone_id=None, from_snapshots=False):
+    """
+    Calcula (e, com preflight, valida) os parâmetros do clone sem parar nem criar nada
+
+    Com from_snapshots a AMI temporária só existe durante o plano, então o ImageId do
+    run_params não serve para um launch posterior.
+    """
+    _validate(instance_id, profile, new_ami_id, subnet_id)
+    with _tracked(clone_id or instance_id) as timer, aws_errors(), ExitStack() as stack:
+        session = get_session(profile)
+        ec2_client = session_client(session, 'ec2', region)
+        ami_id = new_ami_id or resolve_ami(stack, instance_id, profile, region, interactive, from_snapshots,
+                                           ec2_client)
+        run_params = plan_clone(instance_id, ami_id, profile, region, subnet_id, interactive, preflight,
+                                volume_rules, type_mapping, session=session, ec2_client=ec2_client)
+
+    interfaces = run_params.get('NetworkInterfaces') or [{}]
+    return PlanResult(
+        source_instance_id=instance_id,
+        ami_id=ami_id,
+        instance_type=run_params['InstanceType'],
+        availability_zone=run_params.get('Placement', {}).get('AvailabilityZone'),
+        subnet_id=run_params.get('SubnetId') or interfaces[0].get('SubnetId'),
+        placement_group=run_params.get('Placement', {}).get('GroupName'),
+        run_params=run_params,
+        phase_timings=dict(timer.durations)
+    )
+
+def latest_ami(instance_id, profile, region, interactive=False, ec2_client=None):
+    """
+    AMI mais recente da instância (com interactive=True deixa o operador escolher)
+    """
+    with aws_errors(), progress.phase('discover'):
+        ec2_client = ec2_client or session_client(get_session(profile), 'ec2', region)
+        ami_id = find_instance_amis(ec2_client, instance_id, interactive)
+    if not ami_id:
+        raise AmiNotFoundError(f"Não foi possível encontrar uma AMI para a instância {instance_id}. "
+                               "Especifique uma AMI (--new-ami-id / new_ami_id) ou use os snapshots "
+                               "(--from-snapshots / from_snapshots=True).")
+    return ami_id
+
+def resolve_ami(stack, instance_id, profile, region, interactive, from_snapshots, ec2_client=None):
+    """
+    AMI mais recente ou, com from_snapshots, a AMI temporária (desregistrada na saída do stack)
+    """
+    if from_snapshots:
+        return stack.enter_context(snapshot_ami(instance_id, profile, region))
+    return latest_ami(instance_id, profile, region, interactive, ec2_client)
+
+def _validate(instance_id, profile, new_ami_id, subnet_id):
+    """
+    Confere os IDs e o profile antes de criar a sessão (profile None = cadeia padrão de credenciais)
+    """
+    validate_id(instance_id, 'instance')
+    if new_ami_id:
+        validate_id(new_ami_id, 'ami')
+    if subnet_id:
+        validate_id(subnet_id, 'subnet')
+    if profile is not None:
+        validate_profile(profile)
+
+@contextmanager
+def _tracked(clone_id):
+    """
+    Define o clone_id da thread durante a chamada e mede o tempo de cada fase
+    """
+    previous = progress.current_clone()
+    timer = progress.add_sink(progress.PhaseTimer(clone_id))
+    progress.set_current_clone(clone_id)
+    try:
+        yield timer
+    finally:
+        progress.remove_sink(timer)
+        progress.set_current_clone(previous)
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+from libs.errors import ConfigError
+from libs.progress import say
+from libs.sessions import get_client
+from libs.validation import validate_id
+
+'''
+Seleção das instâncias de origem por tag e/ou VPC ("tudo com DR-Tier=1 na VPC X").
+
+Os filtros vão para o describe_instances (filtragem no servidor) e as páginas são lidas
+sob demanda: cada instância encontrada vira um job na hora, então o fan-out já começa o
+preflight das primeiras enquanto as próximas páginas ainda estão sendo buscadas, sem
+carregar o inventário inteiro da conta.
+
+Só entram instâncias em running (depois de um DR a origem antiga fica parada e a ativa
+é o clone). Standbys, clones de drill e réplicas carregam as tags da origem, mas são
+ignorados pelas tags que este projeto coloca neles.
+'''
+
+# Tags que marcam instâncias criadas por este projeto que não são origens
+GENERATED_TAGS = ('StandbyFor', 'DrillId', 'ReplicaGroup')
+
+# Página do describe_instances (máximo da API: 1000)
+PAGE_SIZE = 200
+
+def parse_selector(tags=None, vpc_id=None):
+    """
+    Monta o seletor a partir das opções (devolve None se nada foi pedido)
+
+    tags: ['DR-Tier=1', 'Env=prd,hml', 'Backup'] (sem '=' basta a tag existir; vírgula = qualquer um dos valores)
+    """
+    selected = {}
+    for item in tags or []:
+        key, equals, values = str(item).partition('=')
+        key = key.strip()
+        if not key or (equals and not values.strip()):
+            raise ConfigError(f"Seleção por tag inválida '{item}'. Use CHAVE=VALOR, CHAVE=V1,V2 ou só CHAVE")
+        selected[key] = [value.strip() for value in values.split(',') if value.strip()] if equals else []
+
+    if vpc_id is not None:
+        validate_id(vpc_id, 'vpc')
+
+    if not selected and not vpc_id:
+        return None
+    return {'tags': selected, 'vpc_id': vpc_id}
+
+def describe_selector(selector):
+    """
+    Descrição curta do seletor ('DR-Tier=1, VPC vpc-0abc')
+    """
+    parts = [f"{key}={','.join(values)}" if values else key for key, values in selector['tags'].items()]
+    if selector['vpc_id']:
+        parts.append(f"VPC {selector['vpc_id']}")
+    return ", ".join(parts)
+
+def selector_filters(selector):
+    """
+    Filtros do describe_instances equivalentes ao seletor
+    """
+    filters = [{'Name': 'instance-state-name', 'Values': ['running']}]
+    for key, values in selector['tags'].items():
+        if values:
+            filters.append({'Name': f'tag:{key}', 'Values': values})
+        else:
+            filters.append({'Name': 'tag-key', 'Values': [key]})
+    if selector['vpc_id']:
+        filters.append({'Name': 'vpc-id', 'Values': [selector['vpc_id']]})
+    return filters
+
+def iter_selected_instances(ec2_client, selector):
+    """
+    Percorre as instâncias que batem com o seletor, uma página por vez
+    """
+    paginator = ec2_client.get_paginator('describe_instances')
+    pages = paginator.paginate(Filters=selector_filters(selector), PaginationConfig={'PageSize': PAGE_SIZE})
+    for page in pages:
+        for reservation in page['Reservations']:
+            for instance in reservation['Instances']:
+                tag_keys = {tag['Key'] for tag in instance.get('Tags', [])}
+                if tag_keys.intersection(GENERATED_TAGS):
+                    continue
+                yield instance
+
+def discover_jobs(profile, region, selector, subnet_id=None):
+    """
+    Gera um job de fan-out por instância encontrada, à medida que as páginas chegam
+    """
+    ec2_client = get_client(profile, region)
+
+    say(f"🔎 [{profile}/{region}] Buscando instâncias com {describe_selector(selector)}...")
+    found = 0
+    for instance in iter_selected_instances(ec2_client, selector):
+        found += 1
+        say(f"  ➕ [{profile}/{region}] {instance['InstanceId']}")
+        yield {
+            'profile': profile,
+            'region': region,
+            'instance_id': instance['InstanceId'],
+            'new_ami_id': None,
+            'subnet_id': subnet_id,
+            'new_name': None,
+            'depends_on': []
+        }
+
+    if not found:
+        say(f"⚠️  [{profile}/{region}] Nenhuma instância em running com {describe_selector(selector)}")
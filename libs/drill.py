@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+import json
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from libs.errors import ConfigError
+from libs.fanout import run_fanout
+from libs.progress import bind_clone, format_seconds, say, wait_for_state
+from libs.readiness import parse_readiness
+from libs.reservations import release_drill_reservations, reserve_for_drill
+from libs.sessions import get_client
+
+'''
+Drill de DR: clona um conjunto de instâncias numa subnet isolada sem parar as origens,
+mede o tempo até pronta, termina os clones e guarda os tempos num histórico local.
+
+Os clones levam a tag DrillId (única por drill) já no run_instances, na instância e nos
+volumes. A limpeza só termina instâncias com essa tag E com SourceInstanceId (colocada
+pelo apply_tags) apontando para uma origem do drill, e nunca uma das próprias origens.
+Volumes que sobram (DeleteOnTermination=False copiado da origem) e têm a tag do drill
+são apagados depois. A rede do clone é isolada: origens com mais de uma ENI são recusadas,
+a subnet precisa ser de outra VPC (a da origem alcança a produção pelas rotas locais) e
+os security groups da origem são trocados pelos do drill. Com reserve, cada clone ganha antes uma reserva de capacidade
+temporária (tag DrillId), cancelada na mesma limpeza.
+
+O histórico é um JSONL (uma linha por instância por drill). A cada drill o RTO de cada
+instância é comparado com a mediana dos drills anteriores para mostrar regressões.
+'''
+
+DRILL_TAG = 'DrillId'
+DEFAULT_HISTORY = 'drill_history.jsonl'
+
+# Quantos drills anteriores entram na mediana e a partir de quanto acima dela é regressão
+TREND_WINDOW = 5
+REGRESSION_THRESHOLD = 1.2
+
+def run_drill(jobs, max_workers=8, max_per_account=None, volume_rules=None, type_mapping=None, readiness=None,
+              history_path=DEFAULT_HISTORY, subnet_id=None, from_snapshots=False, schedule=False,
+              schedule_history=None, reserve=False, security_groups=None, allow_source_vpc=False):
+    """
+    Executa o drill completo (clone, prontidão, limpeza, histórico)
+
+    subnet_id, se informado, vale para todos os jobs; senão cada job precisa do seu subnet_id.
+    security_groups (senão os drill_security_groups do job) substituem os da origem; a subnet
+    precisa estar fora da VPC da origem, a não ser com allow_source_vpc (ver
+    ec2_network_utils.isolate_drill_network).
+    from_snapshots testa a restauração a partir dos snapshots mais recentes (ver libs.snapshots).
+    schedule ordena os clones pela duração prevista (ver libs.scheduler); o próprio histórico
+    do drill sempre entra como telemetria. reserve cria reservas de capacidade temporárias
+    para os clones (ver libs.reservations), canceladas na limpeza.
+    Devolve (drill_id, resultados do fan-out).
+    """
+    # O drill precisa da lista completa (validação das subnets e limpeza), então a seleção por tag é lida toda aqui
+    jobs = [
+        dict(job, subnet_id=subnet_id or job['subnet_id'],
+             drill_network={'security_groups': security_groups or job.get('drill_security_groups') or [],
+                            'allow_source_vpc': allow_source_vpc})
+        for job in jobs
+    ]
+
+    missing = [job['instance_id'] for job in jobs if not job['subnet_id']]
+    if missing:
+        raise ConfigError(f"O drill precisa de uma subnet isolada (--drill-subnet ou subnet_id no manifesto) para: "
+                          f"{', '.join(missing)}")
+
+    # Sem checagem configurada, pelo menos os status checks definem o "pronta"
+    readiness = readiness or parse_readiness(status_checks=True)
+
+    drill_id = f"drill-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+    say(f"\n🧯 Drill de DR {drill_id}: {len(jobs)} instância(s), as origens continuam ligadas")
+
+    try:
+        if reserve:
+            reserve_for_drill(jobs, drill_id, type_mapping, max_workers)
+        results = run_fanout(jobs, 'drill', max_workers, max_per_account, volume_rules, type_mapping,
+                             readiness=readiness, tags=[{'Key': DRILL_TAG, 'Value': drill_id}],
+                             from_snapshots=from_snapshots, schedule=schedule,
+                             schedule_history=[history_path] + [p for p in schedule_history or [] if p != history_path],
+                             drill_id=drill_id)
+    finally:
+        # Limpa mesmo se o drill falhar ou for interrompido
+        teardown_drill(jobs, drill_id)
+
+    append_history(history_path, drill_id, results)
+    report_trend(history_path, drill_id, results)
+    return drill_id, results
+
+def teardown_drill(jobs, drill_id):
+    """
+    Termina os clones do drill (e os volumes que sobrarem) em todas as contas/regiões
+    """
+    sources = {}
+    for job in jobs:
+        sources.setdefault((job['profile'], job['region']), set()).add(job['instance_id'])
+    # Seleção que não encontrou nenhuma instância: nada foi criado
+    if not sources:
+        return
+
+    say(f"\n🧹 Limpando os clones do drill {drill_id}...")
+    with ThreadPoolExecutor(max_workers=len(sources)) as executor:
+        futures = [
+            executor.submit(bind_clone(teardown_account), profile, region, drill_id, instance_ids)
+            for (profile, region), instance_ids in sources.items()
+        ]
+        for future in futures:
+            future.result()
+
+def teardown_account(profile, region, drill_id, source_ids):
+    """
+    Limpeza do drill em um par (profile, região)
+    """
+    try:
+        ec2_client = get_client(profile, region)
+
+        clone_ids = find_drill_clones(ec2_client, drill_id, source_ids)
+        if clone_ids:
+            ec2_client.terminate_instances(InstanceIds=clone_ids)
+            say(f"🗑️  [{profile}/{region}] Terminando {', '.join(clone_ids)}")
+            wait_for_state(ec2_client, 'instance_terminated', drill_id, InstanceIds=clone_ids)
+
+        leftover = ec2_client.describe_volumes(
+            Filters=[
+                {'Name': f'tag:{DRILL_TAG}', 'Values': [drill_id]},
+                {'Name': 'status', 'Values': ['available']}
+            ]
+        )['Volumes']
+        for volume in leftover:
+            ec2_client.delete_volume(VolumeId=volume['VolumeId'])
+        if leftover:
+            say(f"🗑️  [{profile}/{region}] Volumes apagados: {', '.join(v['VolumeId'] for v in leftover)}")
+
+        # Reserva cobra mesmo vazia: as do drill saem junto com os clones
+        release_drill_reservations(ec2_client, drill_id)
+    except Exception as e:
+        # A limpeza não pode esconder o erro original do drill
+        say(f"⚠️  [{profile}/{region}] Falha na limpeza do drill: {e}. "
+            f"Termine manualmente as instâncias/volumes e cancele as reservas com a tag {DRILL_TAG}={drill_id}")
+
+def find_drill_clones(ec2_client, drill_id, source_ids):
+    """
+    Instâncias do drill que podem ser terminadas com segurança
+    """
+    clone_ids = []
+    paginator = ec2_client.get_paginator('describe_instances')
+    for page in paginator.paginate(
+        Filters=[
+            {'Name': f'tag:{DRILL_TAG}', 'Values': [drill_id]},
+            {'Name': 'instance-state-name', 'Values': ['pending', 'running', 'stopping', 'stopped']}
+        ]
+    ):
+        for reservation in page['Reservations']:
+            for instance in reservation['Instances']:
+                tags = {tag['Key']: tag['Value'] for tag in instance.get('Tags', [])}
+                if instance['InstanceId'] in source_ids:
+                    say(f"⚠️  {instance['InstanceId']} é uma origem do drill; não será terminada")
+                elif tags.get('SourceInstanceId') not in source_ids and tags.get('SourceInstanceId') is not None:
+                    say(f"⚠️  {instance['InstanceId']} tem SourceInstanceId fora do drill; não será terminada")
+                else:
+                    # Sem SourceInstanceId: o clone falhou entre o launch e as tags, mas a DrillId é deste drill
+                    clone_ids.append(instance['InstanceId'])
+    return clone_ids
+
+def append_history(history_path, drill_id, results):
+    """
+    Acrescenta os resultados do drill no histórico (uma linha JSON por instância)
+    """
+    timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    with open(history_path, 'a') as f:
+        for r in results:
+            job, clone = r['job'], r['clone_result']
+            entry = {
+                'timestamp': timestamp,
+                'drill_id': drill_id,
+                'profile': job['profile'],
+                'region': job['region'],
+                'instance_id': job['instance_id'],
+                'status': r['status'],
+                'new_instance_id': r['new_instance_id'],
+                'instance_type': clone.instance_type if clone else None,
+                'availability_zone': clone.availability_zone if clone else None,
+                'time_to_running': clone.time_to_running if clone else None,
+                'time_to_ready': clone.time_to_ready if clone else None,
+                'phase_timings': clone.phase_timings if clone else None,
+                'error': r['error']
+            }
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    say(f"\n📚 Histórico do drill gravado em {history_path}")
+
+def load_history(history_path):
+    """
+    Lê o histórico de drills (linhas inválidas são ignoradas)
+    """
+    entries = []
+    try:
+        with open(history_path) as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue
+    except FileNotFoundError:
+        pass
+    return entries
+
+def rto_of(entry):
+    """
+    RTO de uma execução: tempo até pronta (ou até running, se não houver)
+    """
+    if entry.get('status') != 'ok':
+        return None
+    return entry.get('time_to_ready') if entry.get('time_to_ready') is not None else entry.get('time_to_running')
+
+def report_trend(history_path, drill_id, results):
+    """
+    Compara o RTO de cada instância com a mediana dos drills anteriores
+
+    Devolve a lista de instâncias com regressão.
+    """
+    history = load_history(history_path)
+    regressions = []
+
+    say(f"\n📈 RTO por instância (atual vs mediana dos últimos {TREND_WINDOW} drills):")
+    for r in results:
+        job = r['job']
+        key = (job['profile'], job['region'], job['instance_id'])
+        runs = [e for e in history if (e['profile'], e['region'], e['instance_id']) == key]
+        current = next((rto_of(e) for e in runs if e['drill_id'] == drill_id), None)
+        previous = [rto_of(e) for e in runs if e['drill_id'] != drill_id]
+        previous = [value for value in previous if value is not None][-TREND_WINDOW:]
+
+        label = f"{job['profile']}/{job['region']}/{job['instance_id']}"
+        if current is None:
+            say(f"  ❌ {label}: sem RTO neste drill ({r['error'] or 'falhou'})")
+            continue
+        if not previous:
+            say(f"  🆕 {label}: {format_seconds(current)} (primeiro drill)")
+            continue
+
+        baseline = statistics.median(previous)
+        change = (current - baseline) / baseline * 100 if baseline else 0.0
+        line = f"{label}: {format_seconds(current)} (mediana {format_seconds(baseline)}, {change:+.0f}%)"
+        if baseline and current > baseline * REGRESSION_THRESHOLD:
+            regressions.append(label)
+            say(f"  ⚠️  {line} REGRESSÃO")
+        else:
+            say(f"  ✅ {line}")
+
+    return regressions
@@ -1,18 +1,55 @@
 #!/usr/bin/env python3
-import boto3
-import sys
+import time
 from datetime import datetime
 
-# Importa as funções de volume do novo módulo
-try:
-    from libs.ec2_volume_utils import prepare_root_volume_mapping, add_block_device_mappings
-except ImportError:
-    # Se o módulo não estiver disponível, usa as funções locais
-    pass
+from contextlib import contextmanager
 
-def clone_instance_with_new_ami(instance_id, new_ami_id, profile, new_name, source_region, target_region=None):
+from botocore.exceptions import BotoCoreError, ClientError
+
+from libs import progress
+from libs.ec2_network_utils import add_network_interfaces, add_placement_group, isolate_drill_network
+from libs.ec2_volume_utils import add_block_device_mappings
+from libs.errors import AmiNotFoundError, AwsError, ConfigError, InstanceNotFoundError, NotReadyError, PreflightError
+from libs.instance_types import apply_instance_type, launch_with_fallback
+from libs.preflight import run_preflight
+from libs.progress import format_seconds, phase, say, wait_for_state
+from libs.readiness import RUNNING_POLL_DELAY, wait_until_ready
+from libs.reservations import apply_capacity_reservation, reserved_subnet
+from libs.sessions import get_session, session_client
+
+def clone_instance_with_new_ami(instance_id, new_ami_id, profile, new_name, source_region, target_region=None,
+                                subnet_id=None, interactive=True, run_params=None, preflight=True, volume_rules=None,
+                                type_mapping=None, readiness=None, stop_source=True, extra_tags=None, drill_id=None,
+                                drill_network=None, session=None, ec2_client=None):
     """
     Função principal que coordena todo o processo de clonagem da instância
+
+    subnet_id e interactive permitem rodar sem perguntas (usado pelo fan-out).
+    Se run_params vier pronto (já validado no preflight do lote), não é recalculado.
+    volume_rules são as regras de reescrita de volumes (ver ec2_volume_utils.parse_volume_rules).
+    type_mapping é o mapeamento de tipos de instância (ver instance_types.parse_type_mapping).
+    readiness são as checagens de prontidão depois do running (ver readiness.parse_readiness).
+    stop_source=False deixa a origem ligada (drill de DR); extra_tags vão na instância e nos
+    volumes já no run_instances, então ficam mesmo se o clone falhar depois do launch.
+    drill_id marca um clone de drill, com a rede isolada por drill_network (ver
+    ec2_network_utils.isolate_drill_network).
+    session/ec2_client permitem reaproveitar os de quem chamou; sem eles usa os compartilhados
+    do profile (ver libs.sessions).
+    """
+    # Sem clone_id definido (uso fora do fan-out), os eventos ficam com o ID da origem
+    if progress.current_clone() is None:
+        progress.set_current_clone(instance_id)
+    
+    with phase('clone'):
+        return run_clone(instance_id, new_ami_id, profile, new_name, source_region, target_region,
+                         subnet_id, interactive, run_params, preflight, volume_rules, type_mapping, readiness,
+                         stop_source, extra_tags, drill_id, drill_network, session, ec2_client)
+
+def run_clone(instance_id, new_ami_id, profile, new_name, source_region, target_region,
+              subnet_id, interactive, run_params, preflight, volume_rules, type_mapping, readiness,
+              stop_source=True, extra_tags=None, drill_id=None, drill_network=None, session=None, ec2_client=None):
+    """
+    Executa as fases do clone (chamada por clone_instance_with_new_ami)
     """
     # Captura o horário de início
     start_time = datetime.now().strftime("%H:%M")
@@ -23,83 +60,183 @@ def clone_instance_with_new_ami(instance_id, new_ami_id, profile, new_name, sour
     
     # Verificamos se estamos tentando clonar para outra região
     if target_region != source_region:
-        print("ERRO: A clonagem entre regiões foi descontinuada. Use a mesma região de origem e destino.")
-        sys.exit(1)
+        raise ConfigError("A clonagem entre regiões foi descontinuada. Use a mesma região de origem e destino.")
     
-    print(f"\n🔄 Iniciando clonagem da instância {instance_id} com a nova AMI {new_ami_id}...\n")
+    say(f"\n🔄 Iniciando clonagem da instância {instance_id} com a nova AMI {new_ami_id}...\n")
 
-    # Definindo profile
-    session = boto3.Session(profile_name=profile)
-    
-    # Definindo as variaveis de para não ter que escrever a chamada do boto toda a hora 
-    ec2_client = session.client('ec2', region_name=source_region)
+    # Definindo profile (sessão e client compartilhados, a não ser que quem chamou já tenha os seus)
+    session = session or get_session(profile)
+    ec2_client = ec2_client or session_client(session, 'ec2', source_region)
     
-    # Pega os dados da instância de origem
-    print("📋 Obtendo informações da instância de origem...")
-    instance = get_instance_data(ec2_client, instance_id)
+    with phase('discover'):
+        # Pega os dados da instância de origem
+        say("📋 Obtendo informações da instância de origem...")
+        instance = get_instance_data(ec2_client, instance_id)
+        
+        # Verifica se a AMI existe na região
+        say("🔍 Verificando se a AMI existe...")
+        verify_ami_exists(ec2_client, new_ami_id, source_region)
     
-    # Verifica se a AMI existe na região
-    print("🔍 Verificando se a AMI existe...")
-    verify_ami_exists(ec2_client, new_ami_id, source_region)
+    # Prepara os parâmetros para criar a nova instância
+    if run_params is None:
+        with phase('plan'):
+            say("⚙️  Preparando configurações para a nova instância...")
+            run_params = prepare_run_params(instance, new_ami_id, ec2_client, subnet_id, interactive,
+                                            volume_rules, type_mapping, reservations=True, drill_id=drill_id)
+            if drill_id:
+                run_params = isolate_drill_network(run_params, instance, ec2_client, drill_network)
+    
+    # Valida tudo antes de parar a origem, pra não derrubar a instância num clone que vai falhar
+    if preflight:
+        with phase('preflight'):
+            problems = run_preflight(session, ec2_client, run_params)
+            if problems:
+                raise PreflightError(f"Preflight falhou. A instância {instance_id} NÃO foi parada", problems)
     
     # Para a instância para fazer o clone
-    print(f"⏸️  Parando a instância {instance_id} antes da clonagem...")
-    stop_source_instance(ec2_client, instance_id)
+    if stop_source:
+        with phase('stop_source'):
+            say(f"⏸️  Parando a instância {instance_id} antes da clonagem...")
+            stop_source_instance(ec2_client, instance_id)
+    else:
+        say(f"▶️  A instância {instance_id} continua ligada durante o clone")
     
-    # Prepara os parâmetros para criar a nova instância
-    print("⚙️  Preparando configurações para a nova instância...")
-    run_params = prepare_run_params(instance, new_ami_id, ec2_client)
+    if extra_tags:
+        run_params = dict(run_params)
+        run_params['TagSpecifications'] = [
+            {'ResourceType': resource, 'Tags': extra_tags} for resource in ('instance', 'volume')
+        ]
     
     # Cria a nova instância
-    print("🚀 Criando nova instância...")
-    response = ec2_client.run_instances(**run_params)
-    new_instance_id = response['Instances'][0]['InstanceId']
-    print(f"✅ Nova instância criada com ID: {new_instance_id}")
-    
-    # Aplica as tags na nova instância
-    print("🏷️  Aplicando tags na nova instância...")
-    apply_tags(ec2_client, instance_id, new_instance_id, new_name)
+    with phase('launch'):
+        say("🚀 Criando nova instância...")
+        launch_start = time.time()
+        response = launch_with_fallback(ec2_client, run_params, instance, type_mapping)
+        new_instance_id = response['Instances'][0]['InstanceId']
+        say(f"✅ Nova instância criada com ID: {new_instance_id}")
+    
+    # Daqui em diante a nova instância existe: um erro da AWS leva o ID dela junto
+    with aws_errors(new_instance_id):
+        # Aplica as tags na nova instância
+        with phase('tag'):
+            say("🏷️  Aplicando tags na nova instância...")
+            apply_tags(ec2_client, instance_id, new_instance_id, new_name)
+    
+        say(f"\n✨ Clonagem concluída com sucesso! ✨")
+        say(f"📌 Nova instância ID: {new_instance_id}")
+        say(f"📌 Tipo: {run_params['InstanceType']}")
+    
+        # Obtém o nome da nova instância para exibir
+        tags_response = ec2_client.describe_tags(
+            Filters=[
+                {'Name': 'resource-id', 'Values': [new_instance_id]},
+                {'Name': 'key', 'Values': ['Name']}
+            ]
+        )
     
-    print(f"\n✨ Clonagem concluída com sucesso! ✨")
-    print(f"📌 Nova instância ID: {new_instance_id}")
-    print(f"📌 Tipo: {instance['InstanceType']}")
+        if tags_response['Tags']:
+            instance_name = tags_response['Tags'][0]['Value']
+            say(f"📌 Nome: {instance_name}")
     
-    # Obtém o nome da nova instância para exibir
-    tags_response = ec2_client.describe_tags(
-        Filters=[
-            {'Name': 'resource-id', 'Values': [new_instance_id]},
-            {'Name': 'key', 'Values': ['Name']}
-        ]
-    )
+        # Aguarda a instância iniciar (e, se pedido, a aplicação ficar pronta)
+        timings = wait_new_instance(session, ec2_client, new_instance_id, launch_start, readiness)
     
-    if tags_response['Tags']:
-        instance_name = tags_response['Tags'][0]['Value']
-        print(f"📌 Nome: {instance_name}")
+        # Captura o horário de fim
+        end_time = datetime.now().strftime("%H:%M")
     
-    # Aguarda a instância iniciar
-    print("\n⏳ Aguardando a nova instância inicializar...")
-    waiter = ec2_client.get_waiter('instance_running')
-    waiter.wait(InstanceIds=[new_instance_id])
-    print("✅ Nova instância está em execução e pronta para uso!")
+        # Gera relatório final detalhado
+        with phase('report'):
+            generate_final_report(ec2_client, instance_id, new_instance_id, instance, profile, start_time, end_time,
+                                  timings=timings)
     
-    # Captura o horário de fim
-    end_time = datetime.now().strftime("%H:%M")
+        check_ready(new_instance_id, timings)
+
+    return new_instance_id
+
+def wait_new_instance(session, ec2_client, new_instance_id, launch_start, readiness=None):
+    """
+    Espera o running e as checagens de prontidão, medindo os tempos a partir do launch
+
+    Devolve {'running': s, 'ready': s ou None, 'readiness': resultado do wait_until_ready ou None}
+    """
+    with phase('wait_running'):
+        say("\n⏳ Aguardando a nova instância inicializar...")
+        wait_for_state(ec2_client, 'instance_running', new_instance_id, InstanceIds=[new_instance_id],
+                       WaiterConfig={'Delay': RUNNING_POLL_DELAY, 'MaxAttempts': 300})
+        timings = {'running': time.time() - launch_start, 'ready': None, 'readiness': None}
+        say(f"✅ Nova instância está em execução! ({format_seconds(timings['running'])} desde o launch)")
+    
+    if readiness:
+        with phase('wait_ready'):
+            timings['readiness'] = wait_until_ready(session, ec2_client, new_instance_id, readiness)
+            if timings['readiness']['ok']:
+                timings['ready'] = time.time() - launch_start
+    
+    return timings
+
+@contextmanager
+def aws_errors(new_instance_id=None):
+    """
+    Converte os erros do boto3/botocore levantados no bloco em AwsError (com o ID da nova instância, se houver)
+    """
+    try:
+        yield
+    except ClientError as e:
+        raise AwsError(f"erro da AWS: {e}", e.response['Error']['Code'], new_instance_id) from e
+    except BotoCoreError as e:
+        raise AwsError(f"erro da AWS: {e}", type(e).__name__, new_instance_id) from e
+
+def check_ready(new_instance_id, timings):
+    """
+    Falha o clone (depois do relatório) se as checagens de prontidão não passaram
+    """
+    readiness = timings.get('readiness')
+    if readiness and not readiness['ok']:
+        raise NotReadyError(new_instance_id, readiness['failures'])
+
+def plan_clone(instance_id, new_ami_id, profile, source_region, subnet_id=None, interactive=True, preflight=False,
+               volume_rules=None, type_mapping=None, session=None, ec2_client=None):
+    """
+    Calcula os parâmetros do run_instances sem parar a origem nem criar nada
+
+    Com preflight=True também valida as dependências e levanta PreflightError se algo falhar.
+    session/ec2_client como em clone_instance_with_new_ami.
+    """
+    say(f"\n📝 Planejando clonagem da instância {instance_id} com a AMI {new_ami_id}...\n")
+
+    session = session or get_session(profile)
+    ec2_client = ec2_client or session_client(session, 'ec2', source_region)
+
+    with phase('discover'):
+        instance = get_instance_data(ec2_client, instance_id)
+        verify_ami_exists(ec2_client, new_ami_id, source_region)
+
+    with phase('plan'):
+        run_params = prepare_run_params(instance, new_ami_id, ec2_client, subnet_id, interactive,
+                                        volume_rules, type_mapping, reservations=True)
     
-    # Gera relatório final detalhado
-    generate_final_report(ec2_client, instance_id, new_instance_id, instance, profile, start_time, end_time)
+    if preflight:
+        with phase('preflight'):
+            problems = run_preflight(session, ec2_client, run_params)
+            if problems:
+                raise PreflightError("preflight falhou", problems)
     
-    return new_instance_id
+    return run_params
 
 def get_instance_data(ec2_client, instance_id):
     """
     Pega os dados da instância de origem
     """
-    response = ec2_client.describe_instances(InstanceIds=[instance_id])
+    try:
+        response = ec2_client.describe_instances(InstanceIds=[instance_id])
+    except ClientError as e:
+        if e.response['Error']['Code'].startswith('InvalidInstanceID'):
+            raise InstanceNotFoundError(instance_id)
+        raise
 
     # Se der erro aqui é pq ele não encontrou a instância nessa região
     if not response['Reservations'] or not response['Reservations'][0]['Instances']:
-        print(f"❌ ERRO: Instância {instance_id} não encontrada")
-        sys.exit(1)
+        raise InstanceNotFoundError(instance_id)
         
     return response['Reservations'][0]['Instances'][0]
 
@@ -109,16 +246,18 @@ def verify_ami_exists(ec2_client, ami_id, region):
     """
     try:
         ami_check = ec2_client.describe_images(ImageIds=[ami_id])
-        if not ami_check['Images']:
-            print(f"❌ ERRO: AMI {ami_id} não encontrada")
-            sys.exit(1)
-    except Exception as e:
-        print(f"❌ ERRO: AMI {ami_id} não encontrada ou não acessível: {e}")
-        sys.exit(1)
+    except ClientError as e:
+        raise AmiNotFoundError(f"AMI {ami_id} não encontrada ou não acessível: {e}")
+    if not ami_check['Images']:
+        raise AmiNotFoundError(f"AMI {ami_id} não encontrada")
         
-def generate_final_report(ec2_client, source_instance_id, target_instance_id, source_instance, profile, start_time, end_time):
+def generate_final_report(ec2_client, source_instance_id, target_instance_id, source_instance, profile, start_time, end_time,
+                          standby_ami=None, timings=None):
     """
     Gera um relatório final detalhado da clonagem
+
+    standby_ami indica que o clone veio de um standby do warm pool (criado com essa AMI)
+    timings são os tempos até running/pronta medidos no wait_new_instance
     """
     # Obtém informações da nova instância
     target_response = ec2_client.describe_instances(InstanceIds=[target_instance_id])
@@ -161,25 +300,46 @@ def generate_final_report(ec2_client, source_instance_id, target_instance_id, so
     # Obtém AMI ID
     target_ami_id = target_instance['ImageId']
     
+    # Tipo de instância (pode ter sido trocado pelo mapeamento de tipos)
+    source_type = source_instance['InstanceType']
+    target_type = target_instance['InstanceType']
+    
+    # Tempos até running e até pronta (RTO), contados a partir do launch
+    timing_lines = []
+    if timings:
+        timing_lines.append(f"Tempo até running: {format_seconds(timings['running'])}")
+        if timings['readiness']:
+            if timings['ready'] is not None:
+                timing_lines.append(f"Tempo até pronta: {format_seconds(timings['ready'])}")
+            else:
+                timing_lines.append(f"Tempo até pronta: NÃO ficou pronta (falharam: {', '.join(timings['readiness']['failures'])})")
+    
     # Obtém a data atual
     current_date = datetime.now().strftime("%d/%m/%Y")
     
     # Gera o relatório
-    print("\n\n" + "="*50)
-    print("===Consigcard===\n")
-    print(f"Account: {profile.upper()}\n")
-    print(f"Aplicação: \n")
-    print(f"EC2: {target_name} - {target_instance_id}")
-    print(f"AMI: {target_ami_id}")
-    print(f"(A original era {source_instance_id})")
-    print(f"AZ: {target_az} (original era {source_az})")
-    print(f"Sub: {target_subnet_id} (original era {source_subnet_id})\n")
-    print(f"Removida do LB: ")
-    print(f"Voltou ao LB: ")
-    print(f"Inicio: {start_time}")
-    print(f"Fim: {end_time}\n")
-    print(f"Novo IP: {target_private_ip} (original era {source_private_ip})")
-    print("\n" + "="*50)
+    say("\n\n" + "="*50)
+    say("===Consigcard===\n")
+    say(f"Account: {profile.upper()}\n")
+    say(f"Aplicação: \n")
+    say(f"EC2: {target_name} - {target_instance_id}")
+    say(f"AMI: {target_ami_id}")
+    say(f"(A original era {source_instance_id})")
+    say(f"Tipo: {target_type} (original era {source_type})")
+    if standby_ami:
+        say(f"Origem do clone: STANDBY pré-provisionado (AMI {standby_ami})")
+    say(f"AZ: {target_az} (original era {source_az})")
+    say(f"Sub: {target_subnet_id} (original era {source_subnet_id})\n")
+    say(f"Removida do LB: ")
+    say(f"Voltou ao LB: ")
+    say(f"Inicio: {start_time}")
+    say(f"Fim: {end_time}\n")
+    for line in timing_lines:
+        say(line)
+    if timing_lines:
+        say()
+    say(f"Novo IP: {target_private_ip} (original era {source_private_ip})")
+    say("\n" + "="*50)
     
     # Salva o relatório em um arquivo
     report_filename = f"clone_report_{target_instance_id}_{current_date.replace('/', '-')}.txt"
@@ -191,18 +351,25 @@ def generate_final_report(ec2_client, source_instance_id, target_instance_id, so
             f.write(f"EC2: {target_name} - {target_instance_id}\n")
             f.write(f"AMI: {target_ami_id}\n")
             f.write(f"(A original era {source_instance_id})\n")
+            f.write(f"Tipo: {target_type} (original era {source_type})\n")
+            if standby_ami:
+                f.write(f"Origem do clone: STANDBY pré-provisionado (AMI {standby_ami})\n")
             f.write(f"AZ: {target_az} (original era {source_az})\n")
             f.write(f"Sub: {target_subnet_id} (original era {source_subnet_id})\n\n")
             f.write(f"Removida do LB: \n")
             f.write(f"Voltou ao LB: \n")
             f.write(f"Inicio: {start_time}\n")
             f.write(f"Fim: {end_time}\n\n")
+            for line in timing_lines:
+                f.write(line + "\n")
+            if timing_lines:
+                f.write("\n")
             f.write(f"Novo IP: {target_private_ip} (original era {source_private_ip})\n")
         
-        print(f"\nRelatório salvo em: {report_filename}")
+        say(f"\nRelatório salvo em: {report_filename}")
     except Exception as e:
-        print(f"Não foi possível salvar o relatório em arquivo: {e}")
-        print("Copie as informações acima manualmente.")
+        say(f"Não foi possível salvar o relatório em arquivo: {e}")
+        say("Copie as informações acima manualmente.")
 
 def stop_source_instance(ec2_client, instance_id):
     """
@@ -213,29 +380,37 @@ def stop_source_instance(ec2_client, instance_id):
     state = response['Reservations'][0]['Instances'][0]['State']['Name']
     
     if state == 'stopped':
-        print(f"ℹ️  A instância {instance_id} já está parada.")
+        say(f"ℹ️  A instância {instance_id} já está parada.")
         return
     
     if state == 'stopping':
-        print(f"ℹ️  A instância {instance_id} já está em processo de parada. Aguardando...")
-        waiter = ec2_client.get_waiter('instance_stopped')
-        waiter.wait(InstanceIds=[instance_id])
-        print(f"ℹ️  A instância {instance_id} está parada.")
+        say(f"ℹ️  A instância {instance_id} já está em processo de parada. Aguardando...")
+        wait_for_state(ec2_client, 'instance_stopped', instance_id, InstanceIds=[instance_id])
+        say(f"ℹ️  A instância {instance_id} está parada.")
         return
     
     # Para a instância se estiver em qualquer outro estado
     ec2_client.stop_instances(InstanceIds=[instance_id])
-    print(f"⏳ Aguardando a instância {instance_id} parar completamente...")
+    say(f"⏳ Aguardando a instância {instance_id} parar completamente...")
     
     # Usa waiter para garantir que a instância parou completamente
-    waiter = ec2_client.get_waiter('instance_stopped')
-    waiter.wait(InstanceIds=[instance_id])
-    print(f"✅ A instância {instance_id} está parada.")
+    wait_for_state(ec2_client, 'instance_stopped', instance_id, InstanceIds=[instance_id])
+    say(f"✅ A instância {instance_id} está parada.")
 
-def prepare_run_params(instance, new_ami_id, ec2_client):
+def prepare_run_params(instance, new_ami_id, ec2_client, subnet_id=None, interactive=True, volume_rules=None,
+                       type_mapping=None, reservations=False, drill_id=None):
     """
     Prepara todos os parâmetros para criar a nova instância
+
+    reservations=True (só no caminho do clone) usa a reserva de capacidade da instância:
+    a permanente ou, com drill_id, apenas a temporária desse drill (ver libs.reservations).
     """
+    # Com reserva de capacidade, o clone vai para a subnet/AZ em que ela foi planejada
+    if reservations and not drill_id and subnet_id is None:
+        subnet_id = reserved_subnet(ec2_client, instance['InstanceId'])
+        if subnet_id:
+            say(f"🎟️  Usando a subnet da reserva de capacidade: {subnet_id}")
+    
     # Parametros para criação da nova máquina.
     run_params = {
         'ImageId': new_ami_id,
@@ -245,23 +420,23 @@ def prepare_run_params(instance, new_ami_id, ec2_client):
     }
     
     # Adiciona configurações de rede (subnet e security groups)
-    run_params = add_network_config(run_params, instance, ec2_client)
+    run_params = add_network_config(run_params, instance, ec2_client, subnet_id, interactive)
     
     # Adiciona key pair se existir
     if 'KeyName' in instance:
         run_params['KeyName'] = instance['KeyName']
-        print(f"🔑 Usando key pair: {instance['KeyName']}")
+        say(f"🔑 Usando key pair: {instance['KeyName']}")
     
     # Adiciona user data se existir
     if 'UserData' in instance:
         run_params['UserData'] = instance['UserData']
-        print("📝 User data da instância original será aplicado")
+        say("📝 User data da instância original será aplicado")
     
     # Adiciona IAM instance profile se existir
     if 'IamInstanceProfile' in instance:
         profile_name = instance['IamInstanceProfile']['Arn'].split('/')[-1]
         run_params['IamInstanceProfile'] = {'Name': profile_name}
-        print(f"👤 Usando perfil IAM: {profile_name}")
+        say(f"👤 Usando perfil IAM: {profile_name}")
     
     # Adiciona metadata options se existir
     run_params = add_metadata_options(run_params, instance)
@@ -269,47 +444,48 @@ def prepare_run_params(instance, new_ami_id, ec2_client):
     # Adiciona monitoring se habilitado
     if 'Monitoring' in instance and instance['Monitoring']['State'] == 'enabled':
         run_params['Monitoring'] = {'Enabled': True}
-        print("📊 Monitoramento detalhado habilitado")
+        say("📊 Monitoramento detalhado habilitado")
     
     # Adiciona EBS optimized se habilitado
     if 'EbsOptimized' in instance and instance['EbsOptimized']:
         run_params['EbsOptimized'] = True
-        print("💾 EBS Optimized habilitado")
+        say("💾 EBS Optimized habilitado")
     
     # Adiciona placement information se existir
     run_params = add_placement_info(run_params, instance, ec2_client)
     
-    # Adiciona credit specification para instâncias T
-    if instance['InstanceType'].startswith('t') and 'CreditSpecification' in instance:
-        if 'CpuCredits' in instance['CreditSpecification']:
-            cpu_credits = instance['CreditSpecification']['CpuCredits']
-            run_params['CreditSpecification'] = {
-                'CpuCredits': cpu_credits
-            }
-            print(f"💰 Modo de créditos CPU: {cpu_credits}")
-    
     # Adiciona hibernation options se habilitado
-    if 'HibernationOptions' in instance and instance['HibernationOptions']['Configured']:
+    if 'HibernationOptions' in instance and instance['HibernationOptions'].get('Configured'):
         run_params['HibernationOptions'] = {'Configured': True}
-        print("❄️  Hibernação habilitada")
+        say("❄️  Hibernação habilitada")
     
     # Adiciona enclave options se habilitado
-    if 'EnclaveOptions' in instance and instance['EnclaveOptions']['Enabled']:
+    if 'EnclaveOptions' in instance and instance['EnclaveOptions'].get('Enabled'):
         run_params['EnclaveOptions'] = {'Enabled': True}
-        print("🔒 Enclave habilitado")
+        say("🔒 Enclave habilitado")
+    
+    # Escolhe o tipo (mapeamento de upgrade/fallback) e o credit specification para instâncias T
+    run_params = apply_instance_type(run_params, instance, ec2_client, type_mapping)
+    
+    # ENIs secundárias, IPs secundários e ENA Express (depois do tipo, que define o suporte a ENA Express)
+    run_params = add_network_interfaces(run_params, instance, ec2_client)
     
     # Adiciona block device mappings para volumes não-raiz
-    run_params = add_block_device_mappings(run_params, instance, ec2_client)
+    run_params = add_block_device_mappings(run_params, instance, ec2_client, volume_rules)
+    
+    # Lança dentro da reserva de capacidade da instância, se houver uma do mesmo tipo e AZ
+    if reservations:
+        run_params = apply_capacity_reservation(ec2_client, run_params, instance['InstanceId'], drill_id)
     
     return run_params
 
-def add_network_config(run_params, instance, ec2_client):
+def add_network_config(run_params, instance, ec2_client, subnet_id=None, interactive=True):
     """
     Adiciona configurações de rede (subnet e security groups)
     """
     # Adiciona subnet se existir
     if 'SubnetId' in instance:
-        run_params = add_subnet_config(run_params, instance, ec2_client)
+        run_params = add_subnet_config(run_params, instance, ec2_client, subnet_id, interactive)
     
     # Adiciona security groups se existir
     if 'SecurityGroups' in instance:
@@ -328,17 +504,28 @@ def add_network_config(run_params, instance, ec2_client):
             except:
                 sg_names.append(sg_id)
         
-        print(f"🛡️  Usando grupos de segurança: {', '.join(sg_names)}")
+        say(f"🛡️  Usando grupos de segurança: {', '.join(sg_names)}")
     
     return run_params
 
-def add_subnet_config(run_params, instance, ec2_client):
+def add_subnet_config(run_params, instance, ec2_client, subnet_id=None, interactive=True):
     """
     Adiciona configuração de subnet
+    
+    Se subnet_id for informado usa ela direto. Com interactive=False escolhe sozinho
+    a primeira subnet da mesma VPC em outra AZ.
     """
     # Pega a AZ atual da máquina que vai ser clonada
     source_az = instance['Placement'].get('AvailabilityZone')
     
+    # Subnet já definida (linha de comando ou manifesto), não precisa perguntar
+    if subnet_id:
+        subnet = ec2_client.describe_subnets(SubnetIds=[subnet_id])['Subnets'][0]
+        run_params['SubnetId'] = subnet_id
+        run_params.setdefault('Placement', {})['AvailabilityZone'] = subnet['AvailabilityZone']
+        say(f"✅ Usando subnet informada: {subnet_id} ({subnet['AvailabilityZone']})")
+        return run_params
+    
     # pega todas as AZs da região
     azs = ec2_client.describe_availability_zones()['AvailabilityZones']
     
@@ -378,16 +565,25 @@ def add_subnet_config(run_params, instance, ec2_client):
             if subnet['VpcId'] == source_vpc
         ]
 
+        # Sem operador: prefere uma subnet na AZ alvo, senão a primeira da VPC
+        if matching_subnets and not interactive:
+            chosen = next(
+                (subnet for subnet in matching_subnets if subnet['AvailabilityZone'] == target_az),
+                matching_subnets[0]
+            )
+            target_subnet = chosen['SubnetId']
+            target_az = chosen['AvailabilityZone']
+        
         # Se houver subnets compatíveis, exibe e pede escolha
-        if matching_subnets:
-            print("\n🌐 Subnets disponíveis:")
+        elif matching_subnets:
+            say("\n🌐 Subnets disponíveis:")
             for id, subnet in enumerate(matching_subnets, start=1):
                 name = next(
                     (tag['Value'] for tag in subnet.get('Tags', []) if tag['Key'] == 'Name'),
                     'Sem nome'
                 )
                 az = subnet['AvailabilityZone']
-                print(f"{id} - {subnet['SubnetId']} | {name} | {az}")
+                say(f"{id} - {subnet['SubnetId']} | {name} | {az}")
 
             # Solicita ao user que escolha uma subnet
             while True:
@@ -398,17 +594,17 @@ def add_subnet_config(run_params, instance, ec2_client):
                         target_az = matching_subnets[choice - 1]['AvailabilityZone']
                         break
                     else:
-                        print("❌ Número inválido. Tente novamente.")
+                        say("❌ Número inválido. Tente novamente.")
                 except ValueError:
-                    print("❌ Entrada inválida. Digite um número.")
+                    say("❌ Entrada inválida. Digite um número.")
         else:
             # Se não houver subnets compatíveis, usa a original
             target_subnet = instance['SubnetId']
-            print("⚠️  Aviso: Nenhuma subnet encontrada na VPC. Usando a subnet original.")
+            say("⚠️  Aviso: Nenhuma subnet encontrada na VPC. Usando a subnet original.")
 
         # Define o parâmetro de execução
         run_params['SubnetId'] = target_subnet
-        print(f"\n✅ Usando subnet: {target_subnet}")
+        say(f"\n✅ Usando subnet: {target_subnet}")
         
         # Adiciona a AZ ao placement
         if 'Placement' not in run_params:
@@ -416,14 +612,14 @@ def add_subnet_config(run_params, instance, ec2_client):
         run_params['Placement']['AvailabilityZone'] = target_az
         
         if target_az != source_az:
-            print(f"🌍 Colocando nova instância em uma AZ diferente: {target_az} (original era {source_az})")
+            say(f"🌍 Colocando nova instância em uma AZ diferente: {target_az} (original era {source_az})")
         else:
-            print(f"🌍 Usando a mesma AZ da instância original: {target_az}")
+            say(f"🌍 Usando a mesma AZ da instância original: {target_az}")
 
     else:
         # Se houver apenas uma AZ disponivel, usa a mesma subnet
         run_params['SubnetId'] = instance['SubnetId']
-        print(f"🌐 Usando a subnet original: {instance['SubnetId']}")
+        say(f"🌐 Usando a subnet original: {instance['SubnetId']}")
     
     return run_params
 
@@ -445,7 +641,7 @@ def add_metadata_options(run_params, instance):
             
             # Exibe informações sobre IMDSv2
             if 'HttpTokens' in metadata_options and metadata_options['HttpTokens'] == 'required':
-                print("🔐 IMDSv2 (token obrigatório) configurado")
+                say("🔐 IMDSv2 (token obrigatório) configurado")
     
     return run_params
 
@@ -458,191 +654,15 @@ def add_placement_info(run_params, instance, ec2_client):
         
         if 'Tenancy' in instance['Placement'] and instance['Placement']['Tenancy'] != 'default':
             placement['Tenancy'] = instance['Placement']['Tenancy']
-            print(f"🏢 Tenancy: {instance['Placement']['Tenancy']}")
+            say(f"🏢 Tenancy: {instance['Placement']['Tenancy']}")
         
         # A AZ já é configurada na função add_subnet_config
         
         if placement:
             run_params['Placement'] = placement
-    
-    return run_params
-
-def prepare_root_volume_mapping(instance, new_ami_id, ec2_client):
-    """
-    Prepara o mapeamento do volume raiz baseado na instância original,
-    apenas se for diferente do proposto pela AMI
-    
-    NOTA: Esta função foi movida para ec2_volume_utils.py.
-    Mantida aqui como fallback caso o módulo não esteja disponível.
-    """
-    try:
-        # Obter o nome do dispositivo raiz da instância
-        root_device_name = instance['RootDeviceName']
-        
-        # Encontrar o mapeamento do dispositivo raiz na instância original
-        root_mapping = None
-        for bdm in instance['BlockDeviceMappings']:
-            if bdm['DeviceName'] == root_device_name:
-                root_mapping = bdm
-                break
-        
-        if not root_mapping or 'Ebs' not in root_mapping:
-            print("ℹ️  Não foi possível obter informações do volume raiz da instância. Usando configurações da AMI.")
-            return None
-        
-        # Obter o ID do volume raiz da instância
-        root_volume_id = root_mapping['Ebs']['VolumeId']
-        
-        # Obter detalhes do volume raiz da instância
-        instance_volume = ec2_client.describe_volumes(VolumeIds=[root_volume_id])['Volumes'][0]
-        instance_volume_type = instance_volume['VolumeType']
-        
-        # Obter informações da AMI para comparar
-        ami_info = ec2_client.describe_images(ImageIds=[new_ami_id])['Images'][0]
-        ami_root_device = ami_info['RootDeviceName']
-        
-        # Encontrar o mapeamento do dispositivo raiz na AMI
-        ami_root_mapping = None
-        for bdm in ami_info.get('BlockDeviceMappings', []):
-            if bdm['DeviceName'] == ami_root_device:
-                ami_root_mapping = bdm
-                break
-        
-        # Se não encontrar mapeamento na AMI, usar o da instância
-        if not ami_root_mapping or 'Ebs' not in ami_root_mapping:
-            print("⚠️  Não foi possível obter informações do volume raiz da AMI. Usando configurações da instância.")
-        else:
-            # Verificar se o tipo de volume da AMI é o mesmo da instância
-            ami_volume_type = ami_root_mapping['Ebs'].get('VolumeType', 'gp2')  # padrão é gp2
-            
-            if instance_volume_type == ami_volume_type:
-                print(f"ℹ️  Tipo de volume raiz da instância ({instance_volume_type}) é igual ao da AMI. Usando configurações padrão.")
-                return None
-        
-        # Se chegou aqui, precisamos criar um mapeamento personalizado
-        print(f"\n💾 Configurando volume raiz:")
-        print(f"  - Tipo de volume da instância: {instance_volume_type}")
-        if ami_root_mapping and 'Ebs' in ami_root_mapping:
-            print(f"  - Tipo de volume da AMI: {ami_root_mapping['Ebs'].get('VolumeType', 'gp2')}")
-        
-        # Criar o mapeamento para o novo volume raiz
-        new_root_mapping = {
-            'DeviceName': root_device_name,
-            'Ebs': {
-                'DeleteOnTermination': root_mapping['Ebs'].get('DeleteOnTermination', True),
-                'VolumeType': instance_volume_type,
-                'Encrypted': instance_volume.get('Encrypted', False)
-            }
-        }
         
-        # Adicionar parâmetros específicos com base no tipo de volume
-        if instance_volume_type == 'gp3':
-            # gp3 suporta IOPS e Throughput
-            new_root_mapping['Ebs']['Iops'] = instance_volume.get('Iops', 3000)
-            if 'Throughput' in instance_volume:
-                new_root_mapping['Ebs']['Throughput'] = instance_volume['Throughput']
-            
-            # Exibe informações sobre o volume raiz
-            volume_info = f"{root_device_name}: {instance_volume_type}"
-            if 'Iops' in instance_volume:
-                volume_info += f", {instance_volume['Iops']} IOPS"
-            if 'Throughput' in instance_volume:
-                volume_info += f", {instance_volume['Throughput']} MB/s throughput"
-            print(f"  - Configuração aplicada: {volume_info}")
-        
-        elif instance_volume_type in ['io1', 'io2']:
-            # io1 e io2 suportam IOPS
-            if 'Iops' in instance_volume:
-                new_root_mapping['Ebs']['Iops'] = instance_volume['Iops']
-            
-            # Exibe informações sobre o volume raiz
-            volume_info = f"{root_device_name}: {instance_volume_type}"
-            if 'Iops' in instance_volume:
-                volume_info += f", {instance_volume['Iops']} IOPS"
-            print(f"  - Configuração aplicada: {volume_info}")
-        
-        else:
-            # Para outros tipos (gp2, st1, sc1, standard)
-            print(f"  - Configuração aplicada: {root_device_name}: {instance_volume_type}")
-        
-        return new_root_mapping
-    
-    except Exception as e:
-        print(f"⚠️  Erro ao configurar volume raiz: {e}. Usando configurações padrão da AMI.")
-        return None
-
-def add_block_device_mappings(run_params, instance, ec2_client):
-    """
-    Adiciona mapeamentos de dispositivos de bloco para volumes raiz e não-raiz
-    
-    NOTA: Esta função foi movida para ec2_volume_utils.py.
-    Mantida aqui como fallback caso o módulo não esteja disponível.
-    """
-    if 'BlockDeviceMappings' not in instance:
-        return run_params
-    
-    root_device = instance['RootDeviceName']
-    block_device_mappings = []
-    
-    # Primeiro, adiciona o mapeamento do volume raiz
-    root_mapping = prepare_root_volume_mapping(instance, None, ec2_client)
-    if root_mapping:
-        block_device_mappings.append(root_mapping)
-    
-    # Depois, adiciona os volumes não-raiz
-    print("\n💾 Configurando volumes adicionais:")
-    has_additional_volumes = False
-    
-    for bdm in instance['BlockDeviceMappings']:
-        # Pula o dispositivo raiz, pois já foi tratado acima
-        if bdm['DeviceName'] == root_device:
-            continue
-            
-        if 'Ebs' in bdm:
-            has_additional_volumes = True
-            volume_id = bdm['Ebs']['VolumeId']
-            volume = ec2_client.describe_volumes(VolumeIds=[volume_id])['Volumes'][0]
-            
-            # Tipo de volume
-            volume_type = volume['VolumeType']
-            
-            new_bdm = {
-                'DeviceName': bdm['DeviceName'],
-                'Ebs': {
-                    'VolumeSize': volume['Size'],
-                    'VolumeType': volume_type,
-                    'DeleteOnTermination': bdm['Ebs'].get('DeleteOnTermination', False),
-                    'Encrypted': volume['Encrypted']
-                }
-            }
-            
-            # Adiciona parâmetros compatíveis com cada tipo de volume
-            if volume_type == 'gp3':
-                # gp3 suporta IOPS e Throughput
-                new_bdm['Ebs']['Iops'] = volume.get('Iops', 3000)
-                if 'Throughput' in volume:
-                    new_bdm['Ebs']['Throughput'] = volume['Throughput']
-            
-            elif volume_type in ['io1', 'io2']:
-                # io1 e io2 suportam IOPS
-                if 'Iops' in volume:
-                    new_bdm['Ebs']['Iops'] = volume['Iops']
-            
-            block_device_mappings.append(new_bdm)
-            
-            # Exibe informações sobre o volume
-            volume_info = f"{bdm['DeviceName']}: {volume['Size']}GB {volume_type}"
-            if 'Iops' in volume and volume_type in ['gp3', 'io1', 'io2']:
-                volume_info += f", {volume['Iops']} IOPS"
-            if 'Throughput' in volume and volume_type == 'gp3':
-                volume_info += f", {volume['Throughput']} MB/s throughput"
-            print(f"  - {volume_info}")
-    
-    if not has_additional_volumes:
-        print("  - Nenhum volume adicional encontrado além do volume raiz")
-    
-    if block_device_mappings:
-        run_params['BlockDeviceMappings'] = block_device_mappings
+        # Placement group (cluster/partition/spread) da origem
+        run_params = add_placement_group(run_params, instance, ec2_client)
     
     return run_params
 
@@ -650,7 +670,7 @@ def apply_tags(ec2_client, source_instance_id, target_instance_id, new_name=None
     """
     Aplica tags na nova instância
     """
-    print("Copiando tags da instância original...")
+    say("Copiando tags da instância original...")
     tags_response = ec2_client.describe_tags(
         Filters=[{'Name': 'resource-id', 'Values': [source_instance_id]}]
     )
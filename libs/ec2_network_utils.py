@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+from botocore.exceptions import ClientError
+
+from libs.errors import ConfigError
+from libs.progress import say
+
+'''
+Clonagem das configurações de rede que afetam desempenho: ENIs secundárias, IPs
+privados secundários, ENA Express (ENA SRD) e placement groups.
+
+Instâncias com uma única ENI simples continuam usando SubnetId/SecurityGroupIds
+no run_params; só quando há algo a mais é que o run_params passa a usar
+NetworkInterfaces (a AWS não aceita os dois juntos).
+'''
+
+def needs_network_interfaces(instance):
+    """
+    Indica se a instância tem algo que só dá para copiar via NetworkInterfaces
+    """
+    enis = instance.get('NetworkInterfaces', [])
+    if len(enis) > 1:
+        return True
+
+    for eni in enis:
+        if len(eni.get('PrivateIpAddresses', [])) > 1 or eni.get('Ipv6Addresses'):
+            return True
+        if eni.get('InterfaceType', 'interface') != 'interface':
+            return True
+        if eni.get('Attachment', {}).get('EnaSrdSpecification', {}).get('EnaSrdEnabled'):
+            return True
+    return False
+
+def map_eni_subnet(ec2_client, eni, instance, run_params, subnets):
+    """
+    Escolhe a subnet da ENI na AZ de destino (todas as ENIs precisam ficar na AZ da instância)
+    """
+    target_az = run_params.get('Placement', {}).get('AvailabilityZone')
+    source_subnet = subnets[eni['SubnetId']]
+
+    # A ENI que estava na subnet principal acompanha a subnet escolhida para a instância
+    if eni['SubnetId'] == instance.get('SubnetId') and run_params.get('SubnetId'):
+        return run_params['SubnetId']
+
+    if not target_az or source_subnet['AvailabilityZone'] == target_az:
+        return eni['SubnetId']
+
+    candidates = ec2_client.describe_subnets(
+        Filters=[
+            {'Name': 'vpc-id', 'Values': [source_subnet['VpcId']]},
+            {'Name': 'availability-zone', 'Values': [target_az]}
+        ]
+    )['Subnets']
+    if not candidates:
+        say(f"⚠️  Nenhuma subnet da VPC {source_subnet['VpcId']} em {target_az} para a ENI {eni['NetworkInterfaceId']}; "
+            f"usando a original {eni['SubnetId']}")
+        return eni['SubnetId']
+
+    # Prefere uma subnet com o mesmo nome (padrão comum: mesmo nome por AZ)
+    source_name = next((t['Value'] for t in source_subnet.get('Tags', []) if t['Key'] == 'Name'), None)
+    chosen = next(
+        (s for s in candidates if source_name and any(t['Key'] == 'Name' and t['Value'] == source_name for t in s.get('Tags', []))),
+        sorted(candidates, key=lambda s: s['SubnetId'])[0]
+    )
+    return chosen['SubnetId']
+
+def add_network_interfaces(run_params, instance, ec2_client):
+    """
+    Copia todas as ENIs (índices, SGs, IPs secundários, IPv6, ENA Express) para o run_params
+    """
+    if not needs_network_interfaces(instance):
+        return run_params
+
+    enis = sorted(
+        instance['NetworkInterfaces'],
+        key=lambda eni: (eni['Attachment'].get('NetworkCardIndex', 0), eni['Attachment']['DeviceIndex'])
+    )
+
+    subnets = {
+        subnet['SubnetId']: subnet
+        for subnet in ec2_client.describe_subnets(SubnetIds=list({eni['SubnetId'] for eni in enis}))['Subnets']
+    }
+
+    # ENA Express só vale se o tipo escolhido (pode ter mudado no mapeamento) suportar
+    ena_srd_supported = True
+    if any(eni['Attachment'].get('EnaSrdSpecification', {}).get('EnaSrdEnabled') for eni in enis):
+        try:
+            type_info = ec2_client.describe_instance_types(InstanceTypes=[run_params['InstanceType']])['InstanceTypes'][0]
+            ena_srd_supported = type_info.get('NetworkInfo', {}).get('EnaSrdSupported', False)
+        except (ClientError, IndexError):
+            ena_srd_supported = False
+
+    say("\n🔌 Configurando interfaces de rede:")
+    interfaces = []
+    for eni in enis:
+        attachment = eni['Attachment']
+        device_index = attachment['DeviceIndex']
+
+        if device_index == 0 and attachment.get('NetworkCardIndex', 0) == 0:
+            # Os security groups da principal já foram resolvidos no add_network_config
+            groups = run_params.get('SecurityGroupIds') or [g['GroupId'] for g in eni.get('Groups', [])]
+        else:
+            groups = [g['GroupId'] for g in eni.get('Groups', [])]
+
+        interface = {
+            'DeviceIndex': device_index,
+            'SubnetId': map_eni_subnet(ec2_client, eni, instance, run_params, subnets),
+            'Groups': groups,
+            'DeleteOnTermination': attachment.get('DeleteOnTermination', device_index == 0)
+        }
+        if attachment.get('NetworkCardIndex'):
+            interface['NetworkCardIndex'] = attachment['NetworkCardIndex']
+        if eni.get('Description'):
+            interface['Description'] = eni['Description']
+        if eni.get('InterfaceType', 'interface') != 'interface':
+            interface['InterfaceType'] = eni['InterfaceType']
+
+        # A origem continua existindo (parada) com os mesmos IPs, então pedimos a mesma quantidade de IPs novos
+        secondary_ips = len(eni.get('PrivateIpAddresses', [])) - 1
+        if secondary_ips > 0:
+            interface['SecondaryPrivateIpAddressCount'] = secondary_ips
+        if eni.get('Ipv6Addresses'):
+            interface['Ipv6AddressCount'] = len(eni['Ipv6Addresses'])
+
+        ena_srd = attachment.get('EnaSrdSpecification', {})
+        if ena_srd.get('EnaSrdEnabled'):
+            if ena_srd_supported:
+                interface['EnaSrdSpecification'] = {
+                    'EnaSrdEnabled': True,
+                    'EnaSrdUdpSpecification': {
+                        'EnaSrdUdpEnabled': ena_srd.get('EnaSrdUdpSpecification', {}).get('EnaSrdUdpEnabled', False)
+                    }
+                }
+            else:
+                say(f"⚠️  {run_params['InstanceType']} não suporta ENA Express; a ENI {device_index} vai sem ele")
+
+        interfaces.append(interface)
+
+        info = f"eth{device_index}: {interface['SubnetId']} | SGs: {', '.join(groups) or '-'}"
+        if secondary_ips > 0:
+            info += f" | +{secondary_ips} IP(s) secundário(s)"
+        if 'EnaSrdSpecification' in interface:
+            info += " | ENA Express"
+        say(f"  - {info}")
+
+    # Com NetworkInterfaces a AWS não aceita SubnetId/SecurityGroupIds no nível da instância
+    run_params.pop('SubnetId', None)
+    run_params.pop('SecurityGroupIds', None)
+    run_params['NetworkInterfaces'] = interfaces
+
+    return run_params
+
+def isolate_drill_network(run_params, instance, ec2_client, drill_network=None):
+    """
+    Isola a rede do clone de drill: uma ENI só, subnet fora da VPC da origem e security groups do drill
+
+    drill_network = {'security_groups': [...], 'allow_source_vpc': bool}. Os security groups
+    da origem são da VPC de produção, então numa VPC isolada os do drill são obrigatórios.
+    Uma subnet na VPC da origem alcança a produção pelas rotas locais e só é aceita com
+    allow_source_vpc.
+    """
+    drill_network = drill_network or {}
+    instance_id = instance['InstanceId']
+
+    # Só a ENI principal vai para a subnet do drill; as secundárias cairiam nas subnets de produção
+    enis = instance.get('NetworkInterfaces', [])
+    if len(enis) > 1:
+        raise ConfigError(f"A instância {instance_id} tem {len(enis)} ENIs e o drill só isola a principal "
+                          f"(as secundárias ficariam nas subnets de produção); tire-a do drill")
+
+    interfaces = run_params.get('NetworkInterfaces')
+    subnet_id = interfaces[0].get('SubnetId') if interfaces else run_params.get('SubnetId')
+    if not subnet_id:
+        return run_params
+    subnet = ec2_client.describe_subnets(SubnetIds=[subnet_id])['Subnets'][0]
+
+    same_vpc = subnet['VpcId'] == instance.get('VpcId')
+    if same_vpc and not drill_network.get('allow_source_vpc'):
+        raise ConfigError(f"A subnet do drill {subnet_id} está na VPC {subnet['VpcId']} da instância {instance_id}: "
+                          f"o clone alcançaria a produção pelas rotas locais. Use uma subnet de uma VPC isolada "
+                          f"(com --drill-security-group / drill_security_groups) ou --drill-allow-source-vpc")
+    if same_vpc:
+        say(f"⚠️  ATENÇÃO: o clone do drill vai para a VPC de produção {subnet['VpcId']} (--drill-allow-source-vpc) "
+            f"e alcança a produção pelas rotas locais")
+
+    security_groups = drill_network.get('security_groups')
+    if not security_groups:
+        if not same_vpc:
+            raise ConfigError(f"Os security groups de {instance_id} são da VPC de produção e não servem na VPC "
+                              f"{subnet['VpcId']} do drill: informe --drill-security-group / drill_security_groups")
+        say("⚠️  O clone do drill usa os security groups de produção da origem")
+        return run_params
+
+    if interfaces:
+        for interface in interfaces:
+            interface['Groups'] = list(security_groups)
+    else:
+        run_params['SecurityGroupIds'] = list(security_groups)
+    say(f"🛡️  Security groups do drill: {', '.join(security_groups)}")
+    return run_params
+
+def add_placement_group(run_params, instance, ec2_client):
+    """
+    Mantém a instância no placement group da origem
+
+    Partition e spread podem abranger várias AZs, então o grupo (e a partição) é mantido.
+    Cluster fica preso a uma AZ: se o clone for para outra AZ, usa um grupo cluster
+    equivalente nela, chamado <grupo>-<az>. Aqui só o nome entra no run_params (o plano
+    não cria nada); o grupo é criado por ensure_placement_group na hora do launch.
+    """
+    group_name = instance.get('Placement', {}).get('GroupName')
+    if not group_name:
+        return run_params
+
+    try:
+        group = ec2_client.describe_placement_groups(GroupNames=[group_name])['PlacementGroups'][0]
+    except (ClientError, IndexError):
+        say(f"⚠️  Placement group {group_name} da origem não encontrado; a nova instância vai sem ele")
+        return run_params
+
+    placement = run_params.setdefault('Placement', {})
+    strategy = group['Strategy']
+    source_az = instance['Placement'].get('AvailabilityZone')
+    target_az = placement.get('AvailabilityZone', source_az)
+
+    if strategy == 'cluster' and target_az != source_az:
+        target_group = f"{group_name}-{target_az}"
+        placement['GroupName'] = target_group
+        exists = placement_group_exists(ec2_client, target_group)
+        say(f"📍 Placement group cluster: {target_group}{'' if exists else ' (criado no launch)'} "
+            f"(original {group_name} fica em {source_az})")
+        return run_params
+
+    placement['GroupName'] = group_name
+    if strategy == 'partition' and instance['Placement'].get('PartitionNumber'):
+        placement['PartitionNumber'] = instance['Placement']['PartitionNumber']
+        say(f"📍 Placement group {strategy}: {group_name} (partição {placement['PartitionNumber']})")
+    else:
+        say(f"📍 Placement group {strategy}: {group_name}")
+
+    return run_params
+
+def placement_group_exists(ec2_client, group_name):
+    """
+    Indica se o placement group já existe na região
+    """
+    try:
+        ec2_client.describe_placement_groups(GroupNames=[group_name])
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'InvalidPlacementGroup.Unknown':
+            raise
+        return False
+
+def pending_placement_group(ec2_client, run_params, instance):
+    """
+    Nome do grupo cluster equivalente que ainda precisa ser criado no launch (ou None)
+    """
+    group_name = run_params.get('Placement', {}).get('GroupName')
+    if not group_name or group_name == instance.get('Placement', {}).get('GroupName'):
+        return None
+    if placement_group_exists(ec2_client, group_name):
+        return None
+    return group_name
+
+def ensure_placement_group(ec2_client, run_params, instance):
+    """
+    Cria o placement group cluster equivalente na AZ de destino se ele ainda não existir
+
+    Roda no launch, depois do preflight, para o plano continuar só de leitura.
+    """
+    group_name = pending_placement_group(ec2_client, run_params, instance)
+    if not group_name:
+        return
+
+    source_group = instance['Placement']['GroupName']
+    try:
+        ec2_client.create_placement_group(
+            GroupName=group_name,
+            Strategy='cluster',
+            TagSpecifications=[{
+                'ResourceType': 'placement-group',
+                'Tags': [
+                    {'Key': 'SourcePlacementGroup', 'Value': source_group},
+                    {'Key': 'SourceAvailabilityZone', 'Value': instance['Placement'].get('AvailabilityZone')}
+                ]
+            }]
+        )
+    except ClientError as e:
+        # Outro clone do lote pode ter criado o mesmo grupo ao mesmo tempo
+        if e.response['Error']['Code'] != 'InvalidPlacementGroup.Duplicate':
+            raise
+        return
+    say(f"✅ Placement group {group_name} criado")
@@ -1,175 +1,352 @@
 #!/usr/bin/env python3
-import sys
+import math
 
-def prepare_root_volume_mapping(instance, new_ami_id, ec2_client):
+from libs.errors import ConfigError
+from libs.progress import say
+
+'''
+Limites por tipo de volume (documentação da AWS, EBS volume types).
+Se a AWS mudar algum limite, é só atualizar aqui.
+
+size: (mínimo, máximo) em GiB
+iops: (mínimo, máximo) - só para tipos com IOPS configurável
+iops_per_gib: máximo de IOPS por GiB provisionado
+throughput: (mínimo, máximo) em MiB/s - só gp3
+throughput_per_iops: máximo de MiB/s por IOPS provisionado - só gp3
+baseline_per_tib: (MiB/s por TiB, teto) do throughput base - só HDD (st1/sc1)
+boot: se o tipo pode ser volume raiz
+'''
+VOLUME_LIMITS = {
+    'gp2': {'size': (1, 16384), 'boot': True},
+    'gp3': {'size': (1, 65536), 'iops': (3000, 80000), 'iops_per_gib': 500,
+            'throughput': (125, 2000), 'throughput_per_iops': 0.25, 'boot': True},
+    'io1': {'size': (4, 16384), 'iops': (100, 64000), 'iops_per_gib': 50, 'boot': True},
+    'io2': {'size': (4, 65536), 'iops': (100, 256000), 'iops_per_gib': 1000, 'boot': True},
+    'st1': {'size': (125, 16384), 'baseline_per_tib': (40, 500), 'boot': False},
+    'sc1': {'size': (125, 16384), 'baseline_per_tib': (12, 192), 'boot': False},
+    'standard': {'size': (1, 1024), 'boot': True},
+}
+
+def parse_volume_rules(convert=None, min_iops=None, min_throughput=None):
+    """
+    Monta as regras de reescrita de volumes a partir das opções da linha de comando
+
+    convert: ['gp2:gp3', 'io1:io2']
+    min_iops / min_throughput: ['/dev/sdf:6000', '*:4000'] ('*' vale para todos os devices)
+    """
+    rules = {'convert': {}, 'min_iops': {}, 'min_throughput': {}}
+
+    for item in convert or []:
+        source_type, _, target_type = item.partition(':')
+        if source_type not in VOLUME_LIMITS or target_type not in VOLUME_LIMITS:
+            raise ConfigError(f"Conversão de volume inválida '{item}'. Tipos aceitos: {', '.join(VOLUME_LIMITS)}")
+        rules['convert'][source_type] = target_type
+
+    for key, items in (('min_iops', min_iops), ('min_throughput', min_throughput)):
+        for item in items or []:
+            device, _, value = item.rpartition(':')
+            if not device or not value.isdigit():
+                raise ConfigError(f"Regra de volume inválida '{item}'. Use DEVICE:VALOR (ex: /dev/sdf:6000 ou *:3000)")
+            rules[key][device] = int(value)
+
+    return rules
+
+def volume_baseline(volume):
+    """
+    Calcula o desempenho base (IOPS, MiB/s) que o volume de origem entrega hoje
+    """
+    volume_type = volume['VolumeType']
+    size = volume['Size']
+
+    if volume_type == 'gp2':
+        # gp2: 3 IOPS/GiB (mínimo 100, máximo 16000); até 170 GiB o teto de throughput é 128 MiB/s
+        iops = min(max(3 * size, 100), 16000)
+        throughput = 128 if size <= 170 else 250
+        return iops, throughput
+
+    if volume_type == 'gp3':
+        return volume.get('Iops', 3000), volume.get('Throughput', 125)
+
+    if volume_type in ['io1', 'io2']:
+        return volume.get('Iops'), None
+
+    if volume_type in ['st1', 'sc1']:
+        # HDD: o throughput base cresce por TiB até o teto do tipo; os IOPS (de 1 MiB) não se comparam aos de SSD
+        per_tib, ceiling = VOLUME_LIMITS[volume_type]['baseline_per_tib']
+        return None, min(math.ceil(per_tib * size / 1024), ceiling)
+
+    if volume_type == 'standard':
+        # Magnético: em média uns 100 IOPS
+        return 100, None
+
+    return None, None
+
+def rule_for_device(rule, device_name):
+    """
+    Valor da regra para o device, caindo para '*' se não houver específica
+    """
+    return rule.get(device_name, rule.get('*'))
+
+def apply_volume_rules(device_name, volume, volume_rules, is_root=False):
+    """
+    Aplica as regras de reescrita a um volume de origem
+
+    Devolve (tipo, iops, throughput, size, problemas). O desempenho calculado nunca
+    fica abaixo do que o volume de origem entrega.
+    """
+    volume_rules = volume_rules or {}
+    source_type = volume['VolumeType']
+    target_type = volume_rules.get('convert', {}).get(source_type, source_type)
+    limits = VOLUME_LIMITS.get(target_type, {})
+    size = volume['Size']
+    problems = []
+
+    baseline_iops, baseline_throughput = volume_baseline(volume)
+    iops = None
+    throughput = None
+
+    min_iops = rule_for_device(volume_rules.get('min_iops', {}), device_name)
+    if 'iops' in limits:
+        iops = max(baseline_iops or limits['iops'][0], limits['iops'][0])
+        if min_iops:
+            iops = max(iops, min_iops)
+    elif min_iops:
+        say(f"⚠️  {device_name}: {target_type} não tem IOPS configurável; regra de {min_iops} IOPS ignorada "
+            "(converta o volume, ex: --convert-volume gp2:gp3)")
+
+    min_throughput = rule_for_device(volume_rules.get('min_throughput', {}), device_name)
+    if 'throughput' in limits:
+        throughput = max(baseline_throughput or limits['throughput'][0], limits['throughput'][0])
+        if min_throughput:
+            throughput = max(throughput, min_throughput)
+
+        # gp3 limita o throughput pelo IOPS provisionado; sobe o IOPS se precisar
+        iops = max(iops, math.ceil(throughput / limits['throughput_per_iops']))
+    elif min_throughput:
+        say(f"⚠️  {device_name}: {target_type} não tem throughput configurável; regra de {min_throughput} MB/s "
+            "ignorada (só gp3)")
+
+    # Validação contra os limites do tipo de destino
+    if is_root and not limits.get('boot', True):
+        problems.append(f"{device_name}: {target_type} não pode ser usado como volume raiz")
+
+    min_size, max_size = limits.get('size', (1, None))
+    if size < min_size:
+        say(f"⚠️  {device_name}: {target_type} exige no mínimo {min_size} GiB, aumentando de {size} GiB")
+        size = min_size
+    if max_size and size > max_size:
+        problems.append(f"{device_name}: {size} GiB excede o máximo de {max_size} GiB para {target_type}")
+
+    if iops is not None:
+        if iops > limits['iops'][1]:
+            problems.append(f"{device_name}: {iops} IOPS excede o máximo de {limits['iops'][1]} para {target_type}")
+        # O mínimo do tipo vale em qualquer tamanho (gp3 tem 3000 IOPS mesmo com 1 GiB)
+        elif iops > limits['iops'][0] and iops > limits['iops_per_gib'] * size:
+            problems.append(f"{device_name}: {iops} IOPS excede {limits['iops_per_gib']} IOPS/GiB para {size} GiB em {target_type}")
+
+    if throughput is not None and throughput > limits['throughput'][1]:
+        problems.append(f"{device_name}: {throughput} MiB/s excede o máximo de {limits['throughput'][1]} para {target_type}")
+
+    # Tipo de destino sem como chegar no desempenho de origem (ex: io1 -> gp2, st1 grande -> gp2)
+    target_iops, target_throughput = volume_baseline(
+        {'VolumeType': target_type, 'Size': size, 'Iops': iops, 'Throughput': throughput}
+    )
+    if baseline_iops and target_iops is not None and target_iops < baseline_iops:
+        problems.append(f"{device_name}: {target_type} de {size} GiB entrega {target_iops} IOPS, abaixo dos "
+                        f"{baseline_iops} IOPS do {source_type} de origem")
+    if baseline_throughput and target_throughput is not None and target_throughput < baseline_throughput:
+        problems.append(f"{device_name}: {target_type} de {size} GiB entrega {target_throughput} MiB/s, abaixo dos "
+                        f"{baseline_throughput} MiB/s do {source_type} de origem")
+
+    # Avisa quando o volume do clone vai ser diferente do de origem
+    changed = (
+        target_type != source_type
+        or (iops is not None and iops != volume.get('Iops'))
+        or (throughput is not None and throughput != volume.get('Throughput'))
+    )
+    if changed:
+        detail = f"{source_type} → {target_type}"
+        if iops:
+            detail += f", {iops} IOPS"
+        if throughput:
+            detail += f", {throughput} MB/s"
+        say(f"🔁 {device_name}: {detail}")
+
+    return target_type, iops, throughput, size, problems
+
+def build_ebs_spec(device_name, volume, delete_on_termination, volume_rules, is_root=False):
+    """
+    Monta o bloco 'Ebs' do mapeamento já com as regras aplicadas
+    """
+    volume_type, iops, throughput, size, problems = apply_volume_rules(device_name, volume, volume_rules, is_root)
+    if problems:
+        raise ConfigError("; ".join(problems))
+
+    ebs = {
+        'DeleteOnTermination': delete_on_termination,
+        'VolumeSize': size,
+        'VolumeType': volume_type,
+        'Encrypted': volume.get('Encrypted', False)
+    }
+    if iops is not None:
+        ebs['Iops'] = iops
+    if throughput is not None:
+        ebs['Throughput'] = throughput
+
+    return ebs
+
+def describe_ebs_spec(device_name, ebs):
+    """
+    Texto de exibição de um mapeamento ('/dev/sdf: 100GB gp3, 3000 IOPS, 125 MB/s throughput')
+    """
+    volume_info = f"{device_name}: {ebs['VolumeSize']}GB {ebs['VolumeType']}"
+    if 'Iops' in ebs:
+        volume_info += f", {ebs['Iops']} IOPS"
+    if 'Throughput' in ebs:
+        volume_info += f", {ebs['Throughput']} MB/s throughput"
+    return volume_info
+
+def prepare_root_volume_mapping(instance, new_ami_id, ec2_client, volume_rules=None, volumes=None):
     """
     Prepara o mapeamento do volume raiz baseado na instância original,
-    apenas se for diferente do proposto pela AMI
+    apenas se for diferente do proposto pela AMI (ou se alguma regra de reescrita mudar algo)
     """
     try:
         # Obter o nome do dispositivo raiz da instância
         root_device_name = instance['RootDeviceName']
-        
+
         # Encontrar o mapeamento do dispositivo raiz na instância original
         root_mapping = None
         for bdm in instance['BlockDeviceMappings']:
             if bdm['DeviceName'] == root_device_name:
                 root_mapping = bdm
                 break
-        
+
         if not root_mapping or 'Ebs' not in root_mapping:
-            print("ℹ️  Não foi possível obter informações do volume raiz da instância. Usando configurações da AMI.")
+            say("ℹ️  Não foi possível obter informações do volume raiz da instância. Usando configurações da AMI.")
             return None
-        
+
         # Obter o ID do volume raiz da instância
         root_volume_id = root_mapping['Ebs']['VolumeId']
-        
-        # Obter detalhes do volume raiz da instância
-        instance_volume = ec2_client.describe_volumes(VolumeIds=[root_volume_id])['Volumes'][0]
+
+        # Obter detalhes do volume raiz da instância (reaproveita o describe em lote se veio pronto)
+        if volumes and root_volume_id in volumes:
+            instance_volume = volumes[root_volume_id]
+        else:
+            instance_volume = ec2_client.describe_volumes(VolumeIds=[root_volume_id])['Volumes'][0]
         instance_volume_type = instance_volume['VolumeType']
-        
+
         # Obter informações da AMI para comparar
         ami_info = ec2_client.describe_images(ImageIds=[new_ami_id])['Images'][0]
         ami_root_device = ami_info['RootDeviceName']
-        
+
         # Encontrar o mapeamento do dispositivo raiz na AMI
         ami_root_mapping = None
         for bdm in ami_info.get('BlockDeviceMappings', []):
             if bdm['DeviceName'] == ami_root_device:
                 ami_root_mapping = bdm
                 break
-        
+
+        # Regras de reescrita que mexem no raiz obrigam a ter um mapeamento próprio
+        rewritten = bool(volume_rules) and (
+            instance_volume_type in volume_rules.get('convert', {})
+            or rule_for_device(volume_rules.get('min_iops', {}), root_device_name)
+            or rule_for_device(volume_rules.get('min_throughput', {}), root_device_name)
+        )
+
         # Se não encontrar mapeamento na AMI, usar o da instância
         if not ami_root_mapping or 'Ebs' not in ami_root_mapping:
-            print("⚠️  Não foi possível obter informações do volume raiz da AMI. Usando configurações da instância.")
-        else:
+            say("⚠️  Não foi possível obter informações do volume raiz da AMI. Usando configurações da instância.")
+        elif not rewritten:
             # Verificar se o tipo de volume da AMI é o mesmo da instância
             ami_volume_type = ami_root_mapping['Ebs'].get('VolumeType', 'gp2')  # padrão é gp2
-            
+
             if instance_volume_type == ami_volume_type:
-                print(f"ℹ️  Tipo de volume raiz da instância ({instance_volume_type}) é igual ao da AMI. Usando configurações padrão.")
+                say(f"ℹ️  Tipo de volume raiz da instância ({instance_volume_type}) é igual ao da AMI. Usando configurações padrão.")
                 return None
-        
+
         # Se chegou aqui, precisamos criar um mapeamento personalizado
-        print(f"\n💾 Configurando volume raiz:")
-        print(f"  - Tipo de volume da instância: {instance_volume_type}")
+        say(f"\n💾 Configurando volume raiz:")
+        say(f"  - Tipo de volume da instância: {instance_volume_type}")
         if ami_root_mapping and 'Ebs' in ami_root_mapping:
-            print(f"  - Tipo de volume da AMI: {ami_root_mapping['Ebs'].get('VolumeType', 'gp2')}")
-        
+            say(f"  - Tipo de volume da AMI: {ami_root_mapping['Ebs'].get('VolumeType', 'gp2')}")
+
         # Criar o mapeamento para o novo volume raiz
         new_root_mapping = {
             'DeviceName': root_device_name,
-            'Ebs': {
-                'DeleteOnTermination': root_mapping['Ebs'].get('DeleteOnTermination', True),
-                'VolumeType': instance_volume_type,
-                'Encrypted': instance_volume.get('Encrypted', False)
-            }
+            'Ebs': build_ebs_spec(
+                root_device_name,
+                instance_volume,
+                root_mapping['Ebs'].get('DeleteOnTermination', True),
+                volume_rules,
+                is_root=True
+            )
         }
-        
-        # Adicionar parâmetros específicos com base no tipo de volume
-        if instance_volume_type == 'gp3':
-            # gp3 suporta IOPS e Throughput
-            new_root_mapping['Ebs']['Iops'] = instance_volume.get('Iops', 3000)
-            if 'Throughput' in instance_volume:
-                new_root_mapping['Ebs']['Throughput'] = instance_volume['Throughput']
-            
-            # Exibe informações sobre o volume raiz
-            volume_info = f"{root_device_name}: {instance_volume_type}"
-            if 'Iops' in instance_volume:
-                volume_info += f", {instance_volume['Iops']} IOPS"
-            if 'Throughput' in instance_volume:
-                volume_info += f", {instance_volume['Throughput']} MB/s throughput"
-            print(f"  - Configuração aplicada: {volume_info}")
-        
-        elif instance_volume_type in ['io1', 'io2']:
-            # io1 e io2 suportam IOPS
-            if 'Iops' in instance_volume:
-                new_root_mapping['Ebs']['Iops'] = instance_volume['Iops']
-            
-            # Exibe informações sobre o volume raiz
-            volume_info = f"{root_device_name}: {instance_volume_type}"
-            if 'Iops' in instance_volume:
-                volume_info += f", {instance_volume['Iops']} IOPS"
-            print(f"  - Configuração aplicada: {volume_info}")
-        
-        else:
-            # Para outros tipos (gp2, st1, sc1, standard)
-            print(f"  - Configuração aplicada: {root_device_name}: {instance_volume_type}")
-        
+        say(f"  - Configuração aplicada: {describe_ebs_spec(root_device_name, new_root_mapping['Ebs'])}")
+
         return new_root_mapping
-    
+
+    except ConfigError:
+        # Regra de reescrita inválida para o raiz: não pode virar silenciosamente o padrão da AMI
+        raise
     except Exception as e:
-        print(f"⚠️  Erro ao configurar volume raiz: {e}. Usando configurações padrão da AMI.")
+        say(f"⚠️  Erro ao configurar volume raiz: {e}. Usando configurações padrão da AMI.")
         return None
 
-def add_block_device_mappings(run_params, instance, ec2_client):
+def add_block_device_mappings(run_params, instance, ec2_client, volume_rules=None):
     """
     Adiciona mapeamentos de dispositivos de bloco para volumes raiz e não-raiz
     """
     if 'BlockDeviceMappings' not in instance:
         return run_params
-    
+
     root_device = instance['RootDeviceName']
     block_device_mappings = []
-    
-    # Primeiro, adiciona o mapeamento do volume raiz
-    root_mapping = prepare_root_volume_mapping(instance, None, ec2_client)
+
+    # Busca todos os volumes da instância numa chamada só
+    volume_ids = [bdm['Ebs']['VolumeId'] for bdm in instance['BlockDeviceMappings'] if 'Ebs' in bdm]
+    volumes = {}
+    if volume_ids:
+        for volume in ec2_client.describe_volumes(VolumeIds=volume_ids)['Volumes']:
+            volumes[volume['VolumeId']] = volume
+
+    # Primeiro, adiciona o mapeamento do volume raiz (comparando com a AMI que vai ser usada)
+    root_mapping = prepare_root_volume_mapping(instance, run_params.get('ImageId'), ec2_client, volume_rules, volumes)
     if root_mapping:
         block_device_mappings.append(root_mapping)
-    
+
     # Depois, adiciona os volumes não-raiz
-    print("\n💾 Configurando volumes adicionais:")
+    say("\n💾 Configurando volumes adicionais:")
     has_additional_volumes = False
-    
+
     for bdm in instance['BlockDeviceMappings']:
         # Pula o dispositivo raiz, pois já foi tratado acima
         if bdm['DeviceName'] == root_device:
             continue
-            
+
         if 'Ebs' in bdm:
             has_additional_volumes = True
-            volume_id = bdm['Ebs']['VolumeId']
-            volume = ec2_client.describe_volumes(VolumeIds=[volume_id])['Volumes'][0]
-            
-            # Tipo de volume
-            volume_type = volume['VolumeType']
-            
+            volume = volumes[bdm['Ebs']['VolumeId']]
+
             new_bdm = {
                 'DeviceName': bdm['DeviceName'],
-                'Ebs': {
-                    'VolumeSize': volume['Size'],
-                    'VolumeType': volume_type,
-                    'DeleteOnTermination': bdm['Ebs'].get('DeleteOnTermination', False),
-                    'Encrypted': volume['Encrypted']
-                }
+                'Ebs': build_ebs_spec(
+                    bdm['DeviceName'],
+                    volume,
+                    bdm['Ebs'].get('DeleteOnTermination', False),
+                    volume_rules
+                )
             }
-            
-            # Adiciona parâmetros compatíveis com cada tipo de volume
-            if volume_type == 'gp3':
-                # gp3 suporta IOPS e Throughput
-                new_bdm['Ebs']['Iops'] = volume.get('Iops', 3000)
-                if 'Throughput' in volume:
-                    new_bdm['Ebs']['Throughput'] = volume['Throughput']
-            
-            elif volume_type in ['io1', 'io2']:
-                # io1 e io2 suportam IOPS
-                if 'Iops' in volume:
-                    new_bdm['Ebs']['Iops'] = volume['Iops']
-            
+
             block_device_mappings.append(new_bdm)
-            
+
             # Exibe informações sobre o volume
-            volume_info = f"{bdm['DeviceName']}: {volume['Size']}GB {volume_type}"
-            if 'Iops' in volume and volume_type in ['gp3', 'io1', 'io2']:
-                volume_info += f", {volume['Iops']} IOPS"
-            if 'Throughput' in volume and volume_type == 'gp3':
-                volume_info += f", {volume['Throughput']} MB/s throughput"
-            print(f"  - {volume_info}")
-    
+            say(f"  - {describe_ebs_spec(bdm['DeviceName'], new_bdm['Ebs'])}")
+
     if not has_additional_volumes:
-        print("  - Nenhum volume adicional encontrado além do volume raiz")
-    
+        say("  - Nenhum volume adicional encontrado além do volume raiz")
+
     if block_device_mappings:
         run_params['BlockDeviceMappings'] = block_device_mappings
-    
+
     return run_params
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+
+'''
+Exceções da lib.
+
+As funções da lib não chamam sys.exit: levantam uma destas exceções e quem chamou
+decide o que fazer (o CLI mostra a mensagem e sai com código 1; a API deixa subir;
+o fan-out registra o erro no job e segue com os outros).
+'''
+
+class CloneError(Exception):
+    """
+    Base de todos os erros da lib
+    """
+
+class ConfigError(CloneError):
+    """
+    Opções, regras ou manifesto inválidos (nada foi tocado na AWS)
+    """
+
+class InstanceNotFoundError(CloneError):
+    """
+    Instância de origem não encontrada na região
+    """
+
+    def __init__(self, instance_id):
+        super().__init__(f"Instância {instance_id} não encontrada")
+        self.instance_id = instance_id
+
+class AmiNotFoundError(CloneError):
+    """
+    AMI informada não existe ou nenhuma AMI foi encontrada para a instância
+    """
+
+class PreflightError(CloneError):
+    """
+    O preflight encontrou problemas; a origem NÃO foi parada
+    """
+
+    def __init__(self, message, problems):
+        super().__init__(f"{message}: {'; '.join(problems)}")
+        self.problems = problems
+
+class AwsError(CloneError):
+    """
+    Erro do boto3/botocore (ClientError, credenciais, profile, waiter) convertido pela lib
+
+    code é o código de erro da AWS (ou o nome da exceção do botocore). Se a falha foi depois
+    do launch, new_instance_id traz a instância que já foi criada.
+    """
+
+    def __init__(self, message, code=None, new_instance_id=None):
+        if new_instance_id:
+            message = f"{message} (a nova instância {new_instance_id} já foi criada)"
+        super().__init__(message)
+        self.code = code
+        self.new_instance_id = new_instance_id
+
+class NotReadyError(CloneError):
+    """
+    A nova instância foi criada mas as checagens de prontidão não passaram no tempo
+    """
+
+    def __init__(self, instance_id, failures):
+        super().__init__(f"a instância {instance_id} foi criada mas não ficou pronta (falharam: {', '.join(failures)})")
+        self.instance_id = instance_id
+        self.failures = failures
@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+import json
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+
+from libs.ami_finder import find_instance_amis
+from libs.ec2_clone_functions import clone_instance_with_new_ami, plan_clone
+from libs.errors import AmiNotFoundError, CloneError
+from libs.reservations import describe_usage, release_capacity, reservation_usage, reserve_capacity
+from libs.scheduler import predict_durations, run_scheduled
+from libs.snapshots import deregister_snapshot_ami, register_snapshot_ami
+from libs.standby import (
+    STANDBY_AMI_TAG, cleanup_standby, clone_from_standby, find_ready_standby, get_tag, refresh_standby
+)
+from libs import api, progress
+from libs.progress import format_seconds, say
+from libs.sessions import get_client
+
+'''
+Execução paralela dos jobs do manifesto (ver libs.manifest) ou da seleção por tag/VPC.
+
+O mesmo fan-out serve para o clone, o plano, o warm pool de standbys (modos
+standby-refresh e standby-cleanup), o drill de DR (modo drill) e as reservas de
+capacidade (modos reserve, reserve-release e reserve-report).
+'''
+
+
+# Modos do fan-out: o que cada job faz
+FANOUT_MODES = ('clone', 'plan', 'standby-refresh', 'standby-cleanup', 'drill', 'reserve', 'reserve-release',
+                'reserve-report')
+
+def run_fanout(jobs, mode='clone', max_workers=8, max_per_account=None, volume_rules=None, type_mapping=None,
+               use_standby=False, readiness=None, tags=None, from_snapshots=False, schedule=False,
+               schedule_history=None, drill_id=None):
+    """
+    Executa os jobs de clone (ou plano/standby) em paralelo, respeitando o limite por conta
+    (max_per_account None = sem limite por conta, só o max_workers)
+
+    No modo clone, primeiro roda o plano + preflight do lote inteiro; só os jobs validados
+    seguem para a parada da origem e o clone. Com use_standby, as instâncias que têm
+    standby parado pulam o plano e são ativadas a partir dele. No modo drill as origens
+    continuam ligadas e os clones recebem as tags extras e o drill_id (ver libs.drill). Com from_snapshots,
+    os jobs sem new_ami_id usam uma AMI temporária dos snapshots mais recentes, desregistrada
+    no fim do fan-out. Com schedule (ou com depends_on nos jobs) os clones saem na ordem do
+    agendador, usando a telemetria dos arquivos em schedule_history.
+    """
+    say(f"\n🌐 Iniciando fan-out ({mode}) | workers: {max_workers} | por conta: {max_per_account or 'sem limite'}\n")
+
+    # Resultados na ordem em que os jobs chegam
+    results = []
+
+    first_stage = {
+        'clone': preflight_fanout_job,
+        'plan': plan_fanout_job,
+        'standby-refresh': refresh_fanout_job,
+        'standby-cleanup': cleanup_fanout_job,
+        'drill': drill_fanout_job,
+        'reserve': reserve_fanout_job,
+        'reserve-release': release_fanout_job,
+        'reserve-report': usage_fanout_job
+    }[mode]
+
+    def new_results():
+        # Um resultado por job, que cada etapa vai preenchendo
+        for job in jobs:
+            result = {
+                'job': job,
+                'status': 'ok',
+                'ami_id': job['new_ami_id'],
+                'new_instance_id': None,
+                'run_params': None,
+                'standby_ami': None,
+                'use_standby': use_standby and mode == 'clone',
+                'volume_rules': volume_rules,
+                'type_mapping': type_mapping,
+                'readiness': readiness,
+                'tags': tags,
+                'from_snapshots': from_snapshots,
+                'drill_id': drill_id,
+                'temp_ami': None,
+                'clone_result': None,
+                'reservations': None,
+                'predicted': None,
+                'prediction': None,
+                'error': None,
+                'start': None,
+                'end': None
+            }
+            results.append(result)
+            yield result
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # jobs pode ser um gerador (seleção por tag/VPC): cada job entra na fila assim que aparece.
+            # No drill o job inteiro é a etapa que cria clones, então ele passa pelo agendador no fim
+            if mode == 'drill':
+                for _ in new_results():
+                    pass
+            else:
+                run_limited(new_results(), lambda r: executor.submit(run_fanout_job, first_stage, r),
+                            max_workers, max_per_account)
+
+            accounts = {r['job']['profile'] for r in results}
+            say(f"\n🌐 {len(results)} instância(s) em {len(accounts)} conta(s)")
+            if mode == 'drill':
+                dispatch(executor, drill_fanout_job, results, max_workers, max_per_account, schedule, schedule_history)
+            if mode != 'clone':
+                return results
+
+            validated = [r for r in results if r['status'] == 'ok']
+            say(f"\n🧪 Preflight do lote: {len(validated)}/{len(results)} instância(s) validada(s)\n")
+
+            dispatch(executor, clone_fanout_job, results, max_workers, max_per_account, schedule, schedule_history)
+    finally:
+        release_temp_amis(results)
+
+    return results
+
+def dispatch(executor, stage, results, max_workers, max_per_account, schedule=False, schedule_history=None):
+    """
+    Roda a etapa que cria os clones nos resultados ainda ok
+
+    Com schedule (ou se algum job tiver depends_on) a ordem vem do agendador: maior duração
+    prevista primeiro, respeitando as dependências (ver libs.scheduler).
+    """
+    def submit(result):
+        return executor.submit(run_fanout_job, stage, result)
+
+    if schedule or any(r['job']['depends_on'] for r in results):
+        predict_durations(results, schedule_history or [])
+        run_scheduled(results, submit, max_workers, max_per_account)
+        return
+
+    run_limited((r for r in results if r['status'] == 'ok'), submit, max_workers, max_per_account)
+
+def run_limited(results, submit, max_workers, max_per_account):
+    """
+    Despacha os resultados na ordem em que chegam, com no máximo max_workers no total e
+    max_per_account por profile
+
+    As vagas de cada conta são contadas aqui e um job só é submetido quando a conta dele
+    tem vaga: nenhum worker fica parado esperando a vez de uma conta enquanto outra tem
+    trabalho. results pode ser um gerador (seleção por tag/VPC), lido conforme os jobs aparecem.
+    """
+    queues = {}
+    running = {}
+    active = {}
+
+    def start_queued():
+        for profile, queue in queues.items():
+            while queue and len(running) < max_workers and (not max_per_account or active.get(profile, 0) < max_per_account):
+                active[profile] = active.get(profile, 0) + 1
+                result = queue.popleft()
+                running[submit(result)] = result
+
+    def finish(futures):
+        for future in futures:
+            future.result()
+            active[running.pop(future)['job']['profile']] -= 1
+
+    for result in results:
+        queues.setdefault(result['job']['profile'], deque()).append(result)
+        finish([future for future in running if future.done()])
+        start_queued()
+
+    while running:
+        done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+        finish(done)
+        start_queued()
+
+def run_fanout_job(stage, result):
+    """
+    Roda uma etapa de um job do fan-out, registrando erro e horários
+    """
+    job = result['job']
+    progress.set_current_clone(f"{job['profile']}/{job['region']}/{job['instance_id']}")
+
+    result['start'] = result['start'] or datetime.now().strftime("%H:%M:%S")
+    try:
+        stage(result)
+    except Exception as e:
+        # Um job com erro não pode derrubar os outros
+        result['status'] = 'erro'
+        result['error'] = str(e)
+    result['end'] = datetime.now().strftime("%H:%M:%S")
+
+def plan_fanout_job(result):
+    """
+    Job completo do modo plano (o preflight é o job inteiro)
+    """
+    with progress.phase('clone'):
+        preflight_fanout_job(result)
+
+def preflight_fanout_job(result):
+    """
+    Resolve a AMI, calcula o run_params e valida as dependências, sem parar nada
+    """
+    job = result['job']
+    # Um client para o standby, a AMI e o plan_clone (compartilhado por conta/região, ver libs.sessions)
+    ec2_client = job_ec2_client(job)
+
+    if result['use_standby']:
+        standby = find_ready_standby(ec2_client, job['instance_id'])
+        if standby:
+            # O standby já passou pelo preflight quando foi criado
+            result['standby_ami'] = get_tag(standby, STANDBY_AMI_TAG)
+            say(f"🧊 {job['instance_id']}: standby {standby['InstanceId']} disponível")
+            return
+
+    if not result['ami_id'] and result['from_snapshots']:
+        with progress.phase('discover'):
+            result['ami_id'] = result['temp_ami'] = register_snapshot_ami(ec2_client, job['instance_id'])
+
+    if not result['ami_id']:
+        with progress.phase('discover'):
+            result['ami_id'] = find_instance_amis(ec2_client, job['instance_id'], interactive=False)
+            if not result['ami_id']:
+                raise AmiNotFoundError("nenhuma AMI encontrada para a instância")
+
+    result['run_params'] = plan_clone(
+        job['instance_id'], result['ami_id'], job['profile'], job['region'],
+        job['subnet_id'], interactive=False, preflight=True, volume_rules=result['volume_rules'],
+        type_mapping=result['type_mapping'], ec2_client=ec2_client
+    )
+
+def clone_fanout_job(result):
+    """
+    Para a origem e cria o clone usando o run_params já validado no preflight
+    """
+    job = result['job']
+    if result['standby_ami']:
+        result['new_instance_id'] = clone_from_standby(job['instance_id'], job['profile'], job['region'], job['new_name'],
+                                                       result['readiness'])
+        if not result['new_instance_id']:
+            raise CloneError("o standby deixou de estar disponível; rode de novo sem ele")
+        return
+
+    result['new_instance_id'] = clone_instance_with_new_ami(
+        job['instance_id'], result['ami_id'], job['profile'], job['new_name'], job['region'],
+        interactive=False, run_params=result['run_params'], preflight=False,
+        type_mapping=result['type_mapping'], readiness=result['readiness'], ec2_client=job_ec2_client(job)
+    )
+
+def release_temp_amis(results):
+    """
+    Desregistra as AMIs temporárias criadas a partir de snapshots no preflight
+    """
+    for r in results:
+        if r['temp_ami']:
+            deregister_snapshot_ami(job_ec2_client(r['job']), r['temp_ami'])
+
+def job_ec2_client(job):
+    """
+    Client EC2 da conta/região do job (um só por conta/região no processo, ver libs.sessions)
+    """
+    return get_client(job['profile'], job['region'])
+
+def refresh_fanout_job(result):
+    """
+    Cria/atualiza o standby da instância (a origem não é parada)
+    """
+    job = result['job']
+    with progress.phase('clone'):
+        result['new_instance_id'] = refresh_standby(
+            job['instance_id'], job['profile'], job['region'], job['subnet_id'],
+            result['volume_rules'], result['type_mapping']
+        )
+
+def cleanup_fanout_job(result):
+    """
+    Termina os standbys da instância
+    """
+    job = result['job']
+    removed = cleanup_standby(job['instance_id'], job['profile'], job['region'])
+    result['new_instance_id'] = ', '.join(removed) or None
+
+def drill_fanout_job(result):
+    """
+    Clone de drill: origem ligada, subnet isolada do job e tags do drill desde o launch
+    """
+    job = result['job']
+    clone = api.clone(
+        job['instance_id'], job['profile'], job['region'], result['ami_id'], job['new_name'], job['subnet_id'],
+        volume_rules=result['volume_rules'], type_mapping=result['type_mapping'], readiness=result['readiness'],
+        clone_id=progress.current_clone(), stop_source=False, tags=result['tags'],
+        from_snapshots=result['from_snapshots'], drill_id=result['drill_id'], drill_network=job['drill_network']
+    )
+    result['clone_result'] = clone
+    result['ami_id'] = clone.ami_id
+    result['new_instance_id'] = clone.new_instance_id
+
+def reserve_fanout_job(result):
+    """
+    Cria/reaproveita a reserva de capacidade do clone da instância
+    """
+    job = result['job']
+    with progress.phase('clone'):
+        reserve_capacity(job['instance_id'], job['profile'], job['region'], job['subnet_id'], result['type_mapping'])
+    result['reservations'] = reservation_usage(job['instance_id'], job['profile'], job['region'])
+
+def release_fanout_job(result):
+    """
+    Cancela as reservas de capacidade da instância
+    """
+    job = result['job']
+    released = release_capacity(job['instance_id'], job['profile'], job['region'])
+    result['new_instance_id'] = ', '.join(released) or None
+
+def usage_fanout_job(result):
+    """
+    Utilização das reservas de capacidade da instância
+    """
+    job = result['job']
+    result['reservations'] = reservation_usage(job['instance_id'], job['profile'], job['region'])
+
+def generate_fanout_report(results, mode='clone'):
+    """
+    Junta os resultados de todas as contas/regiões em um único relatório
+    """
+    current_date = datetime.now().strftime("%d/%m/%Y")
+
+    lines = ["===Consigcard - Fan-out===", ""]
+    for profile in dict.fromkeys(r['job']['profile'] for r in results):
+        lines.append(f"Account: {profile.upper()}")
+        for r in results:
+            job = r['job']
+            if job['profile'] != profile:
+                continue
+
+            if r['status'] != 'ok':
+                detail = f"ERRO: {r['error']}"
+            elif mode == 'plan':
+                params = r['run_params']
+                detail = (f"{params['InstanceType']} | {params.get('SubnetId', 'N/A')} | "
+                          f"{params.get('Placement', {}).get('AvailabilityZone', 'N/A')} | {params['ImageId']}")
+            elif mode == 'standby-refresh':
+                detail = f"standby: {r['new_instance_id']}"
+            elif mode == 'standby-cleanup':
+                detail = f"standbys terminados: {r['new_instance_id'] or 'nenhum'}"
+            elif mode == 'drill':
+                clone = r['clone_result']
+                ready = format_seconds(clone.time_to_ready) if clone.time_to_ready is not None else '-'
+                detail = (f"drill: {r['new_instance_id']} | {clone.availability_zone} | "
+                          f"running {format_seconds(clone.time_to_running)} | pronta {ready}")
+            elif mode in ('reserve', 'reserve-report'):
+                detail = f"reservas: {describe_usage(r['reservations'])}"
+            elif mode == 'reserve-release':
+                detail = f"reservas canceladas: {r['new_instance_id'] or 'nenhuma'}"
+            elif r['standby_ami']:
+                detail = f"nova: {r['new_instance_id']} [STANDBY, AMI {r['standby_ami']}]"
+            elif r['temp_ami']:
+                detail = f"nova: {r['new_instance_id']} [SNAPSHOTS]"
+            else:
+                detail = f"nova: {r['new_instance_id']}"
+
+            lines.append(f"  [{job['region']}] {job['instance_id']} -> {detail} ({r['start']} - {r['end']})")
+        lines.append("")
+
+    ok_count = sum(1 for r in results if r['status'] == 'ok')
+    lines.append(f"Total: {ok_count}/{len(results)} com sucesso")
+
+    say("\n\n" + "="*50)
+    say("\n".join(lines))
+    say("="*50)
+
+    report_filename = f"fanout_report_{datetime.now().strftime('%H%M%S')}_{current_date.replace('/', '-')}.txt"
+    try:
+        with open(report_filename, 'w') as f:
+            f.write("\n".join(lines) + "\n")
+            if mode == 'plan':
+                # Os parâmetros completos ficam no arquivo para conferência
+                f.write("\n")
+                for r in results:
+                    if r['run_params']:
+                        f.write(f"{r['job']['profile']}/{r['job']['region']}/{r['job']['instance_id']}:\n")
+                        f.write(json.dumps(r['run_params'], indent=2, default=str) + "\n")
+        say(f"\nRelatório salvo em: {report_filename}")
+    except Exception as e:
+        say(f"Não foi possível salvar o relatório em arquivo: {e}")
+
+    return ok_count == len(results)
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+from libs.errors import ConfigError
+from libs.progress import say
+
+'''
+Mapeamento de tipos de instância no clone (ex: m5 -> m7i, t3 -> t3a).
+
+O mapeamento é um dict {origem: [candidatos]} onde a origem pode ser um tipo exato
+(m5.xlarge) ou uma família (m5). Candidatos de família mantêm o tamanho da origem
+(m5.xlarge -> m7i.xlarge); candidatos com ponto são tipos exatos. Os candidatos são
+tentados em ordem e o tipo original sempre fica como última opção, então listar mais
+de um candidato também serve de fallback quando falta capacidade.
+'''
+
+# Erros do run_instances que indicam falta de capacidade para o tipo na AZ
+CAPACITY_ERRORS = ('InsufficientInstanceCapacity', 'Unsupported')
+
+# Erros do run_instances quando a reserva de capacidade apontada não serve (lotada, cancelada)
+RESERVATION_ERRORS = ('ReservationCapacityExceeded', 'InvalidCapacityReservationId.NotFound',
+                      'InvalidCapacityReservationId.Malformed')
+
+def parse_type_mapping(items):
+    """
+    Monta o mapeamento a partir de ['m5:m7i,m6i', 't3:t3a', 'm5.large:m6i.xlarge']
+    """
+    mapping = {}
+    for item in items or []:
+        source, _, candidates = item.partition(':')
+        candidates = [c.strip() for c in candidates.split(',') if c.strip()]
+        if not source or not candidates:
+            raise ConfigError(f"Mapeamento de tipo inválido '{item}'. Use ORIGEM:CANDIDATO[,CANDIDATO...] (ex: m5:m7i,m6i)")
+        mapping[source] = candidates
+    return mapping
+
+def candidate_types(instance_type, type_mapping):
+    """
+    Lista os tipos candidatos para a origem, em ordem, terminando no tipo original
+    """
+    family, _, size = instance_type.partition('.')
+
+    if instance_type in type_mapping:
+        candidates = type_mapping[instance_type]
+    else:
+        candidates = type_mapping.get(family, [])
+
+    types = []
+    for candidate in candidates:
+        candidate_type = candidate if '.' in candidate else f"{candidate}.{size}"
+        if candidate_type not in types:
+            types.append(candidate_type)
+
+    if instance_type not in types:
+        types.append(instance_type)
+    return types
+
+def compatible_types(ec2_client, instance, ami_id, target_az, type_mapping, hibernation=False):
+    """
+    Filtra os candidatos pelos requisitos da AMI e pela oferta da AZ de destino
+
+    Verifica arquitetura, ENA, NVMe, hibernação e disponibilidade do tipo na AZ.
+    Devolve (lista de tipos compatíveis em ordem, dict com as infos de cada tipo).
+    """
+    # Import local: o parse_type_mapping roda no início do CLI, antes de precisar do botocore
+    from botocore.exceptions import ClientError
+
+    candidates = candidate_types(instance['InstanceType'], type_mapping)
+
+    image = ec2_client.describe_images(ImageIds=[ami_id])['Images'][0]
+    architecture = image.get('Architecture', 'x86_64')
+    ami_ena = image.get('EnaSupport', False)
+
+    type_infos = {}
+    paginator = ec2_client.get_paginator('describe_instance_types')
+    try:
+        for page in paginator.paginate(InstanceTypes=candidates):
+            for info in page['InstanceTypes']:
+                type_infos[info['InstanceType']] = info
+    except ClientError as e:
+        # Um tipo inexistente faz a chamada inteira falhar; aí consulta um por um
+        if e.response['Error']['Code'] != 'InvalidInstanceType':
+            raise
+        for candidate in candidates:
+            try:
+                info = ec2_client.describe_instance_types(InstanceTypes=[candidate])['InstanceTypes']
+                if info:
+                    type_infos[candidate] = info[0]
+            except ClientError:
+                say(f"⚠️  Tipo {candidate} não existe nesta região, ignorando")
+
+    offered = None
+    if target_az:
+        offered = set()
+        paginator = ec2_client.get_paginator('describe_instance_type_offerings')
+        for page in paginator.paginate(
+            LocationType='availability-zone',
+            Filters=[
+                {'Name': 'location', 'Values': [target_az]},
+                {'Name': 'instance-type', 'Values': list(type_infos)}
+            ]
+        ):
+            offered.update(offering['InstanceType'] for offering in page['InstanceTypeOfferings'])
+
+    source_info = type_infos.get(instance['InstanceType'], {})
+    source_nvme = source_info.get('EbsInfo', {}).get('NvmeSupport', 'unsupported')
+
+    compatible = []
+    for candidate in candidates:
+        info = type_infos.get(candidate)
+        if not info:
+            continue
+
+        reason = None
+        if architecture not in info.get('ProcessorInfo', {}).get('SupportedArchitectures', []):
+            reason = f"não suporta a arquitetura {architecture} da AMI"
+        elif info.get('NetworkInfo', {}).get('EnaSupport') == 'required' and not ami_ena:
+            reason = "exige ENA e a AMI não tem ENA habilitado"
+        elif (info.get('EbsInfo', {}).get('NvmeSupport') == 'required'
+              and source_nvme == 'unsupported' and not ami_ena):
+            # Origem em Xen sem ENA: a AMI muito provavelmente não tem driver NVMe
+            reason = "exige NVMe e a AMI vem de uma instância sem NVMe/ENA"
+        elif hibernation and not info.get('HibernationSupported', False):
+            reason = "não suporta hibernação"
+        elif offered is not None and candidate not in offered:
+            reason = f"não é oferecido na AZ {target_az}"
+
+        if reason:
+            if candidate != instance['InstanceType']:
+                say(f"⚠️  Tipo {candidate} descartado: {reason}")
+            continue
+        compatible.append(candidate)
+
+    return compatible, type_infos
+
+def apply_instance_type(run_params, instance, ec2_client, type_mapping):
+    """
+    Escolhe o tipo da nova instância e ajusta o CreditSpecification para ele
+
+    Sem mapeamento mantém o tipo original e o comportamento antigo (família T).
+    """
+    source_type = instance['InstanceType']
+
+    if not type_mapping:
+        new_type = source_type
+        burstable = source_type.startswith('t')
+    else:
+        target_az = run_params.get('Placement', {}).get('AvailabilityZone')
+        compatible, type_infos = compatible_types(
+            ec2_client, instance, run_params['ImageId'], target_az, type_mapping,
+            hibernation=bool(run_params.get('HibernationOptions'))
+        )
+        if not compatible:
+            say(f"⚠️  Nenhum tipo candidato compatível; mantendo {source_type}")
+            compatible = [source_type]
+
+        new_type = compatible[0]
+        burstable = type_infos.get(new_type, {}).get('BurstablePerformanceSupported', new_type.startswith('t'))
+
+        if new_type != source_type:
+            say(f"⬆️  Tipo de instância: {new_type} (original era {source_type})")
+
+    run_params['InstanceType'] = new_type
+    return apply_credit_specification(run_params, instance, ec2_client, burstable)
+
+def apply_credit_specification(run_params, instance, ec2_client, burstable):
+    """
+    Copia o modo de créditos de CPU da origem se o novo tipo for da família T (burstable)
+    """
+    from botocore.exceptions import ClientError
+
+    run_params.pop('CreditSpecification', None)
+
+    cpu_credits = instance.get('CreditSpecification', {}).get('CpuCredits')
+    if (not cpu_credits and burstable and instance['InstanceType'].startswith('t')
+            and instance['InstanceType'] != run_params['InstanceType']):
+        # O describe_instances não traz o modo de créditos; busca direto quando vamos trocar o tipo
+        try:
+            specs = ec2_client.describe_instance_credit_specifications(InstanceIds=[instance['InstanceId']])
+            if specs['InstanceCreditSpecifications']:
+                cpu_credits = specs['InstanceCreditSpecifications'][0].get('CpuCredits')
+        except ClientError:
+            pass
+
+    if not cpu_credits:
+        return run_params
+
+    if burstable:
+        run_params['CreditSpecification'] = {'CpuCredits': cpu_credits}
+        say(f"💰 Modo de créditos CPU: {cpu_credits}")
+    else:
+        say(f"ℹ️  {run_params['InstanceType']} não é burstable; modo de créditos {cpu_credits} da origem ignorado")
+
+    return run_params
+
+def launch_with_fallback(ec2_client, run_params, instance, type_mapping):
+    """
+    Faz o run_instances e, se faltar capacidade, tenta o próximo tipo compatível do mapeamento
+    """
+    from botocore.exceptions import ClientError
+    from libs.ec2_network_utils import ensure_placement_group
+
+    # O plano só registra o placement group; o equivalente na AZ de destino nasce aqui
+    ensure_placement_group(ec2_client, run_params, instance)
+
+    tried = []
+    while True:
+        try:
+            return ec2_client.run_instances(**run_params)
+        except ClientError as e:
+            # Reserva lotada/cancelada: a garantia acabou, mas ainda dá para tentar a capacidade comum
+            if 'CapacityReservationSpecification' in run_params and e.response['Error']['Code'] in RESERVATION_ERRORS:
+                say(f"⚠️  Reserva de capacidade indisponível ({e.response['Error']['Code']}), lançando sem reserva...")
+                run_params.pop('CapacityReservationSpecification')
+                continue
+
+            if not type_mapping or e.response['Error']['Code'] not in CAPACITY_ERRORS:
+                raise
+
+            tried.append(run_params['InstanceType'])
+            target_az = run_params.get('Placement', {}).get('AvailabilityZone')
+            compatible, type_infos = compatible_types(
+                ec2_client, instance, run_params['ImageId'], target_az, type_mapping,
+                hibernation=bool(run_params.get('HibernationOptions'))
+            )
+            remaining = [t for t in compatible if t not in tried]
+            if not remaining:
+                raise
+
+            say(f"⚠️  Sem capacidade para {run_params['InstanceType']} ({e.response['Error']['Code']}), "
+                f"tentando {remaining[0]}...")
+            run_params['InstanceType'] = remaining[0]
+            # A reserva é de um tipo só; com outro tipo ela não serve
+            run_params.pop('CapacityReservationSpecification', None)
+            burstable = type_infos.get(remaining[0], {}).get('BurstablePerformanceSupported', False)
+            apply_credit_specification(run_params, instance, ec2_client, burstable)
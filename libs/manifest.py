@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+import itertools
+import json
+
+from libs.discovery import discover_jobs, parse_selector
+from libs.ec2_volume_utils import parse_volume_rules
+from libs.errors import ConfigError
+from libs.instance_types import parse_type_mapping
+from libs.readiness import parse_readiness
+from libs.validation import available_profiles, validate_id, validate_profile
+
+'''
+Formato do manifesto (JSON):
+
+{
+    "max_per_account": 2,
+    "volume_rules": {"convert": {"gp2": "gp3"}, "min_iops": {"*": 3000}, "min_throughput": {"/dev/sdf": 250}},
+    "type_mapping": {"m5": ["m7i", "m6i"], "t3": ["t3a"]},
+    "readiness": {"status_checks": true, "tcp": [22], "http": ["8080/health"], "ssm": ["systemctl is-active app"], "timeout": 600},
+    "targets": [
+        {
+            "profile": "dev",
+            "region": "us-east-1",
+            "subnet_id": "subnet-...",
+            "drill_security_groups": ["sg-..."],
+            "select": {"tags": {"DR-Tier": "1", "Env": ["prd", "hml"]}, "vpc_id": "vpc-..."},
+            "instances": [
+                {"instance_id": "i-0123456789abcdef0", "new_ami_id": "ami-...", "subnet_id": "subnet-...", "new_name": "WebServer",
+                 "depends_on": ["i-0fedcba9876543210"]}
+            ]
+        }
+    ]
+}
+
+Só o instance_id é obrigatório em cada instância. Sem new_ami_id usa a AMI mais recente,
+sem subnet_id escolhe sozinho uma subnet da mesma VPC em outra AZ. O subnet_id do target
+vale para as instâncias dele que não informarem o seu (útil para a subnet isolada do drill),
+e o mesmo vale para drill_security_groups (security groups da VPC isolada do drill).
+Com "select" o target também inclui as instâncias em running que batem com as tags (todas
+precisam bater; lista = qualquer um dos valores; null = só a tag existir) e/ou a VPC, buscadas
+sob demanda durante o fan-out (ver libs.discovery). "instances" e "select" podem ser usados juntos.
+depends_on lista as instâncias (do mesmo manifesto) que precisam terminar o clone antes desta
+começar (ex: o app depois do banco; ver libs.scheduler).
+volume_rules, type_mapping e readiness são opcionais e valem para todas as instâncias do manifesto.
+O manifesto inteiro (formato dos IDs, profiles e regras) é validado na leitura, antes de
+qualquer chamada à AWS (ver libs.validation).
+
+O mesmo manifesto serve para manter o warm pool de standbys (modos standby-refresh e
+standby-cleanup) com a lista de instâncias protegidas, para o drill de DR (modo drill) e
+para as reservas de capacidade (modos reserve, reserve-release e reserve-report).
+'''
+
+def load_manifest(manifest_path):
+    """
+    Lê o manifesto de fan-out e devolve os jobs (um por instância, gerados sob demanda)
+    """
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        raise ConfigError(f"Não foi possível ler o manifesto {manifest_path}: {e}")
+
+    # Os arquivos de profiles são lidos uma vez só para o manifesto inteiro
+    profiles = available_profiles()
+
+    targets = manifest.get('targets', [])
+    for target in targets:
+        if 'profile' not in target or 'region' not in target:
+            raise ConfigError("Todo target do manifesto precisa de 'profile' e 'region'")
+        validate_profile(target['profile'], profiles)
+        if target.get('subnet_id'):
+            validate_id(target['subnet_id'], 'subnet')
+        validate_security_groups(target, f"{target['profile']}/{target['region']}")
+
+        for item in target.get('instances', []):
+            if 'instance_id' not in item:
+                raise ConfigError(f"Instância sem 'instance_id' no target {target['profile']}/{target['region']}")
+            validate_id(item['instance_id'], 'instance')
+            if item.get('new_ami_id'):
+                validate_id(item['new_ami_id'], 'ami')
+            if item.get('subnet_id'):
+                validate_id(item['subnet_id'], 'subnet')
+            validate_security_groups(item, item['instance_id'])
+            if not isinstance(item.get('depends_on', []), list):
+                raise ConfigError(f"'depends_on' de {item['instance_id']} precisa ser uma lista de IDs de instância")
+            for dependency in item.get('depends_on', []):
+                validate_id(dependency, 'instance')
+
+        # Valida o seletor já aqui; a busca só acontece quando o fan-out consumir os jobs
+        select = target.get('select', {})
+        target['selector'] = parse_selector(
+            [f"{key}={','.join(values) if isinstance(values, list) else values}" if values else key
+             for key, values in select.get('tags', {}).items()],
+            select.get('vpc_id')
+        )
+
+    if not any(target.get('instances') or target['selector'] for target in targets):
+        raise ConfigError(f"Nenhuma instância encontrada no manifesto {manifest_path}")
+
+    # Mesmo formato das opções de linha de comando, validado pelo mesmo parser
+    rules = manifest.get('volume_rules', {})
+    volume_rules = parse_volume_rules(
+        [f"{source}:{target}" for source, target in rules.get('convert', {}).items()],
+        [f"{device}:{value}" for device, value in rules.get('min_iops', {}).items()],
+        [f"{device}:{value}" for device, value in rules.get('min_throughput', {}).items()]
+    )
+
+    type_mapping = parse_type_mapping(
+        [f"{source}:{','.join(candidates)}" for source, candidates in manifest.get('type_mapping', {}).items()]
+    )
+
+    ready = manifest.get('readiness', {})
+    readiness = parse_readiness(
+        ready.get('status_checks', False), ready.get('tcp'), ready.get('http'), ready.get('ssm'),
+        ready.get('timeout', 600), ready.get('interval', 5)
+    )
+
+    return iter_manifest_jobs(targets), manifest.get('max_per_account'), volume_rules, type_mapping, readiness
+
+def validate_security_groups(entry, label):
+    """
+    Valida o drill_security_groups de um target ou instância do manifesto
+    """
+    groups = entry.get('drill_security_groups', [])
+    if not isinstance(groups, list):
+        raise ConfigError(f"'drill_security_groups' de {label} precisa ser uma lista de IDs de security group")
+    for group_id in groups:
+        validate_id(group_id, 'security_group')
+
+def iter_manifest_jobs(targets):
+    """
+    Gera os jobs do manifesto (um por instância): primeiro as listadas, depois as do seletor
+
+    Uma instância que aparece nas duas formas (ou em dois targets) vira um job só.
+    """
+    seen = set()
+    for target in targets:
+        jobs = [
+            {
+                'profile': target['profile'],
+                'region': target['region'],
+                'instance_id': item['instance_id'],
+                'new_ami_id': item.get('new_ami_id'),
+                'subnet_id': item.get('subnet_id', target.get('subnet_id')),
+                'new_name': item.get('new_name'),
+                'depends_on': item.get('depends_on', []),
+                'drill_security_groups': item.get('drill_security_groups', target.get('drill_security_groups', []))
+            }
+            for item in target.get('instances', [])
+        ]
+        if target['selector']:
+            jobs = itertools.chain(jobs, discover_jobs(target['profile'], target['region'], target['selector'],
+                                                       target.get('subnet_id')))
+
+        for job in jobs:
+            key = (job['profile'], job['region'], job['instance_id'])
+            if key not in seen:
+                seen.add(key)
+                job.setdefault('drill_security_groups', target.get('drill_security_groups', []))
+                yield job
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+
+from libs.ec2_network_utils import placement_group_exists
+from libs.progress import bind_clone, say
+from libs.sessions import session_client
+
+'''
+Preflight: valida todas as dependências do run_params ANTES de parar a instância de origem.
+
+Cada verificação devolve None quando está tudo certo ou uma string com o problema.
+As verificações independentes rodam em paralelo e, se todas passarem, fecha com um
+run_instances em DryRun, que pega o que sobrou (permissões, limites, combinações inválidas).
+'''
+
+def run_preflight(session, ec2_client, run_params):
+    """
+    Executa o preflight completo e devolve a lista de problemas encontrados (vazia = ok)
+    """
+    say("🧪 Executando preflight das dependências da nova instância...")
+
+    iam_client = session_client(session, 'iam')
+    kms_client = session_client(session, 'kms', ec2_client.meta.region_name)
+
+    checks = [
+        (check_ami, (ec2_client, run_params)),
+        (check_network, (ec2_client, run_params)),
+        (check_key_pair, (ec2_client, run_params)),
+        (check_instance_profile, (iam_client, run_params)),
+        (check_kms_keys, (ec2_client, kms_client, run_params)),
+    ]
+
+    with ThreadPoolExecutor(max_workers=len(checks)) as executor:
+        futures = [executor.submit(bind_clone(safe_check), check, *check_args) for check, check_args in checks]
+        problems = [future.result() for future in futures]
+    problems = [problem for problem in problems if problem]
+
+    # Só faz o DryRun se o resto passou, senão o erro dele só repete o que já sabemos
+    if not problems:
+        problem = safe_check(check_dry_run, ec2_client, run_params)
+        if problem:
+            problems.append(problem)
+
+    if problems:
+        say("❌ Preflight falhou:")
+        for problem in problems:
+            say(f"  - {problem}")
+    else:
+        say("✅ Preflight ok: todas as dependências foram validadas")
+
+    return problems
+
+def safe_check(check, *args):
+    """
+    Roda uma verificação transformando qualquer exceção em problema reportado
+    """
+    try:
+        return check(*args)
+    except Exception as e:
+        return f"{check.__name__}: erro inesperado: {e}"
+
+def check_ami(ec2_client, run_params):
+    """
+    Verifica se a AMI existe e está disponível
+    """
+    ami_id = run_params.get('ImageId')
+    if not ami_id:
+        return "AMI não definida"
+
+    try:
+        images = ec2_client.describe_images(ImageIds=[ami_id])['Images']
+    except ClientError as e:
+        return f"AMI {ami_id} não acessível: {e.response['Error']['Code']}"
+
+    if not images:
+        return f"AMI {ami_id} não encontrada"
+    if images[0].get('State') != 'available':
+        return f"AMI {ami_id} não está disponível (estado: {images[0].get('State')})"
+    return None
+
+def check_network(ec2_client, run_params):
+    """
+    Verifica se as subnets existem e se os security groups são da mesma VPC delas
+
+    Cobre tanto SubnetId/SecurityGroupIds quanto cada item de NetworkInterfaces
+    """
+    if 'NetworkInterfaces' in run_params:
+        specs = [(eni.get('SubnetId'), eni.get('Groups', [])) for eni in run_params['NetworkInterfaces']]
+    else:
+        specs = [(run_params.get('SubnetId'), run_params.get('SecurityGroupIds', []))]
+
+    problems = []
+    for subnet_id, group_ids in specs:
+        if not subnet_id:
+            continue
+
+        try:
+            subnet = ec2_client.describe_subnets(SubnetIds=[subnet_id])['Subnets'][0]
+        except ClientError as e:
+            problems.append(f"Subnet {subnet_id} não acessível: {e.response['Error']['Code']}")
+            continue
+
+        if not group_ids:
+            continue
+
+        try:
+            groups = ec2_client.describe_security_groups(GroupIds=group_ids)['SecurityGroups']
+        except ClientError as e:
+            problems.append(f"Security groups {', '.join(group_ids)} não acessíveis: {e.response['Error']['Code']}")
+            continue
+
+        wrong_vpc = [sg['GroupId'] for sg in groups if sg['VpcId'] != subnet['VpcId']]
+        if wrong_vpc:
+            problems.append(f"Security groups fora da VPC {subnet['VpcId']} da subnet {subnet_id}: {', '.join(wrong_vpc)}")
+
+    return "; ".join(problems) or None
+
+def check_key_pair(ec2_client, run_params):
+    """
+    Verifica se o key pair ainda existe
+    """
+    key_name = run_params.get('KeyName')
+    if not key_name:
+        return None
+
+    try:
+        ec2_client.describe_key_pairs(KeyNames=[key_name])
+    except ClientError as e:
+        return f"Key pair {key_name} não encontrado: {e.response['Error']['Code']}"
+    return None
+
+def check_instance_profile(iam_client, run_params):
+    """
+    Verifica se o instance profile IAM ainda existe
+    """
+    profile_name = run_params.get('IamInstanceProfile', {}).get('Name')
+    if not profile_name:
+        return None
+
+    try:
+        iam_client.get_instance_profile(InstanceProfileName=profile_name)
+    except ClientError as e:
+        return f"Perfil IAM {profile_name} não encontrado: {e.response['Error']['Code']}"
+    return None
+
+def check_kms_keys(ec2_client, kms_client, run_params):
+    """
+    Verifica se as chaves KMS dos snapshots da AMI e dos volumes estão habilitadas
+    """
+    key_ids = set()
+
+    for bdm in run_params.get('BlockDeviceMappings', []):
+        if bdm.get('Ebs', {}).get('KmsKeyId'):
+            key_ids.add(bdm['Ebs']['KmsKeyId'])
+
+    # Os volumes da AMI vêm dos snapshots dela, então as chaves deles também precisam estar ok
+    images = ec2_client.describe_images(ImageIds=[run_params['ImageId']])['Images']
+    snapshot_ids = [
+        bdm['Ebs']['SnapshotId']
+        for image in images
+        for bdm in image.get('BlockDeviceMappings', [])
+        if bdm.get('Ebs', {}).get('SnapshotId')
+    ]
+    if snapshot_ids:
+        snapshots = ec2_client.describe_snapshots(SnapshotIds=snapshot_ids)['Snapshots']
+        key_ids.update(snap['KmsKeyId'] for snap in snapshots if snap.get('KmsKeyId'))
+
+    problems = []
+    for key_id in sorted(key_ids):
+        try:
+            key = kms_client.describe_key(KeyId=key_id)['KeyMetadata']
+            if key['KeyState'] != 'Enabled':
+                problems.append(f"{key_id} ({key['KeyState']})")
+        except ClientError as e:
+            problems.append(f"{key_id} ({e.response['Error']['Code']})")
+
+    if problems:
+        return f"Chaves KMS inacessíveis ou desabilitadas: {', '.join(problems)}"
+    return None
+
+def check_dry_run(ec2_client, run_params):
+    """
+    Faz o run_instances em DryRun; DryRunOperation significa que a chamada real passaria
+    """
+    params = run_params
+    group_name = run_params.get('Placement', {}).get('GroupName')
+    if group_name and not placement_group_exists(ec2_client, group_name):
+        # O grupo cluster equivalente na AZ de destino só é criado no launch; valida o resto sem ele
+        params = dict(run_params, Placement={k: v for k, v in run_params['Placement'].items() if k != 'GroupName'})
+    try:
+        ec2_client.run_instances(DryRun=True, **params)
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'DryRunOperation':
+            return None
+        return f"DryRun do run_instances falhou: {e.response['Error']['Code']}: {e.response['Error'].get('Message', '')}"
+    return None
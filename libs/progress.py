@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+import json
+import sys
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager, nullcontext
+
+'''
+Barramento de eventos de progresso.
+
+As funções da lib avisam o que estão fazendo por aqui (say, phase, wait_for_state)
+e os sinks registrados decidem o que fazer com isso: desenhar a visão ao vivo no
+terminal, gravar JSONL ou chamar um callback. Sem sink registrado, nenhum evento é
+montado; só sobra o print de sempre (que pode ser desligado com set_console).
+
+Um sink é qualquer chamável que recebe um evento. O clone_id de cada evento vem da
+thread atual (set_current_clone), assim os jobs paralelos não se misturam.
+'''
+
+PhaseStarted = namedtuple('PhaseStarted', 'clone_id phase timestamp')
+PhaseFinished = namedtuple('PhaseFinished', 'clone_id phase timestamp duration ok')
+ApiCall = namedtuple('ApiCall', 'clone_id service operation timestamp')
+WaitingOnState = namedtuple('WaitingOnState', 'clone_id resource_id state timestamp')
+Log = namedtuple('Log', 'clone_id message timestamp')
+
+# Fases de um clone, na ordem em que acontecem ('clone' engloba todas)
+CLONE_PHASES = ('discover', 'plan', 'preflight', 'stop_source', 'launch', 'tag', 'wait_running', 'wait_ready', 'report')
+
+_sinks = []
+_console = True
+_local = threading.local()
+_NULL_PHASE = nullcontext()
+
+def add_sink(sink):
+    """
+    Registra um sink para receber os eventos
+    """
+    _sinks.append(sink)
+    return sink
+
+def remove_sink(sink):
+    """
+    Remove um sink e chama o close dele, se existir
+    """
+    if sink in _sinks:
+        _sinks.remove(sink)
+    close = getattr(sink, 'close', None)
+    if close:
+        close()
+
+def set_console(enabled):
+    """
+    Liga/desliga o print das mensagens (a visão ao vivo desliga para não bagunçar a tela)
+    """
+    global _console
+    _console = enabled
+
+def is_listening():
+    """
+    Indica se há algum sink registrado
+    """
+    return bool(_sinks)
+
+def set_current_clone(clone_id):
+    """
+    Define o clone ao qual os eventos da thread atual pertencem
+    """
+    _local.clone_id = clone_id
+
+def current_clone():
+    """
+    Devolve o clone da thread atual (ou None)
+    """
+    return getattr(_local, 'clone_id', None)
+
+def bind_clone(func):
+    """
+    Embrulha func para rodar em outra thread com o mesmo clone_id da thread atual
+    """
+    clone_id = current_clone()
+
+    def bound(*args, **kwargs):
+        set_current_clone(clone_id)
+        return func(*args, **kwargs)
+
+    return bound
+
+def emit(event):
+    """
+    Entrega o evento para todos os sinks
+    """
+    for sink in list(_sinks):
+        try:
+            sink(event)
+        except Exception:
+            # Um sink com problema não pode derrubar o clone
+            pass
+
+def say(message=""):
+    """
+    Substitui o print nas libs: mostra no console e vira evento Log para os sinks
+    """
+    if _console:
+        print(message)
+    if _sinks:
+        emit(Log(current_clone(), message, time.time()))
+
+def phase(name):
+    """
+    Context manager que marca o início/fim de uma fase do clone atual
+    """
+    if not _sinks:
+        return _NULL_PHASE
+    return _phase(name)
+
+@contextmanager
+def _phase(name):
+    clone_id = current_clone()
+    start = time.time()
+    emit(PhaseStarted(clone_id, name, start))
+    ok = False
+    try:
+        yield
+        ok = True
+    finally:
+        end = time.time()
+        emit(PhaseFinished(clone_id, name, end, end - start, ok))
+
+def instrument_client(client):
+    """
+    Registra o client boto3 para gerar eventos ApiCall (só se alguém estiver ouvindo)
+
+    Pode ser chamada de novo no mesmo client (clients compartilhados, ver libs.sessions):
+    o unique_id garante um registro só.
+    """
+    if _sinks:
+        client.meta.events.register('before-call', _on_api_call, unique_id='clone-ec2-api-call')
+    return client
+
+def _on_api_call(model, **kwargs):
+    if _sinks:
+        emit(ApiCall(current_clone(), model.service_model.service_name, model.name, time.time()))
+
+def wait_for_state(ec2_client, waiter_name, resource_id, **kwargs):
+    """
+    Usa o waiter do boto3 avisando os sinks de qual estado estamos esperando
+    """
+    if _sinks:
+        # instance_running -> running, instance_stopped -> stopped...
+        emit(WaitingOnState(current_clone(), resource_id, waiter_name.split('_', 1)[-1], time.time()))
+    ec2_client.get_waiter(waiter_name).wait(**kwargs)
+
+def event_to_dict(event):
+    """
+    Converte um evento em dict serializável, com o tipo em 'event'
+    """
+    data = {'event': type(event).__name__}
+    data.update(event._asdict())
+    return data
+
+class JsonlSink:
+    """
+    Grava cada evento como uma linha JSON no arquivo
+    """
+
+    def __init__(self, path):
+        self._file = open(path, 'a')
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        line = json.dumps(event_to_dict(event), ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+class PhaseTimer:
+    """
+    Soma a duração de cada fase de um clone (a API usa para devolver os tempos por fase)
+    """
+
+    def __init__(self, clone_id):
+        self.clone_id = clone_id
+        self.durations = {}
+
+    def __call__(self, event):
+        if isinstance(event, PhaseFinished) and event.clone_id == self.clone_id:
+            self.durations[event.phase] = self.durations.get(event.phase, 0.0) + event.duration
+
+class TerminalSink:
+    """
+    Visão ao vivo compacta: uma linha por clone com fase atual, tempo decorrido e ETA
+
+    O ETA usa a duração média de cada fase nos clones que já passaram por ela
+    """
+
+    def __init__(self, stream=None, refresh_interval=0.2):
+        self._stream = stream or sys.stdout
+        self._refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._rows = {}
+        self._phase_stats = {}
+        self._drawn_lines = 0
+        self._last_draw = 0.0
+
+    def __call__(self, event):
+        # Mensagens gerais (fora de um clone) não têm linha na visão ao vivo
+        if event.clone_id is None:
+            return
+
+        with self._lock:
+            row = self._rows.get(event.clone_id)
+            if row is None:
+                row = self._rows[event.clone_id] = {
+                    'start': event.timestamp, 'phase': '-', 'done': set(),
+                    'status': '⏳', 'message': '', 'end': None
+                }
+
+            force = False
+            if isinstance(event, PhaseStarted) and event.phase == 'clone':
+                row['status'], row['end'] = '⏳', None
+                force = True
+            elif isinstance(event, PhaseStarted):
+                row['phase'] = event.phase
+                force = True
+            elif isinstance(event, PhaseFinished):
+                # Qualquer fase com erro encerra a linha; 'clone' ok encerra com sucesso
+                if not event.ok or event.phase == 'clone':
+                    row['status'] = '✅' if event.ok else '❌'
+                    row['end'] = event.timestamp
+                if event.phase != 'clone':
+                    row['done'].add(event.phase)
+                    total, count = self._phase_stats.get(event.phase, (0.0, 0))
+                    self._phase_stats[event.phase] = (total + event.duration, count + 1)
+                force = True
+            elif isinstance(event, WaitingOnState):
+                row['message'] = f"aguardando {event.resource_id} -> {event.state}"
+            elif isinstance(event, Log) and event.message.strip():
+                row['message'] = event.message.strip().splitlines()[-1]
+
+            if force or event.timestamp - self._last_draw >= self._refresh_interval:
+                self._draw(event.timestamp)
+
+    def _eta(self, row, now):
+        if row['end'] is not None:
+            return "-"
+        remaining = [p for p in CLONE_PHASES if p not in row['done']]
+        known = [self._phase_stats[p] for p in remaining if p in self._phase_stats]
+        if not known:
+            return "--:--"
+        seconds = sum(total / count for total, count in known)
+        return format_seconds(seconds)
+
+    def _draw(self, now):
+        lines = []
+        for clone_id, row in self._rows.items():
+            elapsed = format_seconds((row['end'] or now) - row['start'])
+            lines.append(
+                f"{row['status']} {str(clone_id)[:36]:<36} {row['phase']:<13} {elapsed:>6} "
+                f"ETA {self._eta(row, now):>6}  {row['message'][:60]}"
+            )
+
+        # Volta o cursor para o início do bloco desenhado antes e reescreve
+        if self._drawn_lines:
+            self._stream.write(f"\x1b[{self._drawn_lines}F")
+        for line in lines:
+            self._stream.write("\x1b[2K" + line + "\n")
+        self._stream.flush()
+        self._drawn_lines = len(lines)
+        self._last_draw = now
+
+    def close(self):
+        with self._lock:
+            self._draw(time.time())
+
+def format_seconds(seconds):
+    """
+    Formata segundos como MM:SS
+    """
+    seconds = int(seconds)
+    return f"{seconds // 60:02d}:{seconds % 60:02d}"
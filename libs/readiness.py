@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from libs.errors import ConfigError
+from libs.progress import bind_clone, say
+from libs.sessions import session_client
+
+'''
+Detecção de "pronta" além do instance_running.
+
+Depois que a instância entra em running, o SO e a aplicação ainda levam um tempo para
+subir. As checagens configuradas rodam em paralelo, cada uma repetindo a cada
+'interval' segundos até passar ou até estourar o 'timeout' (contado a partir do running):
+
+- status_checks: status checks da instância e do sistema em 'ok' (describe_instance_status)
+- tcp: porta aceitando conexão no IP privado da nova instância (ex: 22, 5432)
+- http: GET em http://<ip>:<porta><caminho> respondendo 2xx/3xx (ex: 8080/health)
+- ssm: comando via SSM Run Command terminando com sucesso (exige agente SSM e perfil IAM)
+
+A instância é considerada pronta quando todas passam.
+'''
+
+# Intervalo (s) do waiter de running: o padrão do boto3 é 15s, o que distorce o tempo até running
+RUNNING_POLL_DELAY = 2
+
+def parse_readiness(status_checks=False, tcp=None, http=None, ssm=None, timeout=600, interval=5):
+    """
+    Monta a configuração de prontidão a partir das opções (devolve None se nada foi pedido)
+    """
+    ports = []
+    for port in tcp or []:
+        ports.append(parse_port(port, f"--ready-tcp {port}"))
+
+    urls = []
+    for item in http or []:
+        port, slash, path = str(item).partition('/')
+        urls.append((parse_port(port, f"--ready-http {item}"), slash + path or '/'))
+
+    if timeout <= 0 or interval <= 0:
+        raise ConfigError("O timeout e o intervalo de prontidão precisam ser maiores que zero")
+
+    if not (status_checks or ports or urls or ssm):
+        return None
+
+    return {
+        'status_checks': bool(status_checks),
+        'tcp': ports,
+        'http': urls,
+        'ssm': list(ssm or []),
+        'timeout': timeout,
+        'interval': interval
+    }
+
+def parse_port(value, option):
+    """
+    Valida um número de porta
+    """
+    try:
+        port = int(value)
+    except (TypeError, ValueError):
+        port = 0
+    if not 0 < port < 65536:
+        raise ConfigError(f"Porta inválida em '{option}'")
+    return port
+
+def describe_readiness(readiness):
+    """
+    Descrição curta das checagens configuradas
+    """
+    checks = []
+    if readiness['status_checks']:
+        checks.append("status checks")
+    checks.extend(f"tcp:{port}" for port in readiness['tcp'])
+    checks.extend(f"http:{port}{path}" for port, path in readiness['http'])
+    checks.extend(f"ssm:'{command}'" for command in readiness['ssm'])
+    return ", ".join(checks)
+
+def ssm_client_for(session, ec2_client, readiness, region=None):
+    """
+    Client SSM das checagens por comando (None se a prontidão não tiver nenhuma)
+    """
+    if not readiness['ssm']:
+        return None
+    return session_client(session, 'ssm', region or ec2_client.meta.region_name)
+
+def wait_until_ready(session, ec2_client, instance_id, readiness, region=None, ssm_client=None, status_checks=None):
+    """
+    Roda as checagens em paralelo até todas passarem ou estourar o timeout
+
+    ssm_client é opcional: sem ele usa o client compartilhado da sessão (ver libs.sessions).
+    status_checks (um BatchedStatusChecks) troca o describe_instance_status por instância por
+    uma consulta única para um grupo de instâncias.
+    Devolve {'ok': bool, 'started': instante do início, 'elapsed': segundos,
+    'checks': {nome: segundos ou None}, 'failures': [...]}
+    """
+    instance = ec2_client.describe_instances(InstanceIds=[instance_id])['Reservations'][0]['Instances'][0]
+    private_ip = instance.get('PrivateIpAddress')
+
+    start = time.time()
+    deadline = start + readiness['timeout']
+    interval = readiness['interval']
+
+    probes = []
+    if readiness['status_checks']:
+        if status_checks:
+            probes.append(("status checks", lambda: status_checks.ok(instance_id)))
+        else:
+            probes.append(("status checks", lambda: status_checks_ok(ec2_client, instance_id)))
+    for port in readiness['tcp']:
+        probes.append((f"tcp:{port}", lambda port=port: tcp_ok(private_ip, port, interval)))
+    for port, path in readiness['http']:
+        probes.append((f"http:{port}{path}", lambda port=port, path=path: http_ok(private_ip, port, path, interval)))
+    if readiness['ssm']:
+        ssm_client = ssm_client or ssm_client_for(session, ec2_client, readiness, region)
+        for command in readiness['ssm']:
+            probes.append((f"ssm:'{command}'", ssm_probe(ssm_client, instance_id, command)))
+
+    say(f"\n🩺 Aguardando {instance_id} ficar pronta ({describe_readiness(readiness)}) | timeout {readiness['timeout']}s")
+
+    with ThreadPoolExecutor(max_workers=len(probes)) as executor:
+        futures = {
+            name: executor.submit(bind_clone(poll_probe), f"{instance_id} {name}", probe, deadline, interval)
+            for name, probe in probes
+        }
+        checks = {name: future.result() for name, future in futures.items()}
+
+    failures = [name for name, took in checks.items() if took is None]
+    result = {
+        'ok': not failures,
+        'started': start,
+        'elapsed': time.time() - start,
+        'checks': {name: (took - start if took is not None else None) for name, took in checks.items()},
+        'failures': failures
+    }
+
+    if result['ok']:
+        say(f"✅ {instance_id} pronta em {result['elapsed']:.0f}s após o running")
+    else:
+        say(f"⚠️  {instance_id} NÃO ficou pronta em {readiness['timeout']}s. Falharam: {', '.join(failures)}")
+    return result
+
+def poll_probe(name, probe, deadline, interval):
+    """
+    Repete a checagem até passar (devolve o instante em que passou) ou até o deadline (devolve None)
+    """
+    while True:
+        try:
+            if probe():
+                say(f"  ✅ {name}")
+                return time.time()
+        except Exception:
+            # Erro transitório (instância subindo, agente SSM ainda não registrado...) conta como "ainda não"
+            pass
+
+        if time.time() + interval > deadline:
+            say(f"  ❌ {name}")
+            return None
+        time.sleep(interval)
+
+def status_checks_ok(ec2_client, instance_id):
+    """
+    Status checks da instância e do sistema em 'ok'
+    """
+    statuses = ec2_client.describe_instance_status(InstanceIds=[instance_id], IncludeAllInstances=True)['InstanceStatuses']
+    return bool(statuses) and status_ok(statuses[0])
+
+class BatchedStatusChecks:
+    """
+    Status checks de um grupo de instâncias com um describe_instance_status por intervalo
+
+    Cada thread pergunta ok(instance_id); a consulta (de todas de uma vez, em lotes de 100)
+    só é refeita quando a anterior tem mais de interval segundos.
+    """
+
+    def __init__(self, ec2_client, instance_ids, interval):
+        self.ec2_client = ec2_client
+        self.instance_ids = list(instance_ids)
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.fetched = None
+        self.statuses = {}
+
+    def ok(self, instance_id):
+        with self.lock:
+            if self.fetched is None or time.time() - self.fetched >= self.interval:
+                self.statuses = {}
+                for i in range(0, len(self.instance_ids), 100):
+                    self.statuses.update(
+                        (status['InstanceId'], status)
+                        for status in self.ec2_client.describe_instance_status(
+                            InstanceIds=self.instance_ids[i:i + 100], IncludeAllInstances=True
+                        )['InstanceStatuses']
+                    )
+                self.fetched = time.time()
+            status = self.statuses.get(instance_id)
+        return bool(status) and status_ok(status)
+
+def status_ok(status):
+    """
+    Status checks da instância e do sistema em 'ok' num item do describe_instance_status
+    """
+    return (status.get('InstanceStatus', {}).get('Status') == 'ok'
+            and status.get('SystemStatus', {}).get('Status') == 'ok')
+
+def tcp_ok(ip, port, timeout):
+    """
+    A porta aceita conexão
+    """
+    with socket.create_connection((ip, port), timeout=timeout):
+        return True
+
+def http_ok(ip, port, path, timeout):
+    """
+    GET responde 2xx/3xx
+    """
+    # Import local: o parse_readiness roda no início do CLI e o urllib.request é pesado
+    import urllib.error
+    import urllib.request
+
+    try:
+        with urllib.request.urlopen(f"http://{ip}:{port}{path}", timeout=timeout) as response:
+            return response.status < 400
+    except urllib.error.HTTPError:
+        return False
+
+def ssm_probe(ssm_client, instance_id, command):
+    """
+    Checagem via SSM: envia o comando e acompanha a execução a cada chamada
+
+    Se o comando terminar com erro, é reenviado na próxima rodada.
+    """
+    # Import local: o parse_readiness roda no início do CLI, antes de precisar do botocore
+    from botocore.exceptions import ClientError
+
+    state = {'command_id': None}
+
+    def probe():
+        if state['command_id'] is None:
+            try:
+                state['command_id'] = ssm_client.send_command(
+                    InstanceIds=[instance_id],
+                    DocumentName='AWS-RunShellScript',
+                    Parameters={'commands': [command]}
+                )['Command']['CommandId']
+            except ClientError:
+                # InvalidInstanceId enquanto o agente ainda não registrou a instância
+                return False
+            return False
+
+        try:
+            status = ssm_client.get_command_invocation(
+                CommandId=state['command_id'], InstanceId=instance_id
+            )['Status']
+        except ClientError:
+            # InvocationDoesNotExist logo depois do send_command
+            return False
+
+        if status == 'Success':
+            return True
+        if status in ('Pending', 'InProgress', 'Delayed'):
+            return False
+        state['command_id'] = None
+        return False
+
+    return probe
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+import copy
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from libs import progress
+from libs.ec2_clone_functions import get_instance_data, prepare_run_params, verify_ami_exists
+from libs.ec2_network_utils import add_network_interfaces, add_placement_group
+from libs.errors import CloneError, PreflightError
+from libs.instance_types import launch_with_fallback
+from libs.preflight import run_preflight
+from libs.progress import bind_clone, format_seconds, phase, say, wait_for_state
+from libs.readiness import RUNNING_POLL_DELAY, BatchedStatusChecks, ssm_client_for, wait_until_ready
+from libs.sessions import get_session, session_client
+
+'''
+Modo réplicas (scale-out): N cópias de uma instância stateless espalhadas pelas AZs.
+
+O run_params é calculado uma vez só (sem perguntas) e depois adaptado para cada subnet
+escolhida (uma por AZ da VPC da origem, ou as informadas). As réplicas são distribuídas
+em rodízio entre as subnets e cada subnet recebe um único run_instances com o
+MinCount/MaxCount certo. A origem não é parada.
+
+Todas as réplicas levam as tags da origem mais ReplicaGroup (igual para o grupo inteiro)
+e ReplicaIndex; o Name ganha o sufixo -01, -02...
+'''
+
+# Réplicas esperando a prontidão ao mesmo tempo (cada uma ainda abre uma thread por checagem)
+READY_WORKERS = 16
+
+REPLICA_GROUP_TAG = 'ReplicaGroup'
+REPLICA_INDEX_TAG = 'ReplicaIndex'
+
+def pick_replica_subnets(ec2_client, instance, subnet_ids=None):
+    """
+    Escolhe as subnets das réplicas: as informadas ou uma por AZ da VPC da origem
+
+    Em cada AZ prefere a subnet com o mesmo nome da subnet da origem e, depois, a com mais IPs livres.
+    """
+    if subnet_ids:
+        subnets = ec2_client.describe_subnets(SubnetIds=subnet_ids)['Subnets']
+        return sorted(subnets, key=lambda s: subnet_ids.index(s['SubnetId']))
+
+    source_subnet = ec2_client.describe_subnets(SubnetIds=[instance['SubnetId']])['Subnets'][0]
+    source_name = next((t['Value'] for t in source_subnet.get('Tags', []) if t['Key'] == 'Name'), None)
+
+    available_azs = {
+        az['ZoneName'] for az in ec2_client.describe_availability_zones()['AvailabilityZones']
+        if az['State'] == 'available'
+    }
+    vpc_subnets = ec2_client.describe_subnets(
+        Filters=[{'Name': 'vpc-id', 'Values': [source_subnet['VpcId']]}]
+    )['Subnets']
+
+    by_az = {}
+    for subnet in vpc_subnets:
+        if subnet['AvailabilityZone'] in available_azs:
+            by_az.setdefault(subnet['AvailabilityZone'], []).append(subnet)
+
+    chosen = []
+    for az in sorted(by_az):
+        same_name = [
+            s for s in by_az[az]
+            if source_name and any(t['Key'] == 'Name' and t['Value'] == source_name for t in s.get('Tags', []))
+        ]
+        candidates = same_name or by_az[az]
+        chosen.append(max(candidates, key=lambda s: s.get('AvailableIpAddressCount', 0)))
+    return chosen
+
+def spread_replicas(count, subnets):
+    """
+    Distribui as réplicas em rodízio entre as subnets: devolve [(subnet, quantidade), ...]
+    """
+    counts = [count // len(subnets) + (1 if i < count % len(subnets) else 0) for i in range(len(subnets))]
+    return [(subnet, n) for subnet, n in zip(subnets, counts) if n]
+
+def replica_run_params(base_params, instance, ec2_client, subnet, count, group_tags):
+    """
+    Adapta o run_params calculado para outra subnet/AZ e para a quantidade de réplicas dela
+    """
+    params = copy.deepcopy(base_params)
+    params['MinCount'] = count
+    params['MaxCount'] = count
+    placement = params.setdefault('Placement', {})
+
+    if placement.get('AvailabilityZone') != subnet['AvailabilityZone'] or params.get('SubnetId') != subnet['SubnetId']:
+        placement['AvailabilityZone'] = subnet['AvailabilityZone']
+
+        # ENIs e placement group dependem da AZ: recalcula a partir da subnet nova
+        if 'NetworkInterfaces' in params:
+            primary = next(eni for eni in params.pop('NetworkInterfaces') if eni['DeviceIndex'] == 0)
+            params['SecurityGroupIds'] = primary['Groups']
+            params['SubnetId'] = subnet['SubnetId']
+            add_network_interfaces(params, instance, ec2_client)
+        else:
+            params['SubnetId'] = subnet['SubnetId']
+
+        if placement.get('GroupName'):
+            placement.pop('GroupName')
+            placement.pop('PartitionNumber', None)
+            add_placement_group(params, instance, ec2_client)
+
+    params['TagSpecifications'] = [{'ResourceType': 'instance', 'Tags': group_tags}]
+    return params
+
+def replica_group_tags(ec2_client, instance, group_id):
+    """
+    Tags comuns a todas as réplicas: as da origem (menos Name) mais as de origem/grupo
+    """
+    tags = [
+        {'Key': tag['Key'], 'Value': tag['Value']}
+        for tag in instance.get('Tags', [])
+        if not tag['Key'].startswith('aws:') and tag['Key'] != 'Name'
+    ]
+    tags.extend([
+        {'Key': 'SourceInstanceId', 'Value': instance['InstanceId']},
+        {'Key': 'SourceRegion', 'Value': ec2_client.meta.region_name},
+        {'Key': REPLICA_GROUP_TAG, 'Value': group_id}
+    ])
+    return tags
+
+def plan_replicas(instance_id, new_ami_id, profile, region, count, subnet_ids=None, volume_rules=None,
+                  type_mapping=None, preflight=True):
+    """
+    Calcula um run_params por subnet para as N réplicas, sem criar nada
+
+    Devolve (session, ec2_client, instance, [(subnet, run_params), ...], group_id).
+    """
+    session = get_session(profile)
+    ec2_client = session_client(session, 'ec2', region)
+
+    with phase('discover'):
+        instance = get_instance_data(ec2_client, instance_id)
+        verify_ami_exists(ec2_client, new_ami_id, region)
+        subnets = pick_replica_subnets(ec2_client, instance, subnet_ids)
+        if not subnets:
+            raise CloneError(f"nenhuma subnet disponível para as réplicas de {instance_id}")
+
+    layout = spread_replicas(count, subnets)
+    group_id = f"{instance_id}-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+
+    with phase('plan'):
+        say(f"⚙️  Calculando a configuração base das réplicas (subnet {layout[0][0]['SubnetId']})...")
+        base_params = prepare_run_params(instance, new_ami_id, ec2_client, layout[0][0]['SubnetId'], False,
+                                         volume_rules, type_mapping)
+        group_tags = replica_group_tags(ec2_client, instance, group_id)
+        launches = [
+            (subnet, replica_run_params(base_params, instance, ec2_client, subnet, n, group_tags))
+            for subnet, n in layout
+        ]
+
+    say(f"\n🧬 {count} réplica(s) em {len(launches)} subnet(s):")
+    for subnet, params in launches:
+        say(f"  - {subnet['SubnetId']} ({subnet['AvailabilityZone']}): {params['MaxCount']}x {params['InstanceType']}")
+
+    if preflight:
+        with phase('preflight'):
+            with ThreadPoolExecutor(max_workers=len(launches)) as executor:
+                futures = [
+                    executor.submit(bind_clone(run_preflight), session, ec2_client, params)
+                    for _, params in launches
+                ]
+                problems = [problem for future in futures for problem in future.result()]
+            if problems:
+                raise PreflightError("preflight das réplicas falhou", problems)
+
+    return session, ec2_client, instance, launches, group_id
+
+def clone_replicas(instance_id, new_ami_id, profile, region, count, new_name=None, subnet_ids=None,
+                   volume_rules=None, type_mapping=None, readiness=None):
+    """
+    Cria N réplicas da instância espalhadas pelas AZs (um run_instances por subnet)
+
+    Devolve a lista de réplicas (dicts com id, nome, AZ, subnet, IP e tempos).
+    """
+    if progress.current_clone() is None:
+        progress.set_current_clone(instance_id)
+
+    with phase('clone'):
+        start_time = datetime.now().strftime("%H:%M")
+        say(f"\n🧬 Criando {count} réplica(s) da instância {instance_id} com a AMI {new_ami_id}...\n")
+
+        session, ec2_client, instance, launches, group_id = plan_replicas(
+            instance_id, new_ami_id, profile, region, count, subnet_ids, volume_rules, type_mapping
+        )
+
+        with phase('launch'):
+            launch_start = time.time()
+            with ThreadPoolExecutor(max_workers=len(launches)) as executor:
+                futures = [
+                    (subnet, executor.submit(bind_clone(launch_replicas), ec2_client, params, instance, type_mapping))
+                    for subnet, params in launches
+                ]
+
+            replicas, errors = [], []
+            for subnet, future in futures:
+                try:
+                    for created in future.result():
+                        replicas.append({
+                            'id': created['InstanceId'],
+                            'type': created['InstanceType'],
+                            'az': subnet['AvailabilityZone'],
+                            'subnet': subnet['SubnetId'],
+                            'ip': created.get('PrivateIpAddress', 'N/A')
+                        })
+                except Exception as e:
+                    errors.append(f"{subnet['SubnetId']} ({subnet['AvailabilityZone']}): {e}")
+                    say(f"❌ Falha ao criar réplicas em {subnet['SubnetId']}: {e}")
+
+            if not replicas:
+                raise CloneError(f"nenhuma réplica foi criada: {'; '.join(errors)}")
+            say(f"✅ {len(replicas)}/{count} réplica(s) criada(s)")
+
+        with phase('tag'):
+            tag_replicas(ec2_client, instance, replicas, new_name)
+
+        with phase('wait_running'):
+            say("\n⏳ Aguardando as réplicas inicializarem...")
+            replica_ids = [r['id'] for r in replicas]
+            wait_for_state(ec2_client, 'instance_running', group_id, InstanceIds=replica_ids,
+                           WaiterConfig={'Delay': RUNNING_POLL_DELAY, 'MaxAttempts': 300})
+            time_to_running = time.time() - launch_start
+            say(f"✅ Réplicas em execução! ({format_seconds(time_to_running)} desde o launch)")
+
+        not_ready = []
+        if readiness:
+            with phase('wait_ready'):
+                # Um client SSM só e um describe_instance_status por intervalo para o grupo inteiro
+                ssm_client = ssm_client_for(session, ec2_client, readiness)
+                status_checks = BatchedStatusChecks(ec2_client, replica_ids, readiness['interval'])
+                with ThreadPoolExecutor(max_workers=min(len(replicas), READY_WORKERS)) as executor:
+                    futures = [
+                        (replica, executor.submit(bind_clone(wait_until_ready), session, ec2_client, replica['id'],
+                                                  readiness, ssm_client=ssm_client, status_checks=status_checks))
+                        for replica in replicas
+                    ]
+                for replica, future in futures:
+                    result = future.result()
+                    # Medido desde o launch: além de READY_WORKERS, a réplica espera outra terminar
+                    replica['ready'] = result['started'] + result['elapsed'] - launch_start if result['ok'] else None
+                    if not result['ok']:
+                        not_ready.append(f"{replica['id']} ({', '.join(result['failures'])})")
+
+        end_time = datetime.now().strftime("%H:%M")
+        with phase('report'):
+            generate_replicas_report(ec2_client, instance, replicas, group_id, profile, start_time, end_time,
+                                     time_to_running, readiness, errors)
+
+        if errors or not_ready:
+            raise CloneError("réplicas com problema: " + "; ".join(errors + [f"não ficou pronta: {r}" for r in not_ready]))
+
+    return replicas
+
+def launch_replicas(ec2_client, params, instance, type_mapping):
+    """
+    Um run_instances para todas as réplicas de uma subnet
+    """
+    return launch_with_fallback(ec2_client, params, instance, type_mapping)['Instances']
+
+def tag_replicas(ec2_client, instance, replicas, new_name=None):
+    """
+    Dá o Name com sufixo (-01, -02...) e o ReplicaIndex de cada réplica
+
+    As tags comuns do grupo já foram aplicadas no run_instances.
+    """
+    source_name = next((t['Value'] for t in instance.get('Tags', []) if t['Key'] == 'Name'), None)
+    base_name = new_name or source_name or instance['InstanceId']
+
+    replicas.sort(key=lambda r: (r['az'], r['id']))
+    for index, replica in enumerate(replicas, start=1):
+        replica['name'] = f"{base_name}-{index:02d}"
+        ec2_client.create_tags(
+            Resources=[replica['id']],
+            Tags=[{'Key': 'Name', 'Value': replica['name']}, {'Key': REPLICA_INDEX_TAG, 'Value': str(index)}]
+        )
+    say(f"🏷️  Réplicas nomeadas de {base_name}-01 a {base_name}-{len(replicas):02d}")
+
+def generate_replicas_report(ec2_client, instance, replicas, group_id, profile, start_time, end_time,
+                             time_to_running, readiness=None, errors=None):
+    """
+    Relatório das réplicas criadas (uma linha por réplica)
+    """
+    current_date = datetime.now().strftime("%d/%m/%Y")
+
+    lines = [
+        "===Consigcard - Réplicas===", "",
+        f"Account: {profile.upper()}", "",
+        f"Origem: {instance['InstanceId']} ({instance['InstanceType']}, {instance['Placement'].get('AvailabilityZone', 'N/A')})",
+        f"Grupo: {group_id}", ""
+    ]
+    for replica in replicas:
+        line = f"  {replica['name']} - {replica['id']} | {replica['type']} | {replica['az']} | {replica['subnet']} | {replica['ip']}"
+        if readiness:
+            line += f" | pronta: {format_seconds(replica['ready']) if replica.get('ready') is not None else 'NÃO'}"
+        lines.append(line)
+    for error in errors or []:
+        lines.append(f"  ERRO: {error}")
+    lines.extend([
+        "",
+        f"Inicio: {start_time}",
+        f"Fim: {end_time}", "",
+        f"Tempo até running (grupo): {format_seconds(time_to_running)}"
+    ])
+
+    say("\n\n" + "="*50)
+    say("\n".join(lines))
+    say("="*50)
+
+    report_filename = f"replicas_report_{instance['InstanceId']}_{current_date.replace('/', '-')}.txt"
+    try:
+        with open(report_filename, 'w') as f:
+            f.write("\n".join(lines) + "\n")
+        say(f"\nRelatório salvo em: {report_filename}")
+    except Exception as e:
+        say(f"Não foi possível salvar o relatório em arquivo: {e}")
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from botocore.exceptions import ClientError
+
+from libs.progress import bind_clone, phase, say
+from libs.sessions import get_client
+
+'''
+Reservas de capacidade sob demanda (ODCR) para o launch do DR não depender da sorte.
+
+Num evento regional todo mundo lança ao mesmo tempo e o run_instances pode falhar por
+falta de capacidade depois que a origem já foi parada. Uma reserva "targeted" por
+instância protegida, no tipo e na AZ que o clone vai usar, garante o launch: só
+instâncias lançadas apontando para ela consomem a capacidade.
+
+- reserve_capacity calcula o clone (mesmo plano do clone normal, com type_mapping e
+  subnet) e cria ou reaproveita a reserva. Se o tipo/AZ do plano mudou, cria a nova e só
+  depois cancela a antiga
+- no clone, prepare_run_params usa a subnet gravada na reserva (se nenhuma for pedida) e
+  apply_capacity_reservation aponta o run_instances para a reserva do mesmo tipo e AZ.
+  Standbys e réplicas não usam reservas
+- no drill, as reservas temporárias levam a tag DrillId e são canceladas na limpeza; o
+  clone do drill só usa as do próprio drill, nunca a permanente do DR
+
+Reservas cobram o tipo reservado o tempo todo, usadas ou não.
+'''
+
+RESERVED_FOR_TAG = 'ReservedFor'
+RESERVED_SUBNET_TAG = 'ReservedSubnet'
+RESERVED_AT_TAG = 'ReservedAt'
+
+def reservation_tag(reservation, key):
+    """
+    Valor de uma tag da reserva (ou None)
+    """
+    return next((tag['Value'] for tag in reservation.get('Tags', []) if tag['Key'] == key), None)
+
+def find_reservations(ec2_client, instance_id):
+    """
+    Reservas ativas da instância protegida (mais recente primeiro)
+    """
+    reservations = []
+    paginator = ec2_client.get_paginator('describe_capacity_reservations')
+    try:
+        for page in paginator.paginate(
+            Filters=[
+                {'Name': f'tag:{RESERVED_FOR_TAG}', 'Values': [instance_id]},
+                {'Name': 'state', 'Values': ['active', 'pending']}
+            ]
+        ):
+            reservations.extend(page['CapacityReservations'])
+    except ClientError as e:
+        # Sem permissão para ver reservas o clone segue como sempre, sem reserva
+        if e.response['Error']['Code'] not in ('UnauthorizedOperation', 'AccessDenied'):
+            raise
+        return []
+    reservations.sort(key=lambda r: str(r.get('CreateDate', '')), reverse=True)
+    return reservations
+
+def reserved_subnet(ec2_client, instance_id):
+    """
+    Subnet em que a reserva permanente mais recente da instância foi planejada (ou None)
+    """
+    for reservation in find_reservations(ec2_client, instance_id):
+        # A de drill aponta para a subnet isolada do drill, não para a do DR
+        if reservation_tag(reservation, 'DrillId'):
+            continue
+        subnet_id = reservation_tag(reservation, RESERVED_SUBNET_TAG)
+        if subnet_id:
+            return subnet_id
+    return None
+
+def apply_capacity_reservation(ec2_client, run_params, instance_id, drill_id=None):
+    """
+    Aponta o run_instances para a reserva da instância com o mesmo tipo e AZ, se houver
+
+    Sem drill_id só valem as reservas permanentes; com drill_id, só as desse drill.
+    """
+    reservations = [r for r in find_reservations(ec2_client, instance_id)
+                    if reservation_tag(r, 'DrillId') == drill_id]
+    if not reservations:
+        return run_params
+
+    target_az = run_params.get('Placement', {}).get('AvailabilityZone')
+    for reservation in reservations:
+        if (reservation['InstanceType'] == run_params['InstanceType']
+                and reservation['AvailabilityZone'] == target_az
+                and reservation['AvailableInstanceCount'] > 0):
+            run_params['CapacityReservationSpecification'] = {
+                'CapacityReservationTarget': {'CapacityReservationId': reservation['CapacityReservationId']}
+            }
+            say(f"🎟️  Usando a reserva de capacidade {reservation['CapacityReservationId']} "
+                f"({reservation['InstanceType']} em {reservation['AvailabilityZone']})")
+            return run_params
+
+    found = ", ".join(f"{r['CapacityReservationId']} ({r['InstanceType']} em {r['AvailabilityZone']}, "
+                      f"{r['AvailableInstanceCount']} livre)" for r in reservations)
+    say(f"⚠️  Nenhuma reserva livre para {run_params['InstanceType']} em {target_az} (existem: {found})")
+    return run_params
+
+def reserve_capacity(instance_id, profile, region, subnet_id=None, type_mapping=None, drill_id=None):
+    """
+    Cria (ou reaproveita) a reserva targeted para o clone da instância e devolve o ID
+
+    Com drill_id a reserva é temporária: leva a tag DrillId e nunca cancela outra reserva.
+    A permanente não é reaproveitada no drill, para a capacidade do DR continuar livre.
+    """
+    # Import local para evitar import circular (ec2_clone_functions usa este módulo)
+    from libs.ami_finder import find_instance_amis
+    from libs.ec2_clone_functions import get_instance_data, prepare_run_params
+
+    ec2_client = get_client(profile, region)
+
+    with phase('discover'):
+        instance = get_instance_data(ec2_client, instance_id)
+        # A AMI só entra na compatibilidade de tipos; sem AMI de backup vale a da própria origem
+        ami_id = find_instance_amis(ec2_client, instance_id, interactive=False) or instance['ImageId']
+        # Permanentes e as de cada drill não se misturam
+        existing = [r for r in find_reservations(ec2_client, instance_id)
+                    if reservation_tag(r, 'DrillId') == drill_id]
+
+    with phase('plan'):
+        # A subnet da reserva atual mantém o plano estável entre execuções
+        if subnet_id is None and existing:
+            subnet_id = reserved_subnet(ec2_client, instance_id)
+        run_params = prepare_run_params(instance, ami_id, ec2_client, subnet_id, False, None, type_mapping)
+
+    instance_type = run_params['InstanceType']
+    target_az = run_params.get('Placement', {}).get('AvailabilityZone')
+    target_subnet = run_params.get('SubnetId') or (run_params.get('NetworkInterfaces') or [{}])[0].get('SubnetId')
+
+    current = next((r for r in existing
+                    if r['InstanceType'] == instance_type and r['AvailabilityZone'] == target_az), None)
+    if current:
+        say(f"✅ Reserva {current['CapacityReservationId']} já cobre {instance_id} ({instance_type} em {target_az})")
+        return current['CapacityReservationId']
+
+    tags = [
+        {'Key': RESERVED_FOR_TAG, 'Value': instance_id},
+        {'Key': RESERVED_SUBNET_TAG, 'Value': target_subnet or ''},
+        {'Key': RESERVED_AT_TAG, 'Value': datetime.now().strftime("%Y-%m-%d %H:%M")}
+    ]
+    if drill_id:
+        tags.append({'Key': 'DrillId', 'Value': drill_id})
+
+    with phase('reserve'):
+        reservation = ec2_client.create_capacity_reservation(
+            InstanceType=instance_type,
+            InstancePlatform=instance.get('PlatformDetails', 'Linux/UNIX'),
+            AvailabilityZone=target_az,
+            Tenancy=instance.get('Placement', {}).get('Tenancy', 'default'),
+            InstanceCount=1,
+            EbsOptimized=bool(run_params.get('EbsOptimized')),
+            InstanceMatchCriteria='targeted',
+            EndDateType='unlimited',
+            TagSpecifications=[{'ResourceType': 'capacity-reservation', 'Tags': tags}]
+        )['CapacityReservation']
+    reservation_id = reservation['CapacityReservationId']
+    say(f"🎟️  Reserva {reservation_id} criada para {instance_id} ({instance_type} em {target_az})"
+        + (f" [drill {drill_id}]" if drill_id else ""))
+
+    # Tipo/AZ mudou: a reserva antiga só é cancelada depois que a nova existe
+    if not drill_id:
+        for old in existing:
+            cancel_reservation(ec2_client, old['CapacityReservationId'])
+    return reservation_id
+
+def cancel_reservation(ec2_client, reservation_id):
+    """
+    Cancela a reserva (a capacidade em uso por instâncias continua com elas)
+    """
+    ec2_client.cancel_capacity_reservation(CapacityReservationId=reservation_id)
+    say(f"🗑️  Reserva {reservation_id} cancelada")
+
+def release_capacity(instance_id, profile, region):
+    """
+    Cancela todas as reservas da instância protegida e devolve os IDs
+    """
+    ec2_client = get_client(profile, region)
+
+    released = []
+    for reservation in find_reservations(ec2_client, instance_id):
+        cancel_reservation(ec2_client, reservation['CapacityReservationId'])
+        released.append(reservation['CapacityReservationId'])
+    if not released:
+        say(f"ℹ️  Nenhuma reserva ativa para {instance_id}")
+    return released
+
+def release_drill_reservations(ec2_client, drill_id):
+    """
+    Cancela as reservas temporárias do drill
+    """
+    paginator = ec2_client.get_paginator('describe_capacity_reservations')
+    for page in paginator.paginate(
+        Filters=[
+            {'Name': 'tag:DrillId', 'Values': [drill_id]},
+            {'Name': 'state', 'Values': ['active', 'pending']}
+        ]
+    ):
+        for reservation in page['CapacityReservations']:
+            cancel_reservation(ec2_client, reservation['CapacityReservationId'])
+
+def reserve_for_drill(jobs, drill_id, type_mapping=None, max_workers=8):
+    """
+    Cria as reservas temporárias do drill (em paralelo), uma por job que ainda não tem reserva servindo
+    """
+    say(f"\n🎟️  Reservando capacidade para o drill {drill_id}...")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(bind_clone(reserve_capacity), job['instance_id'], job['profile'], job['region'],
+                            job['subnet_id'], type_mapping, drill_id)
+            for job in jobs
+        ]
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                # Sem reserva o clone do drill só não tem a garantia; segue
+                say(f"⚠️  Não foi possível reservar capacidade: {e}")
+
+def reservation_usage(instance_id, profile, region):
+    """
+    Utilização das reservas da instância protegida
+
+    Devolve [{'id', 'instance_type', 'availability_zone', 'total', 'used', 'drill_id'}].
+    """
+    ec2_client = get_client(profile, region)
+
+    usage = []
+    for reservation in find_reservations(ec2_client, instance_id):
+        total = reservation['TotalInstanceCount']
+        usage.append({
+            'id': reservation['CapacityReservationId'],
+            'instance_type': reservation['InstanceType'],
+            'availability_zone': reservation['AvailabilityZone'],
+            'total': total,
+            'used': total - reservation['AvailableInstanceCount'],
+            'drill_id': reservation_tag(reservation, 'DrillId')
+        })
+        say(f"🎟️  {instance_id}: {usage[-1]['id']} | {usage[-1]['instance_type']} em "
+            f"{usage[-1]['availability_zone']} | {usage[-1]['used']}/{total} em uso")
+    if not usage:
+        say(f"⚠️  {instance_id}: sem reserva de capacidade")
+    return usage
+
+def describe_usage(usage):
+    """
+    Resumo da utilização para o relatório ('cr-... t3.large us-east-1b 0/1')
+    """
+    if not usage:
+        return "sem reserva"
+    return ", ".join(f"{u['id']} {u['instance_type']} {u['availability_zone']} {u['used']}/{u['total']}"
+                     for u in usage)
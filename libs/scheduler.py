@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+import json
+import statistics
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from libs.errors import ConfigError
+from libs.progress import format_seconds, say
+from libs.sessions import get_client
+
+'''
+Ordem de execução dos clones de um lote.
+
+Com concorrência limitada, o lote termina quando o último clone termina: começar pelos
+mais demorados (volumes grandes, boot lento, serviços de que outros dependem) encurta o
+lote inteiro. A duração de cada clone é prevista assim:
+
+- com histórico da instância (fase 'clone' de clones e drills no JSONL de progresso ou no
+  histórico de drills): mediana das últimas execuções
+- sem histórico: estimativa pelas características estáticas (quantidade e tamanho dos
+  volumes, tipo metal, Windows), corrigida pela razão real/estimado das instâncias do
+  lote que têm histórico
+
+Dependências (depends_on no manifesto, ex: o app depende do banco) são respeitadas: um
+job só começa quando todas as dependências terminaram com sucesso; se uma falhar, os
+dependentes nem começam. Entre os jobs liberados vai primeiro o de maior caminho
+crítico (a própria duração + a maior cadeia de dependentes), e só são despachados
+tantos jobs quantos workers livres (e vagas da conta do job), para a prioridade valer até o fim.
+'''
+
+# Estimativa estática (segundos): parada da origem + launch + boot, mais o custo dos volumes
+BASE_SECONDS = 120
+PER_VOLUME_SECONDS = 15
+PER_100_GIB_SECONDS = 10
+# Bare metal leva vários minutos no POST; Windows tem sysprep/boot mais lento
+METAL_SECONDS = 600
+WINDOWS_SECONDS = 240
+
+# Quantas execuções passadas entram na mediana de cada instância
+HISTORY_WINDOW = 5
+
+# Fase exclusiva do refresh de standby: ele também lança (e para) uma instância, mas não é um clone
+STANDBY_REFRESH_PHASE = 'stop_standby'
+
+def load_clone_durations(history_paths):
+    """
+    Lê as durações de clone já registradas: {instance_id: [segundos, ...]} na ordem dos arquivos
+
+    Aceita o JSONL de progresso (--progress-jsonl, eventos PhaseFinished da fase 'clone')
+    e o histórico de drills (--drill-history). Linhas que não são de nenhum dos dois são ignoradas.
+    Só entram clones e drills: a fase 'clone' do plano (sem launch) e a do refresh de
+    standby (que também lança) ficam de fora.
+    """
+    durations = {}
+    for path in history_paths:
+        # Por clone_id: True se a fase 'clone' aberta passou por um launch, None se é de um refresh de standby
+        launched = {}
+        try:
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if not isinstance(entry, dict):
+                        continue
+
+                    if entry.get('event') in ('PhaseStarted', 'PhaseFinished'):
+                        clone_id, phase = entry.get('clone_id'), entry.get('phase')
+                        if entry['event'] == 'PhaseStarted':
+                            if phase == 'clone':
+                                launched[clone_id] = False
+                            elif phase == STANDBY_REFRESH_PHASE:
+                                launched[clone_id] = None
+                            continue
+                        if phase == 'launch' and entry.get('ok') and launched.get(clone_id) is not None:
+                            launched[clone_id] = True
+                        if phase != 'clone' or not entry.get('ok') or not launched.get(clone_id):
+                            continue
+                        # No fan-out o clone_id é profile/região/instância
+                        instance_id, seconds = str(clone_id).split('/')[-1], entry['duration']
+                    elif 'drill_id' in entry:
+                        seconds = (entry.get('phase_timings') or {}).get('clone')
+                        if entry.get('status') != 'ok' or seconds is None:
+                            continue
+                        instance_id = entry['instance_id']
+                    else:
+                        continue
+
+                    durations.setdefault(instance_id, []).append(seconds)
+        except FileNotFoundError:
+            continue
+    return durations
+
+def collect_features(results):
+    """
+    Características estáticas de cada instância, com um describe em lote por (profile, região)
+
+    Devolve {instance_id: {'volumes', 'gib', 'instance_type', 'windows'}}
+    """
+    groups = {}
+    for r in results:
+        job = r['job']
+        groups.setdefault((job['profile'], job['region']), []).append(job['instance_id'])
+
+    # A API aceita no máximo 200 valores por filtro
+    chunks = [
+        (profile, region, instance_ids[i:i + 200])
+        for (profile, region), instance_ids in groups.items()
+        for i in range(0, len(instance_ids), 200)
+    ]
+
+    features = {}
+    for profile, region, instance_ids in chunks:
+        ec2_client = get_client(profile, region)
+        try:
+            volumes = {}
+            paginator = ec2_client.get_paginator('describe_volumes')
+            for page in paginator.paginate(Filters=[{'Name': 'attachment.instance-id', 'Values': instance_ids}]):
+                for volume in page['Volumes']:
+                    for attachment in volume.get('Attachments', []):
+                        volumes.setdefault(attachment['InstanceId'], []).append(volume['Size'])
+
+            # Filtro (e não InstanceIds) para um ID inválido não derrubar o lote inteiro
+            paginator = ec2_client.get_paginator('describe_instances')
+            for page in paginator.paginate(Filters=[{'Name': 'instance-id', 'Values': instance_ids}]):
+                for reservation in page['Reservations']:
+                    for instance in reservation['Instances']:
+                        sizes = volumes.get(instance['InstanceId'], [])
+                        features[instance['InstanceId']] = {
+                            'volumes': len(sizes),
+                            'gib': sum(sizes),
+                            'instance_type': instance['InstanceType'],
+                            'windows': instance.get('Platform') == 'windows'
+                        }
+        except Exception as e:
+            # Sem as características a instância fica só com a estimativa base; o erro real aparece no job
+            say(f"⚠️  [{profile}/{region}] Não foi possível ler as características das instâncias: {e}")
+    return features
+
+def static_estimate(feature):
+    """
+    Duração estimada (s) só pelas características estáticas
+    """
+    if not feature:
+        return BASE_SECONDS
+    seconds = BASE_SECONDS + PER_VOLUME_SECONDS * feature['volumes'] + PER_100_GIB_SECONDS * feature['gib'] / 100
+    if feature['instance_type'].endswith('.metal') or '.metal-' in feature['instance_type']:
+        seconds += METAL_SECONDS
+    if feature['windows']:
+        seconds += WINDOWS_SECONDS
+    return seconds
+
+def predict_durations(results, history_paths):
+    """
+    Preenche r['predicted'] (segundos) e r['prediction'] (de onde veio) em cada resultado
+    """
+    history = load_clone_durations(history_paths)
+    features = collect_features(results)
+
+    # Quanto o histórico real costuma divergir da estimativa estática, nas instâncias que têm os dois
+    ratios = []
+    for r in results:
+        instance_id = r['job']['instance_id']
+        if history.get(instance_id):
+            measured = statistics.median(history[instance_id][-HISTORY_WINDOW:])
+            ratios.append(measured / static_estimate(features.get(instance_id)))
+    calibration = statistics.median(ratios) if ratios else 1.0
+
+    for r in results:
+        instance_id = r['job']['instance_id']
+        feature = features.get(instance_id)
+        past = history.get(instance_id, [])[-HISTORY_WINDOW:]
+        if past:
+            r['predicted'] = statistics.median(past)
+            r['prediction'] = f"histórico, {len(past)} execução(ões)"
+        else:
+            r['predicted'] = static_estimate(feature) * calibration
+            detail = f"{feature['volumes']} volume(s), {feature['gib']} GiB, {feature['instance_type']}" if feature else "sem dados"
+            r['prediction'] = f"estimado: {detail}"
+
+def dependency_graph(results):
+    """
+    Liga cada resultado às suas dependências dentro do lote e valida ciclos
+
+    Devolve {id(resultado): [resultados de que ele depende]}.
+    """
+    by_instance = {r['job']['instance_id']: r for r in results}
+    deps = {}
+    for r in results:
+        deps[id(r)] = []
+        for dependency in r['job']['depends_on']:
+            if dependency in by_instance:
+                deps[id(r)].append(by_instance[dependency])
+            else:
+                say(f"⚠️  {r['job']['instance_id']}: dependência {dependency} não está neste lote; ignorada")
+
+    # Ordenação topológica só para detectar ciclo antes de começar qualquer coisa
+    visiting, visited = set(), set()
+
+    def visit(r, chain):
+        if id(r) in visited:
+            return
+        if id(r) in visiting:
+            raise ConfigError(f"Dependência circular: {' -> '.join(chain + [r['job']['instance_id']])}")
+        visiting.add(id(r))
+        for dependency in deps[id(r)]:
+            visit(dependency, chain + [r['job']['instance_id']])
+        visiting.discard(id(r))
+        visited.add(id(r))
+
+    for r in results:
+        visit(r, [])
+    return deps
+
+def critical_paths(results, deps):
+    """
+    Prioridade de cada job: a própria duração prevista + a maior cadeia de dependentes
+    """
+    dependents = {id(r): [] for r in results}
+    for r in results:
+        for dependency in deps[id(r)]:
+            dependents[id(dependency)].append(r)
+
+    paths = {}
+
+    def path(r):
+        if id(r) not in paths:
+            paths[id(r)] = r['predicted'] + max((path(d) for d in dependents[id(r)]), default=0.0)
+        return paths[id(r)]
+
+    for r in results:
+        path(r)
+    return paths
+
+def run_scheduled(results, submit, max_workers, max_per_account=None):
+    """
+    Despacha os jobs pela maior cadeia prevista primeiro, respeitando as dependências
+
+    submit(resultado) devolve o future do job; r['predicted'] precisa estar preenchido.
+    Um job é considerado bem-sucedido se terminar com r['status'] == 'ok'. Com
+    max_per_account, um job cuja conta (profile) está cheia espera e o próximo da fila
+    de outra conta ocupa o worker.
+    """
+    deps = dependency_graph(results)
+    paths = critical_paths(results, deps)
+
+    say("\n📅 Ordem prevista (maior cadeia primeiro):")
+    for r in sorted((r for r in results if r['status'] == 'ok'), key=lambda r: paths[id(r)], reverse=True):
+        after = ", ".join(d['job']['instance_id'] for d in deps[id(r)])
+        say(f"  - {r['job']['instance_id']}: {format_seconds(r['predicted'])} ({r['prediction']})"
+            + (f" | depois de {after}" if after else ""))
+
+    # Jobs que já falharam (ex: no preflight) não rodam, mas derrubam os dependentes
+    pending = [r for r in results if r['status'] == 'ok']
+    unfinished = {id(r) for r in pending}
+    running = {}
+    active = {}
+    while pending or running:
+        # Dependência que falhou derruba os dependentes (em cascata nas próximas voltas)
+        for r in list(pending):
+            failed = [d['job']['instance_id'] for d in deps[id(r)] if d['status'] != 'ok']
+            if failed:
+                r['status'] = 'erro'
+                r['error'] = f"não executado: a dependência {', '.join(failed)} falhou"
+                pending.remove(r)
+                unfinished.discard(id(r))
+
+        ready = [r for r in pending if not any(id(d) in unfinished for d in deps[id(r)])]
+        ready.sort(key=lambda r: paths[id(r)], reverse=True)
+        for r in ready:
+            if len(running) >= max_workers:
+                break
+            profile = r['job']['profile']
+            if max_per_account and active.get(profile, 0) >= max_per_account:
+                continue
+            active[profile] = active.get(profile, 0) + 1
+            pending.remove(r)
+            running[id(r)] = (submit(r), r)
+
+        if not running:
+            continue
+        done, _ = wait([future for future, _ in running.values()], return_when=FIRST_COMPLETED)
+        for key, (future, r) in list(running.items()):
+            if future in done:
+                future.result()
+                del running[key]
+                unfinished.discard(key)
+                active[r['job']['profile']] -= 1
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+import threading
+
+from libs import progress
+
+'''
+Sessões e clients da AWS compartilhados pelo processo.
+
+Criar uma boto3.Session custa de 200 a 330 ms (lê config/credenciais e carrega os
+modelos dos serviços) contra uns 18 ms de um client a mais numa sessão já aberta, e
+esse trabalho é de CPU, então threads em paralelo só disputam o GIL. Aqui cada profile
+ganha uma sessão só e cada (sessão, serviço, região) um client só, criados sob demanda.
+
+A Session não é thread-safe, mas os clients são: tudo é criado sob o lock e os clients
+podem ser usados à vontade de qualquer thread.
+'''
+
+_lock = threading.RLock()
+_sessions = {}
+_clients = {}
+
+def get_session(profile):
+    """
+    Sessão do profile (None = cadeia padrão de credenciais), criada uma vez por processo
+    """
+    with _lock:
+        session = _sessions.get(profile)
+        if session is None:
+            # Import local pra não carregar boto3 no parse das opções
+            import boto3
+            session = _sessions[profile] = boto3.Session(profile_name=profile)
+        return session
+
+def session_client(session, service, region=None):
+    """
+    Client do serviço na região, criado uma vez por sessão e já instrumentado (ver progress)
+    """
+    key = (session, service, region)
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = session.client(service, region_name=region)
+    return progress.instrument_client(client)
+
+def get_client(profile, region, service='ec2'):
+    """
+    Client do serviço no profile/região (atalho para session_client(get_session(profile), ...))
+    """
+    return session_client(get_session(profile), service, region)
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+from contextlib import contextmanager
+from datetime import datetime
+
+from libs.ami_finder import TEMP_AMI_TAG
+from libs.ec2_clone_functions import get_instance_data
+from libs.errors import AmiNotFoundError, ConfigError
+from libs.progress import phase, say, wait_for_state
+from libs.sessions import get_client
+
+'''
+Clone a partir dos snapshots EBS mais recentes da origem (sem AMI pronta).
+
+Muitas vezes o ponto de restauração mais novo é um conjunto de snapshots (AWS Backup,
+DLM, snapshots manuais) mais recente que a última AMI. Aqui o snapshot mais recente de
+cada volume da origem vira uma AMI temporária (register_image, que não copia dados e
+fica disponível na hora), usada pelo fluxo normal do clone: tipos, IOPS e throughput
+continuam vindo de ec2_volume_utils, e o EBS cria todos os volumes em paralelo no
+run_instances. Depois do launch a AMI temporária é desregistrada; os snapshots ficam.
+
+A AMI temporária leva a tag TemporaryCloneAmi com o ID da origem, e por ela o
+find_instance_amis deixa de tratá-la como backup da instância.
+'''
+
+# Snapshots de volumes da mesma instância tirados com mais que isso de diferença não são do mesmo ponto
+MAX_SNAPSHOT_SPREAD = 3600
+
+def find_latest_snapshots(ec2_client, instance):
+    """
+    Snapshot concluído mais recente de cada volume EBS da instância
+
+    Devolve {device: (volume, snapshot)}. Levanta AmiNotFoundError se algum volume não tiver snapshot.
+    """
+    devices = {bdm['Ebs']['VolumeId']: bdm['DeviceName'] for bdm in instance['BlockDeviceMappings'] if 'Ebs' in bdm}
+    if not devices:
+        raise AmiNotFoundError(f"A instância {instance['InstanceId']} não tem volumes EBS")
+
+    volumes = {v['VolumeId']: v for v in ec2_client.describe_volumes(VolumeIds=list(devices))['Volumes']}
+
+    latest = {}
+    paginator = ec2_client.get_paginator('describe_snapshots')
+    for page in paginator.paginate(
+        OwnerIds=['self'],
+        Filters=[
+            {'Name': 'volume-id', 'Values': list(devices)},
+            {'Name': 'status', 'Values': ['completed']}
+        ]
+    ):
+        for snapshot in page['Snapshots']:
+            current = latest.get(snapshot['VolumeId'])
+            if current is None or snapshot['StartTime'] > current['StartTime']:
+                latest[snapshot['VolumeId']] = snapshot
+
+    missing = [f"{device} ({volume_id})" for volume_id, device in devices.items() if volume_id not in latest]
+    if missing:
+        raise AmiNotFoundError(f"Sem snapshot concluído para: {', '.join(missing)}")
+
+    return {device: (volumes[volume_id], latest[volume_id]) for volume_id, device in devices.items()}
+
+def build_image_mappings(instance, snapshots):
+    """
+    Mapeamentos da AMI temporária: mesmo device, snapshot mais recente e tipo/desempenho da origem
+    """
+    delete_flags = {
+        bdm['DeviceName']: bdm['Ebs'].get('DeleteOnTermination', False)
+        for bdm in instance['BlockDeviceMappings'] if 'Ebs' in bdm
+    }
+
+    mappings = []
+    for device, (volume, snapshot) in snapshots.items():
+        ebs = {
+            'SnapshotId': snapshot['SnapshotId'],
+            'VolumeSize': volume['Size'],
+            'VolumeType': volume['VolumeType'],
+            'DeleteOnTermination': delete_flags[device]
+        }
+        # io1/io2 exigem IOPS; gp3 aceita IOPS e throughput
+        if volume['VolumeType'] in ('io1', 'io2', 'gp3') and volume.get('Iops'):
+            ebs['Iops'] = volume['Iops']
+        if volume['VolumeType'] == 'gp3' and volume.get('Throughput'):
+            ebs['Throughput'] = volume['Throughput']
+        mappings.append({'DeviceName': device, 'Ebs': ebs})
+    return mappings
+
+def register_snapshot_ami(ec2_client, instance_id):
+    """
+    Registra a AMI temporária com os snapshots mais recentes da instância e devolve o ID
+    """
+    instance = get_instance_data(ec2_client, instance_id)
+
+    # Sem a AMI original não há como levar o código de licença (Windows, Marketplace)
+    platform = instance.get('PlatformDetails', 'Linux/UNIX')
+    if platform != 'Linux/UNIX':
+        raise ConfigError(f"A instância {instance_id} é {platform}: o código de licença não passa para uma AMI "
+                          "registrada a partir de snapshots. Use uma AMI (--new-ami-id)")
+
+    snapshots = find_latest_snapshots(ec2_client, instance)
+
+    say(f"\n📸 Snapshots mais recentes da instância {instance_id}:")
+    for device, (volume, snapshot) in snapshots.items():
+        say(f"  - {device}: {snapshot['SnapshotId']} | {snapshot['StartTime']:%Y-%m-%d %H:%M} | "
+            f"{volume['Size']}GB {volume['VolumeType']}")
+
+    start_times = [snapshot['StartTime'] for _, snapshot in snapshots.values()]
+    if (max(start_times) - min(start_times)).total_seconds() > MAX_SNAPSHOT_SPREAD:
+        say("⚠️  Os snapshots não são do mesmo momento: os volumes do clone podem ficar inconsistentes entre si")
+
+    if instance['RootDeviceName'] not in snapshots:
+        raise AmiNotFoundError(f"O volume raiz {instance['RootDeviceName']} da instância {instance_id} não tem snapshot")
+
+    image_params = {
+        'Name': f"SnapshotClone_{instance_id}_{datetime.now().strftime('%Y%m%d-%H%M%S')}",
+        'Description': f"AMI temporária do clone de {instance_id} a partir dos snapshots de "
+                       f"{max(start_times):%Y-%m-%d %H:%M}",
+        'Architecture': instance['Architecture'],
+        'RootDeviceName': instance['RootDeviceName'],
+        'VirtualizationType': instance.get('VirtualizationType', 'hvm'),
+        'BlockDeviceMappings': build_image_mappings(instance, snapshots),
+        'EnaSupport': instance.get('EnaSupport', False),
+        'TagSpecifications': [
+            {'ResourceType': 'image', 'Tags': [{'Key': TEMP_AMI_TAG, 'Value': instance_id}]}
+        ]
+    }
+    # Modo de boot e TPM precisam bater com a origem (ex: UEFI em Graviton, NitroTPM)
+    boot_mode = instance.get('CurrentInstanceBootMode') or instance.get('BootMode')
+    if boot_mode in ('legacy-bios', 'uefi'):
+        image_params['BootMode'] = boot_mode
+    if instance.get('TpmSupport'):
+        image_params['TpmSupport'] = instance['TpmSupport']
+    if instance.get('SriovNetSupport'):
+        image_params['SriovNetSupport'] = instance['SriovNetSupport']
+
+    ami_id = ec2_client.register_image(**image_params)['ImageId']
+    wait_for_state(ec2_client, 'image_available', ami_id, ImageIds=[ami_id],
+                   WaiterConfig={'Delay': 2, 'MaxAttempts': 150})
+    say(f"✅ AMI temporária {ami_id} registrada a partir dos snapshots")
+    return ami_id
+
+def deregister_snapshot_ami(ec2_client, ami_id):
+    """
+    Desregistra a AMI temporária (os snapshots continuam onde estavam)
+    """
+    try:
+        ec2_client.deregister_image(ImageId=ami_id)
+        say(f"🗑️  AMI temporária {ami_id} desregistrada")
+    except Exception as e:
+        say(f"⚠️  Não foi possível desregistrar a AMI temporária {ami_id}: {e}. "
+            f"Remova manualmente (tag {TEMP_AMI_TAG})")
+
+@contextmanager
+def snapshot_ami(instance_id, profile, region):
+    """
+    AMI temporária disponível durante o bloco e desregistrada na saída
+
+        with snapshot_ami(instance_id, profile, region) as ami_id:
+            clone_instance_with_new_ami(instance_id, ami_id, ...)
+    """
+    ec2_client = get_client(profile, region)
+    with phase('discover'):
+        ami_id = register_snapshot_ami(ec2_client, instance_id)
+    try:
+        yield ami_id
+    finally:
+        deregister_snapshot_ami(ec2_client, ami_id)
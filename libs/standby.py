@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+import time
+from datetime import datetime
+
+from libs import progress
+from libs.ami_finder import find_instance_amis
+from libs.ec2_clone_functions import (
+    apply_tags, aws_errors, check_ready, generate_final_report, get_instance_data, prepare_run_params,
+    stop_source_instance, wait_new_instance
+)
+from libs.ec2_network_utils import ensure_placement_group
+from libs.errors import AmiNotFoundError, PreflightError
+from libs.preflight import run_preflight
+from libs.progress import phase, say, wait_for_state
+from libs.sessions import get_client, get_session, session_client
+
+'''
+Warm pool de standbys: clones pré-criados e parados de instâncias selecionadas.
+
+refresh_standby cria (ou mantém) um standby parado a partir da AMI mais recente da
+origem, sem mexer na origem. Se surgir uma AMI mais nova, cria um standby novo e só
+depois termina o antigo. Rodar o refresh periodicamente (cron) mantém o pool em dia.
+
+clone_from_standby transforma o standby em clone de DR: para a origem, liga o standby,
+restaura as configurações da origem e aplica as tags. Fica só start_instances + tags
+no caminho crítico, sem run_instances nem primeiro boot.
+
+Os standbys são identificados pelas tags abaixo. Enquanto é standby, todos os volumes
+e ENIs ficam com DeleteOnTermination=True para que a rotação não deixe lixo; o valor
+original da origem é restaurado na ativação.
+'''
+
+STANDBY_TAG = 'StandbyFor'
+STANDBY_AMI_TAG = 'StandbyAmi'
+STANDBY_CREATED_TAG = 'StandbyCreatedAt'
+
+def find_standbys(ec2_client, source_instance_id):
+    """
+    Lista os standbys da origem (mais recente primeiro)
+    """
+    standbys = []
+    paginator = ec2_client.get_paginator('describe_instances')
+    for page in paginator.paginate(
+        Filters=[
+            {'Name': f'tag:{STANDBY_TAG}', 'Values': [source_instance_id]},
+            {'Name': 'instance-state-name', 'Values': ['pending', 'running', 'stopping', 'stopped']}
+        ]
+    ):
+        for reservation in page['Reservations']:
+            standbys.extend(reservation['Instances'])
+
+    standbys.sort(key=lambda i: get_tag(i, STANDBY_CREATED_TAG) or '', reverse=True)
+    return standbys
+
+def find_ready_standby(ec2_client, source_instance_id):
+    """
+    Devolve o standby parado mais recente da origem (ou None)
+    """
+    return next((s for s in find_standbys(ec2_client, source_instance_id) if s['State']['Name'] == 'stopped'), None)
+
+def get_tag(instance, key):
+    """
+    Valor de uma tag da instância (ou None)
+    """
+    return next((tag['Value'] for tag in instance.get('Tags', []) if tag['Key'] == key), None)
+
+def refresh_standby(instance_id, profile, region, subnet_id=None, volume_rules=None, type_mapping=None):
+    """
+    Garante um standby parado da origem construído a partir da AMI mais recente
+
+    Devolve o ID do standby atual.
+    """
+    session = get_session(profile)
+    ec2_client = session_client(session, 'ec2', region)
+
+    with phase('discover'):
+        instance = get_instance_data(ec2_client, instance_id)
+        ami_id = find_instance_amis(ec2_client, instance_id, interactive=False)
+        if not ami_id:
+            raise AmiNotFoundError(f"nenhuma AMI encontrada para {instance_id}")
+        standbys = find_standbys(ec2_client, instance_id)
+
+    current = next((s for s in standbys if get_tag(s, STANDBY_AMI_TAG) == ami_id), None)
+    if current:
+        say(f"✅ Standby {current['InstanceId']} já usa a AMI mais recente ({ami_id})")
+        if current['State']['Name'] in ['pending', 'running']:
+            ec2_client.stop_instances(InstanceIds=[current['InstanceId']])
+            say(f"⏸️  Parando standby {current['InstanceId']} que estava ligado")
+        remove_old_standbys(ec2_client, standbys, keep=current['InstanceId'])
+        return current['InstanceId']
+
+    say(f"\n🧊 Criando standby de {instance_id} com a AMI {ami_id}...")
+    with phase('plan'):
+        run_params = prepare_run_params(instance, ami_id, ec2_client, subnet_id, False, volume_rules, type_mapping)
+        run_params = standby_run_params(run_params, instance, ami_id)
+
+    with phase('preflight'):
+        problems = run_preflight(session, ec2_client, run_params)
+        if problems:
+            raise PreflightError("preflight do standby falhou", problems)
+
+    with phase('launch'):
+        ensure_placement_group(ec2_client, run_params, instance)
+        standby_id = ec2_client.run_instances(**run_params)['Instances'][0]['InstanceId']
+        say(f"✅ Standby criado: {standby_id}")
+
+    # Sobe uma vez (primeiro boot, inicialização dos volumes) e deixa parado
+    with phase('wait_running'):
+        wait_for_state(ec2_client, 'instance_running', standby_id, InstanceIds=[standby_id])
+    with phase('stop_standby'):
+        ec2_client.stop_instances(InstanceIds=[standby_id])
+        wait_for_state(ec2_client, 'instance_stopped', standby_id, InstanceIds=[standby_id])
+        say(f"🧊 Standby {standby_id} parado e pronto")
+
+    remove_old_standbys(ec2_client, standbys, keep=standby_id)
+    return standby_id
+
+def standby_run_params(run_params, instance, ami_id):
+    """
+    Ajusta o run_params para um standby: tags de identificação e DeleteOnTermination em tudo
+    """
+    source_name = get_tag(instance, 'Name') or instance['InstanceId']
+
+    for bdm in run_params.get('BlockDeviceMappings', []):
+        bdm['Ebs']['DeleteOnTermination'] = True
+    for eni in run_params.get('NetworkInterfaces', []):
+        eni['DeleteOnTermination'] = True
+
+    run_params['TagSpecifications'] = [{
+        'ResourceType': 'instance',
+        'Tags': [
+            {'Key': 'Name', 'Value': f"{source_name}-STANDBY"},
+            {'Key': STANDBY_TAG, 'Value': instance['InstanceId']},
+            {'Key': STANDBY_AMI_TAG, 'Value': ami_id},
+            {'Key': STANDBY_CREATED_TAG, 'Value': datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")}
+        ]
+    }]
+    return run_params
+
+def remove_old_standbys(ec2_client, standbys, keep):
+    """
+    Termina os standbys antigos (rotação), mantendo o indicado
+    """
+    old_ids = [s['InstanceId'] for s in standbys if s['InstanceId'] != keep]
+    if old_ids:
+        ec2_client.terminate_instances(InstanceIds=old_ids)
+        say(f"🗑️  Standbys antigos terminados: {', '.join(old_ids)}")
+    return old_ids
+
+def cleanup_standby(instance_id, profile, region):
+    """
+    Termina todos os standbys da origem (ex: instância saiu da lista de proteção)
+    """
+    ec2_client = get_client(profile, region)
+
+    standbys = find_standbys(ec2_client, instance_id)
+    if not standbys:
+        say(f"ℹ️  Nenhum standby encontrado para {instance_id}")
+        return []
+    return remove_old_standbys(ec2_client, standbys, keep=None)
+
+def clone_from_standby(instance_id, profile, region, new_name=None, readiness=None):
+    """
+    Faz o clone de DR ligando o standby da origem
+
+    Devolve o ID da nova instância ou None se não houver standby parado disponível
+    (aí quem chamou segue com o clone normal).
+    """
+    session = get_session(profile)
+    ec2_client = session_client(session, 'ec2', region)
+
+    standby = find_ready_standby(ec2_client, instance_id)
+    if not standby:
+        say(f"ℹ️  Nenhum standby parado para {instance_id}; seguindo com o clone normal")
+        return None
+
+    if progress.current_clone() is None:
+        progress.set_current_clone(instance_id)
+
+    with phase('clone'):
+        start_time = datetime.now().strftime("%H:%M")
+        standby_id = standby['InstanceId']
+        standby_ami = get_tag(standby, STANDBY_AMI_TAG)
+        say(f"\n🧊 Clonando {instance_id} a partir do standby {standby_id} (AMI {standby_ami})...\n")
+
+        with phase('discover'):
+            instance = get_instance_data(ec2_client, instance_id)
+
+        with phase('stop_source'):
+            say(f"⏸️  Parando a instância {instance_id} antes da clonagem...")
+            stop_source_instance(ec2_client, instance_id)
+
+        with phase('launch'):
+            say(f"▶️  Ligando o standby {standby_id}...")
+            launch_start = time.time()
+            ec2_client.start_instances(InstanceIds=[standby_id])
+
+        # Ligado, o standby já é a nova instância: um erro da AWS leva o ID dele junto
+        with aws_errors(standby_id):
+            with phase('tag'):
+                restore_delete_on_termination(ec2_client, instance, standby)
+                ec2_client.delete_tags(
+                    Resources=[standby_id],
+                    Tags=[{'Key': STANDBY_TAG}, {'Key': STANDBY_AMI_TAG}, {'Key': STANDBY_CREATED_TAG}]
+                )
+                apply_tags(ec2_client, instance_id, standby_id, new_name)
+                ec2_client.create_tags(
+                    Resources=[standby_id],
+                    Tags=[{'Key': 'ClonedFromStandby', 'Value': standby_ami or 'true'}]
+                )
+
+            timings = wait_new_instance(session, ec2_client, standby_id, launch_start, readiness)
+
+            end_time = datetime.now().strftime("%H:%M")
+            with phase('report'):
+                generate_final_report(ec2_client, instance_id, standby_id, instance, profile, start_time, end_time,
+                                      standby_ami=standby_ami, timings=timings)
+
+            check_ready(standby_id, timings)
+
+    return standby_id
+
+def restore_delete_on_termination(ec2_client, instance, standby):
+    """
+    Volta o DeleteOnTermination dos volumes do ex-standby para o valor da origem
+    """
+    source_flags = {
+        bdm['DeviceName']: bdm['Ebs'].get('DeleteOnTermination', False)
+        for bdm in instance.get('BlockDeviceMappings', []) if 'Ebs' in bdm
+    }
+    mappings = [
+        {'DeviceName': bdm['DeviceName'], 'Ebs': {'DeleteOnTermination': source_flags[bdm['DeviceName']]}}
+        for bdm in standby.get('BlockDeviceMappings', [])
+        if bdm['DeviceName'] in source_flags and 'Ebs' in bdm
+    ]
+    if mappings:
+        ec2_client.modify_instance_attribute(InstanceId=standby['InstanceId'], BlockDeviceMappings=mappings)
+
+    source_enis = {
+        eni['Attachment']['DeviceIndex']: eni['Attachment'].get('DeleteOnTermination', True)
+        for eni in instance.get('NetworkInterfaces', [])
+    }
+    for eni in standby.get('NetworkInterfaces', []):
+        flag = source_enis.get(eni['Attachment']['DeviceIndex'])
+        if flag is not None and flag != eni['Attachment'].get('DeleteOnTermination'):
+            ec2_client.modify_network_interface_attribute(
+                NetworkInterfaceId=eni['NetworkInterfaceId'],
+                Attachment={'AttachmentId': eni['Attachment']['AttachmentId'], 'DeleteOnTermination': flag}
+            )
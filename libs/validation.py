@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+import configparser
+import os
+import re
+
+from libs.errors import ConfigError
+
+'''
+Validação das entradas antes de qualquer chamada à AWS.
+
+Um ID com erro de digitação ou um profile que não existe só apareceriam depois do
+import do boto3, da criação da sessão e da primeira chamada (ou, no fan-out, no meio
+do lote). Aqui o formato dos IDs é conferido por expressão regular e os profiles são
+lidos direto dos arquivos de configuração da AWS com configparser, sem carregar o
+botocore.
+'''
+
+# Formatos dos IDs aceitos pela EC2 (8 hexadecimais nos recursos antigos, 17 nos novos)
+ID_PATTERNS = {
+    'instance': re.compile(r'^i-[0-9a-f]{8}([0-9a-f]{9})?$'),
+    'ami': re.compile(r'^ami-[0-9a-f]{8}([0-9a-f]{9})?$'),
+    'subnet': re.compile(r'^subnet-[0-9a-f]{8}([0-9a-f]{9})?$'),
+    'vpc': re.compile(r'^vpc-[0-9a-f]{8}([0-9a-f]{9})?$'),
+    'security_group': re.compile(r'^sg-[0-9a-f]{8}([0-9a-f]{9})?$')
+}
+
+ID_NAMES = {'instance': 'instância', 'ami': 'AMI', 'subnet': 'subnet', 'vpc': 'VPC', 'security_group': 'security group'}
+
+def validate_id(value, kind):
+    """
+    Levanta ConfigError se o ID não tiver o formato do tipo ('instance', 'ami', 'subnet', 'vpc', 'security_group')
+    """
+    if not isinstance(value, str) or not ID_PATTERNS[kind].match(value):
+        example = {'instance': 'i-0123456789abcdef0', 'ami': 'ami-0abcdef1234567890',
+                   'subnet': 'subnet-0abc1234', 'vpc': 'vpc-0abc1234', 'security_group': 'sg-0abc1234'}[kind]
+        raise ConfigError(f"ID de {ID_NAMES[kind]} inválido '{value}' (ex: {example})")
+    return value
+
+def available_profiles():
+    """
+    Profiles definidos no config e no credentials da AWS (mesmos caminhos e variáveis do botocore)
+    """
+    config_path = os.path.expanduser(os.environ.get('AWS_CONFIG_FILE', '~/.aws/config'))
+    credentials_path = os.path.expanduser(os.environ.get('AWS_SHARED_CREDENTIALS_FILE', '~/.aws/credentials'))
+
+    profiles = set()
+    for path, prefixed in ((config_path, True), (credentials_path, False)):
+        parser = configparser.RawConfigParser()
+        try:
+            parser.read(path)
+        except configparser.Error:
+            # Arquivo malformado: o botocore vai reclamar com a mensagem dele
+            continue
+        for section in parser.sections():
+            # No config os profiles são "[profile nome]" (exceto o default); no credentials, "[nome]"
+            if prefixed and section.startswith('profile '):
+                profiles.add(section[len('profile '):].strip())
+            elif prefixed and section != 'default':
+                continue
+            else:
+                profiles.add(section.strip())
+    return profiles
+
+def validate_profile(profile, profiles=None):
+    """
+    Levanta ConfigError se o profile não existir nos arquivos de configuração da AWS
+
+    profiles permite reaproveitar a leitura de available_profiles() ao validar vários.
+    """
+    profiles = available_profiles() if profiles is None else profiles
+    # Como no botocore, o default pode não estar em arquivo nenhum (variáveis de ambiente, IMDS)
+    if profile != 'default' and profile not in profiles:
+        known = ", ".join(sorted(profiles)) or "nenhum"
+        raise ConfigError(f"Profile '{profile}' não encontrado em ~/.aws/config nem em ~/.aws/credentials "
+                          f"(profiles disponíveis: {known})")
+    return profile
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from libs import progress
+from libs.ec2_network_utils import isolate_drill_network
+from libs.errors import ConfigError
+
+class FakeEc2:
+    """
+    describe_subnets de um mapa {subnet_id: vpc_id}
+    """
+
+    def __init__(self, subnets):
+        self.subnets = subnets
+
+    def describe_subnets(self, SubnetIds):
+        return {'Subnets': [{'SubnetId': subnet_id, 'VpcId': self.subnets[subnet_id]} for subnet_id in SubnetIds]}
+
+SOURCE = {
+    'InstanceId': 'i-0123456789abcdef0',
+    'VpcId': 'vpc-0prod0001',
+    'NetworkInterfaces': [{'NetworkInterfaceId': 'eni-0abc0001'}]
+}
+
+class IsolateDrillNetworkTest(unittest.TestCase):
+    """
+    Isolamento de rede do clone de drill (isolate_drill_network)
+    """
+
+    def setUp(self):
+        progress.set_console(False)
+        self.ec2 = FakeEc2({'subnet-0drill001': 'vpc-0drill001', 'subnet-0prod0002': 'vpc-0prod0001'})
+
+    def tearDown(self):
+        progress.set_console(True)
+
+    def test_vpc_isolada_troca_os_security_groups(self):
+        run_params = {'SubnetId': 'subnet-0drill001', 'SecurityGroupIds': ['sg-0prod0001']}
+        isolate_drill_network(run_params, SOURCE, self.ec2, {'security_groups': ['sg-0drill001']})
+        self.assertEqual(run_params['SecurityGroupIds'], ['sg-0drill001'])
+
+    def test_vpc_isolada_com_network_interfaces(self):
+        run_params = {'NetworkInterfaces': [{'DeviceIndex': 0, 'SubnetId': 'subnet-0drill001', 'Groups': ['sg-0prod0001']}]}
+        isolate_drill_network(run_params, SOURCE, self.ec2, {'security_groups': ['sg-0drill001']})
+        self.assertEqual(run_params['NetworkInterfaces'][0]['Groups'], ['sg-0drill001'])
+
+    def test_vpc_isolada_sem_security_groups_do_drill_falha(self):
+        run_params = {'SubnetId': 'subnet-0drill001', 'SecurityGroupIds': ['sg-0prod0001']}
+        with self.assertRaises(ConfigError):
+            isolate_drill_network(run_params, SOURCE, self.ec2, {})
+
+    def test_subnet_na_vpc_da_origem_e_recusada(self):
+        run_params = {'SubnetId': 'subnet-0prod0002', 'SecurityGroupIds': ['sg-0prod0001']}
+        with self.assertRaises(ConfigError):
+            isolate_drill_network(run_params, SOURCE, self.ec2, {'security_groups': ['sg-0drill001']})
+
+    def test_subnet_na_vpc_da_origem_com_override(self):
+        run_params = {'SubnetId': 'subnet-0prod0002', 'SecurityGroupIds': ['sg-0prod0001']}
+        isolate_drill_network(run_params, SOURCE, self.ec2, {'allow_source_vpc': True})
+        self.assertEqual(run_params['SecurityGroupIds'], ['sg-0prod0001'])
+
+    def test_mais_de_uma_eni_e_recusada(self):
+        source = dict(SOURCE, NetworkInterfaces=[{'NetworkInterfaceId': 'eni-0abc0001'},
+                                                 {'NetworkInterfaceId': 'eni-0abc0002'}])
+        with self.assertRaises(ConfigError):
+            isolate_drill_network({'SubnetId': 'subnet-0drill001'}, source, self.ec2,
+                                  {'security_groups': ['sg-0drill001']})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from libs import progress
+from libs.ec2_volume_utils import apply_volume_rules, build_ebs_spec, parse_volume_rules
+from libs.errors import ConfigError
+
+class ApplyVolumeRulesTest(unittest.TestCase):
+    """
+    Regras de reescrita de volumes (apply_volume_rules)
+    """
+
+    def setUp(self):
+        progress.set_console(False)
+        self.messages = []
+        self.sink = progress.add_sink(lambda event: self.messages.append(event))
+
+    def tearDown(self):
+        progress.remove_sink(self.sink)
+        progress.set_console(True)
+
+    def test_gp3_pequeno_sem_regras_mantem_baseline(self):
+        volume = {'VolumeType': 'gp3', 'Size': 4, 'Iops': 3000, 'Throughput': 125}
+        volume_type, iops, throughput, size, problems = apply_volume_rules('/dev/sdf', volume, None)
+        self.assertEqual((volume_type, iops, throughput, size), ('gp3', 3000, 125, 4))
+        self.assertEqual(problems, [])
+
+    def test_gp2_pequeno_convertido_para_gp3(self):
+        volume = {'VolumeType': 'gp2', 'Size': 1}
+        rules = parse_volume_rules(['gp2:gp3'])
+        volume_type, iops, _, _, problems = apply_volume_rules('/dev/sdf', volume, rules)
+        self.assertEqual((volume_type, iops), ('gp3', 3000))
+        self.assertEqual(problems, [])
+
+    def test_iops_acima_do_minimo_respeita_limite_por_gib(self):
+        volume = {'VolumeType': 'gp3', 'Size': 4, 'Iops': 3000, 'Throughput': 125}
+        rules = parse_volume_rules(min_iops=['/dev/sdf:6000'])
+        _, iops, _, _, problems = apply_volume_rules('/dev/sdf', volume, rules)
+        self.assertEqual(iops, 6000)
+        self.assertEqual(len(problems), 1)
+        self.assertIn('IOPS/GiB', problems[0])
+
+    def test_nunca_fica_abaixo_da_origem(self):
+        volume = {'VolumeType': 'gp2', 'Size': 2000}
+        rules = parse_volume_rules(['gp2:gp3'])
+        _, iops, throughput, _, problems = apply_volume_rules('/dev/sdf', volume, rules)
+        self.assertEqual((iops, throughput), (6000, 250))
+        self.assertEqual(problems, [])
+
+    def test_min_iops_em_tipo_sem_iops_avisa(self):
+        volume = {'VolumeType': 'gp2', 'Size': 100}
+        rules = parse_volume_rules(min_iops=['*:4000'])
+        volume_type, iops, throughput, _, problems = apply_volume_rules('/dev/sdf', volume, rules)
+        self.assertEqual((volume_type, iops, throughput), ('gp2', None, None))
+        self.assertEqual(problems, [])
+        self.assertTrue(any('4000 IOPS ignorada' in getattr(m, 'message', '') for m in self.messages))
+
+    def test_min_throughput_em_io2_avisa(self):
+        volume = {'VolumeType': 'io2', 'Size': 100, 'Iops': 5000}
+        rules = parse_volume_rules(min_throughput=['/dev/sdf:500'])
+        _, iops, throughput, _, problems = apply_volume_rules('/dev/sdf', volume, rules)
+        self.assertEqual((iops, throughput), (5000, None))
+        self.assertEqual(problems, [])
+        self.assertTrue(any('500 MB/s' in getattr(m, 'message', '') for m in self.messages))
+
+    def test_st1_grande_para_gp3_mantem_throughput_base(self):
+        # 12 TiB de st1: 40 MiB/s por TiB = 480 MiB/s de base
+        volume = {'VolumeType': 'st1', 'Size': 12288}
+        rules = parse_volume_rules(['st1:gp3'])
+        volume_type, iops, throughput, _, problems = apply_volume_rules('/dev/sdf', volume, rules)
+        self.assertEqual((volume_type, iops, throughput), ('gp3', 3000, 480))
+        self.assertEqual(problems, [])
+
+    def test_sc1_respeita_o_teto_do_throughput_base(self):
+        volume = {'VolumeType': 'sc1', 'Size': 16384}
+        rules = parse_volume_rules(['sc1:gp3'])
+        _, _, throughput, _, problems = apply_volume_rules('/dev/sdf', volume, rules)
+        self.assertEqual(throughput, 192)
+        self.assertEqual(problems, [])
+
+    def test_destino_abaixo_da_origem_e_problema(self):
+        volume = {'VolumeType': 'io1', 'Size': 100, 'Iops': 5000}
+        rules = parse_volume_rules(['io1:gp2'])
+        _, _, _, _, problems = apply_volume_rules('/dev/sdf', volume, rules)
+        self.assertEqual(len(problems), 1)
+        self.assertIn('abaixo dos 5000 IOPS', problems[0])
+
+    def test_st1_grande_para_gp2_e_problema(self):
+        volume = {'VolumeType': 'st1', 'Size': 12288}
+        rules = parse_volume_rules(['st1:gp2'])
+        _, _, _, _, problems = apply_volume_rules('/dev/sdf', volume, rules)
+        self.assertEqual(len(problems), 1)
+        self.assertIn('abaixo dos 480 MiB/s', problems[0])
+
+    def test_gp3_aceita_os_maximos_atuais(self):
+        volume = {'VolumeType': 'gp3', 'Size': 1000, 'Iops': 3000, 'Throughput': 125}
+        rules = parse_volume_rules(min_iops=['*:40000'], min_throughput=['*:1500'])
+        _, iops, throughput, _, problems = apply_volume_rules('/dev/sdf', volume, rules)
+        self.assertEqual((iops, throughput), (40000, 1500))
+        self.assertEqual(problems, [])
+
+    def test_raiz_em_st1_e_invalido(self):
+        volume = {'VolumeType': 'gp2', 'Size': 200}
+        rules = parse_volume_rules(['gp2:st1'])
+        with self.assertRaises(ConfigError):
+            build_ebs_spec('/dev/xvda', volume, True, rules, is_root=True)
+
+if __name__ == '__main__':
+    unittest.main()
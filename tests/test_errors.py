@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from botocore.exceptions import ClientError, NoCredentialsError, WaiterError
+
+from libs.ec2_clone_functions import aws_errors
+from libs.errors import AwsError, CloneError, ConfigError
+
+class AwsErrorsTest(unittest.TestCase):
+    """
+    Conversão dos erros do boto3/botocore em AwsError (aws_errors)
+    """
+
+    def test_client_error_vira_aws_error_com_o_codigo(self):
+        error = ClientError({'Error': {'Code': 'UnauthorizedOperation', 'Message': 'negado'}}, 'RunInstances')
+        with self.assertRaises(AwsError) as ctx:
+            with aws_errors():
+                raise error
+        self.assertEqual(ctx.exception.code, 'UnauthorizedOperation')
+        self.assertIsNone(ctx.exception.new_instance_id)
+        self.assertIs(ctx.exception.__cause__, error)
+        self.assertIsInstance(ctx.exception, CloneError)
+
+    def test_erros_do_botocore_viram_aws_error(self):
+        for error in (NoCredentialsError(), WaiterError(name='InstanceRunning', reason='Max attempts exceeded',
+                                                        last_response={})):
+            with self.assertRaises(AwsError) as ctx:
+                with aws_errors():
+                    raise error
+            self.assertEqual(ctx.exception.code, type(error).__name__)
+
+    def test_falha_depois_do_launch_leva_o_id_da_nova_instancia(self):
+        with self.assertRaises(AwsError) as ctx:
+            with aws_errors('i-0123456789abcdef0'):
+                raise ClientError({'Error': {'Code': 'RequestLimitExceeded', 'Message': ''}}, 'CreateTags')
+        self.assertEqual(ctx.exception.new_instance_id, 'i-0123456789abcdef0')
+        self.assertIn('i-0123456789abcdef0', str(ctx.exception))
+
+    def test_erros_da_lib_passam_direto(self):
+        with self.assertRaises(ConfigError):
+            with aws_errors():
+                raise ConfigError("regra inválida")
+
+if __name__ == '__main__':
+    unittest.main()
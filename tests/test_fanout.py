@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+import os
+import sys
+import threading
+import unittest
+from concurrent.futures import Future
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from libs import progress
+from libs.fanout import run_limited
+
+def make_result(instance_id, profile='dev', depends_on=None, predicted=60.0):
+    """
+    Resultado de fan-out mínimo para o despachante
+    """
+    return {
+        'job': {'profile': profile, 'region': 'us-east-1', 'instance_id': instance_id,
+                'depends_on': depends_on or []},
+        'status': 'ok',
+        'error': None,
+        'predicted': predicted,
+        'prediction': 'teste'
+    }
+
+class FakeSubmit:
+    """
+    submit falso: registra a ordem e a concorrência por conta e termina cada job depois de delay
+
+    fail lista os instance_id que terminam com status 'erro'.
+    """
+
+    def __init__(self, delay=0.05, fail=()):
+        self.delay = delay
+        self.fail = set(fail)
+        self.started = []
+        self.in_flight = {}
+        self.peak = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, result):
+        profile = result['job']['profile']
+        with self.lock:
+            self.started.append(result['job']['instance_id'])
+            self.in_flight[profile] = self.in_flight.get(profile, 0) + 1
+            self.peak[profile] = max(self.peak.get(profile, 0), self.in_flight[profile])
+
+        future = Future()
+
+        def finish():
+            if result['job']['instance_id'] in self.fail:
+                result['status'] = 'erro'
+            with self.lock:
+                self.in_flight[profile] -= 1
+            future.set_result(None)
+
+        if self.delay:
+            threading.Timer(self.delay, finish).start()
+        else:
+            finish()
+        return future
+
+class RunLimitedTest(unittest.TestCase):
+    """
+    Despacho do fan-out sem agendador (run_limited)
+    """
+
+    def setUp(self):
+        progress.set_console(False)
+
+    def tearDown(self):
+        progress.set_console(True)
+
+    def test_respeita_o_limite_por_conta(self):
+        results = [make_result(f"i-{n:017x}", 'dev') for n in range(6)] + \
+                  [make_result(f"i-{n:017x}", 'prd') for n in range(6, 8)]
+        submit = FakeSubmit()
+        run_limited(iter(results), submit, max_workers=4, max_per_account=2)
+        self.assertEqual(len(submit.started), 8)
+        self.assertEqual(submit.peak, {'dev': 2, 'prd': 2})
+
+    def test_conta_cheia_nao_segura_as_outras(self):
+        results = [make_result(f"i-{n:017x}", 'dev') for n in range(4)] + [make_result('i-00000000000000abc', 'prd')]
+        submit = FakeSubmit()
+        run_limited(iter(results), submit, max_workers=4, max_per_account=1)
+        # O job da prd sai logo depois do primeiro da dev, sem esperar a fila da dev
+        self.assertEqual(submit.started[:2], ['i-00000000000000000', 'i-00000000000000abc'])
+
+    def test_sem_limite_por_conta_usa_todos_os_workers(self):
+        results = [make_result(f"i-{n:017x}", 'dev') for n in range(6)]
+        submit = FakeSubmit()
+        run_limited(iter(results), submit, max_workers=3, max_per_account=None)
+        self.assertEqual(submit.peak, {'dev': 3})
+
+if __name__ == '__main__':
+    unittest.main()
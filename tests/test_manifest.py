@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from libs.errors import ConfigError
+from libs.manifest import load_manifest
+
+AWS_CONFIG = "[profile dev]\nregion = us-east-1\n\n[profile prd]\nregion = sa-east-1\n"
+
+class LoadManifestTest(unittest.TestCase):
+    """
+    Validação e deduplicação do manifesto de fan-out (load_manifest)
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+        config_path = os.path.join(self.directory, 'config')
+        with open(config_path, 'w') as f:
+            f.write(AWS_CONFIG)
+        environ = mock.patch.dict(os.environ, {
+            'AWS_CONFIG_FILE': config_path,
+            'AWS_SHARED_CREDENTIALS_FILE': os.path.join(self.directory, 'credentials')
+        })
+        environ.start()
+        self.addCleanup(environ.stop)
+
+    def write_manifest(self, manifest):
+        path = os.path.join(self.directory, 'manifest.json')
+        with open(path, 'w') as f:
+            json.dump(manifest, f)
+        return path
+
+    def load_jobs(self, manifest):
+        jobs, max_per_account, _, _, _ = load_manifest(self.write_manifest(manifest))
+        return list(jobs), max_per_account
+
+    def test_instancia_repetida_vira_um_job_so(self):
+        jobs, _ = self.load_jobs({'targets': [
+            {'profile': 'dev', 'region': 'us-east-1', 'instances': [{'instance_id': 'i-0123456789abcdef0'}]},
+            {'profile': 'dev', 'region': 'us-east-1', 'instances': [{'instance_id': 'i-0123456789abcdef0'},
+                                                                    {'instance_id': 'i-0fedcba9876543210'}]},
+            {'profile': 'dev', 'region': 'us-west-2', 'instances': [{'instance_id': 'i-0123456789abcdef0'}]}
+        ]})
+        self.assertEqual([(job['region'], job['instance_id']) for job in jobs], [
+            ('us-east-1', 'i-0123456789abcdef0'),
+            ('us-east-1', 'i-0fedcba9876543210'),
+            ('us-west-2', 'i-0123456789abcdef0')
+        ])
+
+    def test_subnet_e_security_groups_do_target_valem_para_as_instancias(self):
+        jobs, _ = self.load_jobs({'targets': [{
+            'profile': 'prd', 'region': 'sa-east-1', 'subnet_id': 'subnet-0abc1234',
+            'drill_security_groups': ['sg-0abc1234'],
+            'instances': [
+                {'instance_id': 'i-0123456789abcdef0'},
+                {'instance_id': 'i-0fedcba9876543210', 'subnet_id': 'subnet-0def5678',
+                 'drill_security_groups': ['sg-0def5678']}
+            ]
+        }]})
+        self.assertEqual([(job['subnet_id'], job['drill_security_groups']) for job in jobs], [
+            ('subnet-0abc1234', ['sg-0abc1234']),
+            ('subnet-0def5678', ['sg-0def5678'])
+        ])
+
+    def test_max_per_account_opcional(self):
+        target = {'profile': 'dev', 'region': 'us-east-1', 'instances': [{'instance_id': 'i-0123456789abcdef0'}]}
+        self.assertIsNone(self.load_jobs({'targets': [target]})[1])
+        self.assertEqual(self.load_jobs({'max_per_account': 3, 'targets': [target]})[1], 3)
+
+    def test_manifesto_invalido(self):
+        instance = {'instance_id': 'i-0123456789abcdef0'}
+        invalid = {
+            'target sem region': {'targets': [{'profile': 'dev', 'instances': [instance]}]},
+            'profile inexistente': {'targets': [{'profile': 'hml', 'region': 'us-east-1', 'instances': [instance]}]},
+            'instância sem ID': {'targets': [{'profile': 'dev', 'region': 'us-east-1', 'instances': [{}]}]},
+            'ID de instância inválido': {'targets': [{'profile': 'dev', 'region': 'us-east-1',
+                                                      'instances': [{'instance_id': 'i-xyz'}]}]},
+            'AMI inválida': {'targets': [{'profile': 'dev', 'region': 'us-east-1',
+                                          'instances': [dict(instance, new_ami_id='ami-xyz')]}]},
+            'depends_on fora de lista': {'targets': [{'profile': 'dev', 'region': 'us-east-1',
+                                                      'instances': [dict(instance, depends_on='i-0fedcba9876543210')]}]},
+            'security group inválido': {'targets': [{'profile': 'dev', 'region': 'us-east-1',
+                                                     'drill_security_groups': ['sg-xyz'], 'instances': [instance]}]},
+            'sem instâncias': {'targets': [{'profile': 'dev', 'region': 'us-east-1', 'instances': []}]},
+            'regra de volume inválida': {'volume_rules': {'convert': {'gp2': 'xyz'}},
+                                         'targets': [{'profile': 'dev', 'region': 'us-east-1', 'instances': [instance]}]}
+        }
+        for case, manifest in invalid.items():
+            with self.subTest(case), self.assertRaises(ConfigError):
+                self.load_jobs(manifest)
+
+    def test_arquivo_ilegivel(self):
+        path = os.path.join(self.directory, 'manifest.json')
+        with open(path, 'w') as f:
+            f.write('{"targets": [')
+        with self.assertRaises(ConfigError):
+            load_manifest(path)
+        with self.assertRaises(ConfigError):
+            load_manifest(os.path.join(self.directory, 'nao_existe.json'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from libs.readiness import BatchedStatusChecks
+
+class FakeEc2:
+    """
+    describe_instance_status que conta as chamadas; ready lista as instâncias com status 'ok'
+    """
+
+    def __init__(self, ready):
+        self.ready = set(ready)
+        self.calls = []
+
+    def describe_instance_status(self, InstanceIds, IncludeAllInstances):
+        self.calls.append(list(InstanceIds))
+        status = lambda instance_id: {'Status': 'ok' if instance_id in self.ready else 'initializing'}
+        return {'InstanceStatuses': [
+            {'InstanceId': instance_id, 'InstanceStatus': status(instance_id), 'SystemStatus': status(instance_id)}
+            for instance_id in InstanceIds
+        ]}
+
+class BatchedStatusChecksTest(unittest.TestCase):
+    """
+    Status checks de um grupo com uma consulta por intervalo (BatchedStatusChecks)
+    """
+
+    def test_uma_consulta_por_intervalo_para_o_grupo(self):
+        ids = [f"i-{n:017x}" for n in range(3)]
+        ec2 = FakeEc2(ready=ids[:2])
+        checks = BatchedStatusChecks(ec2, ids, interval=60)
+        self.assertEqual([checks.ok(instance_id) for instance_id in ids], [True, True, False])
+        self.assertEqual(ec2.calls, [ids])
+
+    def test_consulta_de_novo_depois_do_intervalo(self):
+        ids = [f"i-{n:017x}" for n in range(2)]
+        ec2 = FakeEc2(ready=[])
+        checks = BatchedStatusChecks(ec2, ids, interval=0)
+        self.assertFalse(checks.ok(ids[0]))
+        ec2.ready.add(ids[0])
+        self.assertTrue(checks.ok(ids[0]))
+        self.assertEqual(len(ec2.calls), 2)
+
+    def test_lotes_de_100_ids(self):
+        ids = [f"i-{n:017x}" for n in range(250)]
+        ec2 = FakeEc2(ready=ids)
+        self.assertTrue(BatchedStatusChecks(ec2, ids, interval=60).ok(ids[-1]))
+        self.assertEqual([len(call) for call in ec2.calls], [100, 100, 50])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from libs import progress
+from libs.errors import ConfigError
+from libs.scheduler import dependency_graph, load_clone_durations, run_scheduled
+from test_fanout import FakeSubmit, make_result
+
+def phase_events(clone_id, phases, duration):
+    """
+    Eventos PhaseStarted/PhaseFinished de uma execução, com as fases dentro da 'clone'
+    """
+    events = [{'event': 'PhaseStarted', 'clone_id': clone_id, 'phase': 'clone'}]
+    for name in phases:
+        events.append({'event': 'PhaseStarted', 'clone_id': clone_id, 'phase': name})
+        events.append({'event': 'PhaseFinished', 'clone_id': clone_id, 'phase': name, 'duration': 1.0, 'ok': True})
+    events.append({'event': 'PhaseFinished', 'clone_id': clone_id, 'phase': 'clone', 'duration': duration, 'ok': True})
+    return events
+
+class LoadCloneDurationsTest(unittest.TestCase):
+    """
+    Telemetria usada na previsão de duração (load_clone_durations)
+    """
+
+    def write_history(self, events):
+        handle, path = tempfile.mkstemp(suffix='.jsonl')
+        with os.fdopen(handle, 'w') as f:
+            for event in events:
+                f.write(json.dumps(event) + "\n")
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_clone_e_drill_contam(self):
+        path = self.write_history(
+            phase_events('dev/us-east-1/i-0123456789abcdef0', ['discover', 'stop_source', 'launch', 'tag'], 300)
+            + [{'drill_id': 'drill-1', 'instance_id': 'i-0123456789abcdef0', 'status': 'ok',
+                'phase_timings': {'clone': 200}}]
+        )
+        self.assertEqual(load_clone_durations([path]), {'i-0123456789abcdef0': [300, 200]})
+
+    def test_plano_e_refresh_de_standby_nao_contam(self):
+        path = self.write_history(
+            phase_events('dev/us-east-1/i-0123456789abcdef0', ['discover', 'plan', 'preflight'], 20)
+            + phase_events('dev/us-east-1/i-0123456789abcdef0',
+                           ['discover', 'plan', 'preflight', 'launch', 'wait_running', 'stop_standby'], 500)
+        )
+        self.assertEqual(load_clone_durations([path]), {})
+
+class RunScheduledTest(unittest.TestCase):
+    """
+    Despacho pelo agendador (run_scheduled e dependency_graph)
+    """
+
+    def setUp(self):
+        progress.set_console(False)
+
+    def tearDown(self):
+        progress.set_console(True)
+
+    def test_maior_cadeia_primeiro(self):
+        db = make_result('i-0000000000000d0b0', predicted=100)
+        app = make_result('i-0000000000000a990', depends_on=['i-0000000000000d0b0'], predicted=300)
+        big = make_result('i-0000000000000b160', predicted=350)
+        small = make_result('i-00000000000005a11', predicted=10)
+        submit = FakeSubmit(delay=0)
+        run_scheduled([small, big, app, db], submit, max_workers=1)
+        # A cadeia db + app (400) passa na frente de big (350); liberado o app, big (350) vem antes dele (300)
+        self.assertEqual(submit.started, ['i-0000000000000d0b0', 'i-0000000000000b160', 'i-0000000000000a990',
+                                          'i-00000000000005a11'])
+
+    def test_falha_derruba_os_dependentes_em_cascata(self):
+        db = make_result('i-0000000000000d0b0')
+        app = make_result('i-0000000000000a990', depends_on=['i-0000000000000d0b0'])
+        web = make_result('i-0000000000000e0b0', depends_on=['i-0000000000000a990'])
+        other = make_result('i-00000000000001234')
+        submit = FakeSubmit(delay=0, fail=['i-0000000000000d0b0'])
+        run_scheduled([db, app, web, other], submit, max_workers=2)
+        self.assertEqual(sorted(submit.started), ['i-00000000000001234', 'i-0000000000000d0b0'])
+        self.assertEqual([r['status'] for r in (db, app, web, other)], ['erro', 'erro', 'erro', 'ok'])
+        self.assertIn('i-0000000000000d0b0', app['error'])
+        self.assertIn('i-0000000000000a990', web['error'])
+
+    def test_job_que_ja_falhou_nao_roda_e_derruba_os_dependentes(self):
+        db = dict(make_result('i-0000000000000d0b0'), status='erro')
+        app = make_result('i-0000000000000a990', depends_on=['i-0000000000000d0b0'])
+        submit = FakeSubmit(delay=0)
+        run_scheduled([db, app], submit, max_workers=2)
+        self.assertEqual(submit.started, [])
+        self.assertEqual(app['status'], 'erro')
+
+    def test_respeita_o_limite_por_conta(self):
+        results = [make_result(f"i-{n:017x}", 'dev', predicted=100 - n) for n in range(5)] + \
+                  [make_result(f"i-{n:017x}", 'prd', predicted=10) for n in range(5, 7)]
+        submit = FakeSubmit()
+        run_scheduled(results, submit, max_workers=4, max_per_account=2)
+        self.assertEqual(len(submit.started), 7)
+        self.assertEqual(submit.peak, {'dev': 2, 'prd': 2})
+        # A prd ocupa os workers que a dev (cheia) deixaria parados, mesmo com previsão menor
+        self.assertEqual(sorted(submit.started[:4]), sorted(['i-00000000000000000', 'i-00000000000000001',
+                                                             'i-00000000000000005', 'i-00000000000000006']))
+
+    def test_ciclo_e_recusado_antes_de_rodar(self):
+        a = make_result('i-0000000000000000a', depends_on=['i-0000000000000000b'])
+        b = make_result('i-0000000000000000b', depends_on=['i-0000000000000000a'])
+        with self.assertRaises(ConfigError):
+            dependency_graph([a, b])
+        submit = FakeSubmit(delay=0)
+        with self.assertRaises(ConfigError):
+            run_scheduled([a, b], submit, max_workers=2)
+        self.assertEqual(submit.started, [])
+
+    def test_dependencia_fora_do_lote_e_ignorada(self):
+        app = make_result('i-0000000000000a990', depends_on=['i-0000000000000ffff'])
+        self.assertEqual(dependency_graph([app]), {id(app): []})
+
+if __name__ == '__main__':
+    unittest.main()